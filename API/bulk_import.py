@@ -0,0 +1,386 @@
+"""Script used to import historical series of the Brazilian Economic Indexers from local files (CSV or saved HTML pages).
+
+Usage:
+    python bulk_import.py --indexer IPCA ipca.csv [other files...] [--update-existing] [--dry-run]
+    python bulk_import.py --collection new_indexer new_indexer.html
+
+CSV files need the columns 'year', 'month', 'day' (optional, default 1) and 'value', or 'date' and 'value'
+(Portuguese names like 'ano', 'mes', 'dia', 'valor', 'data' are also accepted). HTML pages may have the years
+as rows and the months as columns (or the opposite), like the tables of the scraping links.
+
+Registers are upserted by (year, month, day), protected by a unique index, so the import can be run again safely.
+Every register written gets the 'updated_at' time, so the running apps reload the values corrected in place.
+Daily registers (e.g. CDI and SELIC with INDEXER_GRANULARITIES) are checked against the business days.
+"""
+
+import os
+import sys
+import math
+import argparse
+import unicodedata
+
+from html.parser import HTMLParser
+
+import pandas as pd
+import pymongo
+
+from pymongo import UpdateOne
+
+sys.path.append('..')
+
+try:
+    from db_collection import DBCollection, EconomicIndexers
+except ModuleNotFoundError:
+    from API.db_collection import DBCollection, EconomicIndexers
+
+try:
+    from business_days import BusinessDayCalendar
+except ModuleNotFoundError:
+    from API.business_days import BusinessDayCalendar
+
+try:
+    from dates import DateOperations as date
+except ModuleNotFoundError:
+    from API.dates import DateOperations as date
+
+
+
+class HTMLTableParser(HTMLParser):
+    """Collect the text of the cells of every table in a HTML page: tables -> rows -> cells."""
+
+    CELL_TAGS = ("td", "th")
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.tables = []
+        self._row = None
+        self._cell = None
+
+    def handle_starttag(self, tag: str, attrs: list) -> None:
+        if tag == "table":
+            self.tables.append([])
+        elif tag == "tr" and self.tables:
+            self._row = []
+            self.tables[-1].append(self._row)
+        elif tag in self.CELL_TAGS and self._row is not None:
+            self._cell = []
+
+    def handle_endtag(self, tag: str) -> None:
+        if tag in self.CELL_TAGS and self._cell is not None:
+            self._row.append(" ".join("".join(self._cell).split()))
+            self._cell = None
+        elif tag == "tr":
+            self._row = None
+
+    def handle_data(self, data: str) -> None:
+        if self._cell is not None:
+            self._cell.append(data)
+
+
+
+class IndexerFileReader:
+    """Read the registers of one indexer from local files, as a dataframe with year, month, day, value and source."""
+
+    MONTH_ABBREVIATIONS = ["jan", "fev", "mar", "abr", "mai", "jun", "jul", "ago", "set", "out", "nov", "dez"]
+
+    COLUMN_ALIASES = {
+        "ano": DBCollection.DB_YEAR_COLUMN,
+        "mes": DBCollection.DB_MONTH_COLUMN,
+        "dia": DBCollection.DB_DAY_COLUMN,
+        "valor": DBCollection.DB_RATE_COLUMN,
+        "taxa": DBCollection.DB_RATE_COLUMN,
+        "rate": DBCollection.DB_RATE_COLUMN,
+        "data": "date",
+    }
+
+    COLUMNS = [DBCollection.DB_YEAR_COLUMN, DBCollection.DB_MONTH_COLUMN, DBCollection.DB_DAY_COLUMN, DBCollection.DB_RATE_COLUMN, "source"]
+
+    # Day used by the monthly registers
+    DEFAULT_DAY = 1
+
+    @staticmethod
+    def get_normalized_text(text: str) -> str:
+        """Return the text in lower case, without accents and spaces."""
+        text = unicodedata.normalize("NFKD", str(text)).encode("ascii", "ignore").decode("ascii")
+        return text.strip().lower()
+
+    @staticmethod
+    def get_rate_from_string(text: str) -> float:
+        """Return the rate of a cell like '1,23', '-0.45' or '1.234,5 %' (NaN when empty or '-')."""
+        text = str(text).replace("%", "").replace(" ", "").strip()
+        if text in ("", "-", "--", "nan"):
+            return math.nan
+        if "," in text:
+            text = text.replace(".", "").replace(",", ".")
+        return float(text)
+
+    @classmethod
+    def get_month_from_string(cls, text: str) -> int:
+        """Return the month (1 to 12) of a name like 'Janeiro', 'fev' or 'Março' (None for other texts)."""
+        text = cls.get_normalized_text(text)
+        if len(text) >= 3 and text[:3] in cls.MONTH_ABBREVIATIONS and text.isalpha():
+            return cls.MONTH_ABBREVIATIONS.index(text[:3]) + 1
+        return None
+
+    @staticmethod
+    def get_year_from_string(text: str) -> int:
+        text = str(text).strip()
+        if text.isdigit() and 1900 <= int(text) <= 2100:
+            return int(text)
+        return None
+
+
+    @classmethod
+    def read_file(cls, path: str) -> pd.DataFrame:
+        extension = os.path.splitext(path)[1].lower()
+        if extension in (".html", ".htm"):
+            return cls.read_html(path)
+        return cls.read_csv(path)
+
+    @classmethod
+    def read_csv(cls, path: str) -> pd.DataFrame:
+        # The separator (',' or ';') is detected, and values are parsed later (decimal ',' or '.')
+        df = pd.read_csv(path, sep=None, engine="python", dtype=str, encoding="utf-8-sig")
+        df.columns = [cls.COLUMN_ALIASES.get(cls.get_normalized_text(column), cls.get_normalized_text(column)) for column in df.columns]
+        df["source"] = [f"{path}:{line}" for line in range(2, len(df) + 2)]
+
+        if "date" in df.columns:
+            dates = pd.to_datetime(df["date"], dayfirst=df["date"].str.contains("/").any(), errors="coerce")
+            df[DBCollection.DB_YEAR_COLUMN] = dates.dt.year
+            df[DBCollection.DB_MONTH_COLUMN] = dates.dt.month
+            df[DBCollection.DB_DAY_COLUMN] = dates.dt.day
+        if DBCollection.DB_DAY_COLUMN not in df.columns:
+            df[DBCollection.DB_DAY_COLUMN] = cls.DEFAULT_DAY
+
+        missing_columns = [column for column in cls.COLUMNS if column not in df.columns]
+        if missing_columns:
+            raise ValueError(f"{path}: missing columns {missing_columns} (found {list(df.columns)})")
+        return df[cls.COLUMNS]
+
+    @classmethod
+    def read_html(cls, path: str) -> pd.DataFrame:
+        parser = HTMLTableParser()
+        with open(path, encoding="utf-8", errors="replace") as html_file:
+            parser.feed(html_file.read())
+        dataframes = [cls.get_dataframe_from_table(table, f"{path}:table {number}") for number, table in enumerate(parser.tables, start=1)]
+        dataframes = [df for df in dataframes if len(df)]
+        if not dataframes:
+            raise ValueError(f"{path}: no table with years and months was found")
+        return pd.concat(dataframes, ignore_index=True)
+
+    @classmethod
+    def get_dataframe_from_table(cls, rows: list, source: str) -> pd.DataFrame:
+        """Return the registers of a table with years as rows and months as columns (or the opposite)."""
+        items = []
+        month_columns, year_columns = None, None
+        for row in rows:
+            months = {position: cls.get_month_from_string(cell) for position, cell in enumerate(row)}
+            months = {position: month for position, month in months.items() if month}
+            years = {position: cls.get_year_from_string(cell) for position, cell in enumerate(row)}
+            years = {position: year for position, year in years.items() if year}
+
+            if len(months) >= 6:
+                # Header with the months: next rows start with the year
+                month_columns, year_columns = months, None
+            elif len(years) >= 2 and month_columns is None:
+                # Header with the years: next rows start with the month
+                year_columns = years
+            elif month_columns and row and cls.get_year_from_string(row[0]):
+                year = cls.get_year_from_string(row[0])
+                items += [(year, month, row[position], f"{source}, {year}/{month}") for position, month in month_columns.items() if position < len(row)]
+            elif year_columns and row and cls.get_month_from_string(row[0]):
+                month = cls.get_month_from_string(row[0])
+                items += [(year, month, row[position], f"{source}, {year}/{month}") for position, year in year_columns.items() if position < len(row)]
+
+        # Empty cells (e.g. months not published yet) are not registers
+        items = [item for item in items if item[2].strip() not in ("", "-", "--")]
+        return pd.DataFrame({
+            DBCollection.DB_YEAR_COLUMN: [item[0] for item in items],
+            DBCollection.DB_MONTH_COLUMN: [item[1] for item in items],
+            DBCollection.DB_DAY_COLUMN: cls.DEFAULT_DAY,
+            DBCollection.DB_RATE_COLUMN: [item[2] for item in items],
+            "source": [item[3] for item in items],
+        }, columns=cls.COLUMNS)
+
+
+
+class IndexerImporter:
+    """Validate registers and upsert them into one collection, keyed by (year, month, day)."""
+
+    KEY_COLUMNS = [DBCollection.DB_YEAR_COLUMN, DBCollection.DB_MONTH_COLUMN, DBCollection.DB_DAY_COLUMN]
+    UNIQUE_INDEX_NAME = DBCollection.DATE_INDEX_NAME
+
+    # Monthly rates (%) out of this range are considered typos
+    DEFAULT_MAX_ABS_RATE = 100.0
+
+    def __init__(self, db_collection: pymongo.collection.Collection) -> None:
+        self._db_collection = db_collection
+
+
+    @classmethod
+    def get_validated_dataframe(cls, df: pd.DataFrame, max_abs_rate: float = DEFAULT_MAX_ABS_RATE) -> pd.DataFrame:
+        """Return the registers with valid types, sorted by date and without repeated ones.
+
+        Raise ValueError listing every invalid register, so nothing is written when any of them is wrong.
+        """
+        errors = []
+        df = df.copy()
+        for column in cls.KEY_COLUMNS:
+            df[column] = pd.to_numeric(df[column], errors="coerce")
+        rates = []
+        for value in df[DBCollection.DB_RATE_COLUMN]:
+            try:
+                rates.append(IndexerFileReader.get_rate_from_string(value))
+            except ValueError:
+                rates.append(math.nan)
+        df[DBCollection.DB_RATE_COLUMN] = rates
+
+        dates = pd.to_datetime(
+            df[cls.KEY_COLUMNS].set_axis(["year", "month", "day"], axis="columns"), errors="coerce",
+        )
+        for source in df.loc[dates.isna(), "source"]:
+            errors.append(f"{source}: invalid date")
+        invalid_rates = ~df[DBCollection.DB_RATE_COLUMN].between(-max_abs_rate, max_abs_rate)
+        for source, value in df.loc[invalid_rates & dates.notna(), ["source", DBCollection.DB_RATE_COLUMN]].itertuples(index=False):
+            errors.append(f"{source}: invalid value ({value})")
+
+        valid = df[dates.notna() & ~invalid_rates].astype({column: int for column in cls.KEY_COLUMNS})
+        conflicts = valid.groupby(cls.KEY_COLUMNS)[DBCollection.DB_RATE_COLUMN].nunique()
+        for key in conflicts[conflicts > 1].index:
+            sources = valid.loc[(valid[cls.KEY_COLUMNS] == key).all(axis="columns"), "source"]
+            errors.append(f"{key}: different values in {list(sources)}")
+
+        if errors:
+            raise ValueError("\n".join(errors))
+        return valid.drop_duplicates(cls.KEY_COLUMNS).sort_values(cls.KEY_COLUMNS).reset_index(drop=True)
+
+    @classmethod
+    def get_missing_months(cls, df: pd.DataFrame) -> list:
+        """Return the months (year, month) without registers between the first and the last ones."""
+        if df.empty:
+            return []
+        months = set(zip(df[DBCollection.DB_YEAR_COLUMN], df[DBCollection.DB_MONTH_COLUMN]))
+        periods = pd.period_range(
+            pd.Period(year=min(months)[0], month=min(months)[1], freq="M"),
+            pd.Period(year=max(months)[0], month=max(months)[1], freq="M"),
+        )
+        return [(period.year, period.month) for period in periods if (period.year, period.month) not in months]
+
+    @classmethod
+    def is_daily(cls, df: pd.DataFrame) -> bool:
+        """Return True when some month has more than one register."""
+        return bool(df.duplicated([DBCollection.DB_YEAR_COLUMN, DBCollection.DB_MONTH_COLUMN]).any())
+
+    @classmethod
+    def get_business_day_issues(cls, df: pd.DataFrame) -> tuple:
+        """Return the business days without registers and the registers out of business days (as 'datetime64[D]' arrays)."""
+        ordinals = date.get_ordinals_from_values(df[DBCollection.DB_YEAR_COLUMN], df[DBCollection.DB_MONTH_COLUMN], df[DBCollection.DB_DAY_COLUMN])
+        return (
+            BusinessDayCalendar.get_missing_business_days(ordinals).astype("datetime64[D]"),
+            BusinessDayCalendar.get_non_business_days(ordinals).astype("datetime64[D]"),
+        )
+
+
+    def create_unique_index(self) -> str:
+        """Create (if missing) the unique index of (year, month, day). Fails if the collection already has repeated dates."""
+        # The same index used by the date range queries of 'DBCollection'
+        return self._db_collection.create_index(DBCollection.DATE_INDEX_KEYS, unique=True, name=self.UNIQUE_INDEX_NAME)
+
+    def create_updated_at_index(self) -> str:
+        """Create (if missing) the index used by the apps to find the registers corrected in place."""
+        return self._db_collection.create_index(DBCollection.UPDATED_AT_INDEX_KEYS, name=DBCollection.UPDATED_AT_INDEX_NAME)
+
+    def import_dataframe(self, df: pd.DataFrame, update_existing: bool = False) -> dict:
+        """Upsert the registers in one unordered bulk write and return the totals (inserted, updated, unchanged).
+
+        By default, registers already in the collection are kept as they are. With 'update_existing', the
+        different values are replaced and get a new 'updated_at', so the apps reload the whole collection on
+        their next update. Registers with the same value are never written, so the import stays idempotent.
+        """
+        updated_at = DBCollection.get_update_time()
+        requests = []
+        for year, month, day, value in df[self.KEY_COLUMNS + [DBCollection.DB_RATE_COLUMN]].itertuples(index=False):
+            key = {DBCollection.DB_YEAR_COLUMN: int(year), DBCollection.DB_MONTH_COLUMN: int(month), DBCollection.DB_DAY_COLUMN: int(day)}
+            fields = {DBCollection.DB_RATE_COLUMN: float(value), DBCollection.DB_UPDATED_AT_COLUMN: updated_at}
+            if update_existing:
+                # Only matched when the value is different (then, the upsert below matches it with the new value and changes nothing)
+                requests.append(UpdateOne(dict(key, **{DBCollection.DB_RATE_COLUMN: {"$ne": float(value)}}), {"$set": fields}))
+            requests.append(UpdateOne(key, {"$setOnInsert": fields}, upsert=True))
+        if not requests:
+            return {"inserted": 0, "updated": 0, "unchanged": 0}
+        result = self._db_collection.bulk_write(requests, ordered=False)
+        return {
+            "inserted": result.upserted_count,
+            "updated": result.modified_count,
+            "unchanged": len(df) - result.upserted_count - result.modified_count,
+        }
+
+
+
+def get_db_collection_from_arguments(mongo_client: pymongo.MongoClient, args: argparse.Namespace) -> pymongo.collection.Collection:
+    if args.indexer:
+        db_collection_classes = {db_collection_class.TITLE: db_collection_class for db_collection_class in EconomicIndexers.DB_COLLECTION_CLASSES}
+        db_collection_class = db_collection_classes[args.indexer]
+        return mongo_client.get_database(db_collection_class.DATABASE_NAME).get_collection(db_collection_class.COLLECTION_NAME)
+    return mongo_client.get_database(args.database).get_collection(args.collection)
+
+
+def main(arguments: list = None, mongo_client: pymongo.MongoClient = None) -> int:
+    titles = [db_collection_class.TITLE for db_collection_class in EconomicIndexers.DB_COLLECTION_CLASSES]
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("files", nargs="+", help="CSV or HTML files with the registers")
+    target = parser.add_mutually_exclusive_group(required=True)
+    target.add_argument("--indexer", choices=titles, help="title of an existing indexer")
+    target.add_argument("--collection", help="collection of a new indexer")
+    parser.add_argument("--database", default=EconomicIndexers.DB_COLLECTION_CLASSES[0].DATABASE_NAME, help="database of '--collection'")
+    parser.add_argument("--update-existing", action="store_true", help="replace the values of registers already in the collection")
+    parser.add_argument("--max-abs-rate", type=float, default=IndexerImporter.DEFAULT_MAX_ABS_RATE, help="maximum absolute rate (%%) accepted")
+    parser.add_argument("--dry-run", action="store_true", help="only read and validate the files")
+    args = parser.parse_args(arguments)
+
+    try:
+        df = pd.concat([IndexerFileReader.read_file(path) for path in args.files], ignore_index=True)
+        df = IndexerImporter.get_validated_dataframe(df, args.max_abs_rate)
+    except (OSError, ValueError) as error:
+        print(f"Invalid registers, nothing was imported:\n{error}", file=sys.stderr)
+        return 1
+
+    print(f"{len(df)} valid registers", end="")
+    if len(df):
+        print(f", from {df.iloc[0, 1]:02d}/{df.iloc[0, 0]} to {df.iloc[-1, 1]:02d}/{df.iloc[-1, 0]}", end="")
+    print()
+    if IndexerImporter.is_daily(df):
+        missing_days, non_business_days = IndexerImporter.get_business_day_issues(df)
+        if len(missing_days):
+            print(f"WARNING: {len(missing_days)} business day(s) without registers: {[str(day) for day in missing_days[:12]]}{' ...' if len(missing_days) > 12 else ''}")
+        if len(non_business_days):
+            print(f"WARNING: {len(non_business_days)} register(s) out of business days: {[str(day) for day in non_business_days[:12]]}{' ...' if len(non_business_days) > 12 else ''}")
+    else:
+        missing_months = IndexerImporter.get_missing_months(df)
+        if missing_months:
+            print(f"WARNING: {len(missing_months)} month(s) without registers: {missing_months[:12]}{' ...' if len(missing_months) > 12 else ''}")
+    if args.dry_run:
+        return 0
+
+    if mongo_client is None:
+        from dotenv import load_dotenv
+        load_dotenv(encoding="iso-8859-1")
+        mongo_client = pymongo.MongoClient(os.getenv("MONGODB_CREDENTIALS"))
+    importer = IndexerImporter(get_db_collection_from_arguments(mongo_client, args))
+    try:
+        importer.create_unique_index()
+        importer.create_updated_at_index()
+    except pymongo.errors.OperationFailure as error:
+        print(f"The unique index could not be created (repeated dates in the collection?): {error}", file=sys.stderr)
+        return 1
+
+    totals = importer.import_dataframe(df, args.update_existing)
+    print(f"Inserted: {totals['inserted']}  Updated: {totals['updated']}  Unchanged: {totals['unchanged']}")
+    if totals["updated"]:
+        print("Existing registers were changed: running apps reload the whole collection on their next update.")
+    return 0
+
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,107 @@
+"""Script used to get the business days of the Brazilian financial market, used by the daily Economic Indexers (e.g. CDI and SELIC)."""
+
+import functools
+
+import numpy as np
+
+from datetime import date, timedelta
+
+
+
+class BusinessDayCalendar:
+    """Weekdays except the national banking holidays (as in the ANBIMA calendar).
+
+    Dates are given as 'int32' ordinals (days since 1970-01-01), like in the IndexerSeries.
+    """
+
+    # Convention of the daily rates (e.g. CDI): a yearly rate compounds over 252 business days
+    BUSINESS_DAYS_PER_YEAR = 252
+
+    # Fixed holidays: (month, day, first year)
+    FIXED_HOLIDAYS = [
+        (1, 1, None),       # Confraternização Universal
+        (4, 21, None),      # Tiradentes
+        (5, 1, None),       # Dia do Trabalho
+        (9, 7, None),       # Independência do Brasil
+        (10, 12, 1980),     # Nossa Senhora Aparecida
+        (11, 2, None),      # Finados
+        (11, 15, None),     # Proclamação da República
+        (11, 20, 2024),     # Dia Nacional de Zumbi e da Consciência Negra
+        (12, 25, None),     # Natal
+    ]
+
+    # Holidays relative to Easter Sunday (in days)
+    EASTER_HOLIDAYS = [
+        -48,    # Carnaval (segunda-feira)
+        -47,    # Carnaval (terça-feira)
+        -2,     # Sexta-feira Santa
+        60,     # Corpus Christi
+    ]
+
+
+    @staticmethod
+    def get_easter_date(year: int) -> date:
+        """Return the Easter Sunday of the year (Gregorian calendar, anonymous algorithm)."""
+        a = year % 19
+        b, c = divmod(year, 100)
+        d, e = divmod(b, 4)
+        f = (b + 8) // 25
+        g = (b - f + 1) // 3
+        h = (19 * a + b - d - g + 15) % 30
+        i, k = divmod(c, 4)
+        l = (32 + 2 * e + 2 * i - h - k) % 7
+        m = (a + 11 * h + 22 * l) // 451
+        month, day = divmod(h + l - 7 * m + 114, 31)
+        return date(year, month, day + 1)
+
+    @classmethod
+    @functools.lru_cache(maxsize=None)
+    def get_holidays(cls, first_year: int, last_year: int) -> np.ndarray:
+        """Return the sorted holidays ('datetime64[D]') from the first to the last year (both included)."""
+        holidays = set()
+        for year in range(first_year, last_year + 1):
+            for month, day, holiday_first_year in cls.FIXED_HOLIDAYS:
+                if holiday_first_year is None or year >= holiday_first_year:
+                    holidays.add(date(year, month, day))
+            easter_date = cls.get_easter_date(year)
+            for days in cls.EASTER_HOLIDAYS:
+                holidays.add(easter_date + timedelta(days=days))
+        holidays = np.array(sorted(holidays), dtype="datetime64[D]")
+        # Shared by all the callers (cached)
+        holidays.flags.writeable = False
+        return holidays
+
+    @classmethod
+    def __get_calendar(cls, initial_ordinal: int, final_ordinal: int) -> np.busdaycalendar:
+        # Whole centuries are used, so the same (cached) holidays serve most of the calls
+        first_year = np.datetime64(int(initial_ordinal), "D").astype(object).year // 100 * 100
+        last_year = np.datetime64(int(final_ordinal), "D").astype(object).year // 100 * 100 + 99
+        return np.busdaycalendar(holidays=cls.get_holidays(max(first_year, 1), min(last_year, 9999)))
+
+
+    @classmethod
+    def get_business_days(cls, initial_ordinal: int, final_ordinal: int) -> np.ndarray:
+        """Return the ordinals of the business days between the ordinals (both included)."""
+        if final_ordinal < initial_ordinal:
+            return np.array([], dtype=np.int32)
+        days = np.arange(initial_ordinal, final_ordinal + 1, dtype=np.int64).astype("datetime64[D]")
+        business_days = days[np.is_busday(days, busdaycal=cls.__get_calendar(initial_ordinal, final_ordinal))]
+        return business_days.astype(np.int64).astype(np.int32)
+
+    @classmethod
+    def get_missing_business_days(cls, ordinals: np.ndarray) -> np.ndarray:
+        """Return the business days without ordinals, between the first and the last ordinals."""
+        ordinals = np.asarray(ordinals, dtype=np.int32)
+        if len(ordinals) == 0:
+            return ordinals
+        business_days = cls.get_business_days(int(ordinals.min()), int(ordinals.max()))
+        return business_days[~np.isin(business_days, ordinals)]
+
+    @classmethod
+    def get_non_business_days(cls, ordinals: np.ndarray) -> np.ndarray:
+        """Return the ordinals that are not business days (weekends and holidays)."""
+        ordinals = np.asarray(ordinals, dtype=np.int32)
+        if len(ordinals) == 0:
+            return ordinals
+        calendar = cls.__get_calendar(int(ordinals.min()), int(ordinals.max()))
+        return ordinals[~np.is_busday(ordinals.astype(np.int64).astype("datetime64[D]"), busdaycal=calendar)]
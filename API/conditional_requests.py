@@ -0,0 +1,138 @@
+"""Script used to answer repeated GET requests with '304 Not Modified' while the indexer data does not change."""
+
+import os
+import asyncio
+import hashlib
+
+from email.utils import format_datetime, parsedate_to_datetime
+from urllib.parse import parse_qsl, urlencode
+
+from starlette.concurrency import run_in_threadpool
+from starlette.routing import Match
+
+
+
+class ConditionalRequestMiddleware:
+    """ASGI middleware adding 'ETag', 'Last-Modified' and 'Cache-Control' to the GET responses of some routes.
+
+    The ETag is derived from the route, the (sorted) query parameters, the API version and the data version
+    given by 'get_data_version(query_params)', which returns a tuple (version, last_modified) or None when
+    the request does not depend on known data (e.g. invalid parameters; then nothing is added).
+    It may be a coroutine function; otherwise, it is called in the threadpool.
+    The tuple may also have the staleness (in seconds) of the data, sent in the 'X-Data-Staleness' header.
+    The request headers in 'vary' (e.g. 'Accept', for routes with content negotiation) are also part of the ETag,
+    so a representation is never validated by the ETag of another one.
+
+    When 'If-None-Match' (or 'If-Modified-Since', without 'If-None-Match') matches the current data, the
+    middleware answers '304 Not Modified' itself, without calling the endpoint.
+    """
+
+    MAX_AGE_ENVIRONMENT_VARIABLE = "API_CACHE_MAX_AGE"
+    DEFAULT_MAX_AGE = 60
+
+    # Seconds since the data was synchronized with the database (not 'Age', which would expire the 'max-age' in caches)
+    STALENESS_HEADER = b"x-data-staleness"
+
+    def __init__(self, app, paths: list, get_data_version, max_age: int = None, vary: list = None) -> None:
+        self.app = app
+        self._paths = set(paths)
+        self._get_data_version = get_data_version
+        self._vary = [name.lower().encode("latin-1") for name in vary or []]
+        max_age = int(os.getenv(self.MAX_AGE_ENVIRONMENT_VARIABLE, self.DEFAULT_MAX_AGE)) if max_age is None else max_age
+        # Caches may reuse a response for 'max-age' seconds, then they must revalidate it with the ETag
+        self._cache_control = f"public, max-age={max_age}, must-revalidate".encode("latin-1")
+
+
+    @staticmethod
+    def get_etag(path: str, query_params: list, api_version: str, data_version: str, vary_values: list = None) -> str:
+        query = urlencode(sorted(query_params))
+        key = f"{path}?{query}|{api_version}|{data_version}"
+        # Only with 'vary', so the ETags of the routes without content negotiation are kept
+        if vary_values:
+            key += "|" + "|".join(vary_values)
+        digest = hashlib.blake2b(key.encode("utf-8"), digest_size=16).hexdigest()
+        return f'"{digest}"'
+
+    @staticmethod
+    def is_etag_matched(if_none_match: str, etag: str) -> bool:
+        """Weak comparison of the 'If-None-Match' header with the ETag (as required for GET)."""
+        if if_none_match.strip() == "*":
+            return True
+        for tag in if_none_match.split(","):
+            tag = tag.strip()
+            if tag.startswith("W/"):
+                tag = tag[2:]
+            if tag == etag:
+                return True
+        return False
+
+    @staticmethod
+    def is_not_modified_since(if_modified_since: str, last_modified) -> bool:
+        try:
+            since = parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError):
+            return False
+        if since is None or since.tzinfo is None:
+            return False
+        # HTTP dates have a precision of seconds
+        return last_modified.replace(microsecond=0) <= since
+
+
+    def __get_route_scope(self, scope: dict) -> dict:
+        # Match the route as the router would, so the scope is the same for other middlewares (e.g. metrics)
+        for route in scope["app"].router.routes:
+            match, child_scope = route.matches(scope)
+            if match == Match.FULL:
+                return child_scope
+        return None
+
+    async def __call__(self, scope, receive, send) -> None:
+        if scope["type"] != "http" or scope["method"] != "GET" or scope["path"] not in self._paths:
+            await self.app(scope, receive, send)
+            return
+
+        query_params = parse_qsl(scope.get("query_string", b"").decode("latin-1"), keep_blank_values=True)
+        if asyncio.iscoroutinefunction(self._get_data_version):
+            data_version = await self._get_data_version(dict(query_params))
+        else:
+            data_version = await run_in_threadpool(self._get_data_version, dict(query_params))
+        if data_version is None:
+            await self.app(scope, receive, send)
+            return
+
+        version, last_modified, *staleness = data_version
+        request_headers = dict(scope["headers"])
+        vary_values = [request_headers.get(name, b"").decode("latin-1") for name in self._vary]
+        headers = [
+            (b"etag", self.get_etag(scope["path"], query_params, scope["app"].version, version, vary_values).encode("latin-1")),
+            (b"cache-control", self._cache_control),
+        ]
+        if self._vary:
+            headers.append((b"vary", b", ".join(self._vary)))
+        if last_modified is not None:
+            headers.append((b"last-modified", format_datetime(last_modified, usegmt=True).encode("latin-1")))
+        if staleness:
+            headers.append((self.STALENESS_HEADER, str(int(staleness[0])).encode("latin-1")))
+
+        request_headers = {name: value.decode("latin-1") for name, value in request_headers.items() if name in (b"if-none-match", b"if-modified-since")}
+        if b"if-none-match" in request_headers:
+            not_modified = self.is_etag_matched(request_headers[b"if-none-match"], headers[0][1].decode("latin-1"))
+        elif b"if-modified-since" in request_headers and last_modified is not None:
+            not_modified = self.is_not_modified_since(request_headers[b"if-modified-since"], last_modified)
+        else:
+            not_modified = False
+
+        if not_modified:
+            route_scope = self.__get_route_scope(scope)
+            if route_scope is not None:
+                scope.update(route_scope)
+            await send({"type": "http.response.start", "status": 304, "headers": headers})
+            await send({"type": "http.response.body", "body": b""})
+            return
+
+        async def send_wrapper(message) -> None:
+            if message["type"] == "http.response.start" and message["status"] == 200:
+                message["headers"] = list(message.get("headers", [])) + headers
+            await send(message)
+
+        await self.app(scope, receive, send_wrapper)
@@ -1,5 +1,8 @@
 """Script used to perform some date string manipulation."""
 
+import calendar
+
+import numpy as np
 import pandas as pd
 
 from datetime import datetime
@@ -36,6 +39,53 @@ class DateOperations:
     def convert_values_to_datetime(year: int, month: int, day=1) -> datetime:
         return datetime(year, month, day)
 
+    @staticmethod
+    def get_last_day_of_month(value: datetime) -> datetime:
+        return datetime(value.year, value.month, calendar.monthrange(value.year, value.month)[1])
+
     @staticmethod
     def get_dataframe_from_dates(df: pd.DataFrame, date_column: str, initial_date: datetime, final_date: datetime) -> pd.DataFrame:
         return df.loc[(df[date_column] >= initial_date) & (df[date_column] <= final_date)]
+
+    @staticmethod
+    def get_ordinals_from_values(years: np.ndarray, months: np.ndarray, days: np.ndarray) -> np.ndarray:
+        """Return the number of days since 1970-01-01 (as int32) for arrays of years, months and days."""
+        months_since_epoch = (np.asarray(years, dtype=np.int64) - 1970) * 12 + (np.asarray(months, dtype=np.int64) - 1)
+        first_days = months_since_epoch.astype("datetime64[M]").astype("datetime64[D]")
+        dates = first_days + (np.asarray(days, dtype=np.int64) - 1)
+        if np.any(dates.astype("datetime64[M]") != first_days.astype("datetime64[M]")) or np.any(np.asarray(days) < 1):
+            raise ValueError("Some day is out of range for its month.")
+        return dates.astype(np.int64).astype(np.int32)
+
+    @staticmethod
+    def get_ordinal_from_datetime(value: datetime, round_up=False) -> int:
+        """Return the number of days since 1970-01-01 of the datetime.
+        
+        When 'round_up' is True, a datetime after midnight returns the next day, so
+        'date >= value' is the same as 'ordinal >= get_ordinal_from_datetime(value, True)'.
+        """
+        timestamp = np.datetime64(pd.Timestamp(value).to_datetime64(), "ns")
+        ordinal = timestamp.astype("datetime64[D]")
+        if round_up and ordinal != timestamp:
+            ordinal += 1
+        return int(ordinal.astype(np.int64))
+
+    @staticmethod
+    def get_ordinals_from_datetimes(values: np.ndarray, round_up=False) -> np.ndarray:
+        """Vectorized 'get_ordinal_from_datetime', for 'datetime64' arrays."""
+        timestamps = np.asarray(values, dtype="datetime64[ns]")
+        ordinals = timestamps.astype("datetime64[D]")
+        if round_up:
+            ordinals = ordinals + (ordinals != timestamps)
+        return ordinals.astype(np.int64).astype(np.int32)
+
+    @staticmethod
+    def get_values_from_ordinal(ordinal: int) -> tuple:
+        """Return the (year, month, day) of the number of days since 1970-01-01."""
+        value = np.datetime64(int(ordinal), "D").astype(object)
+        return value.year, value.month, value.day
+
+    @staticmethod
+    def get_datetimes_from_ordinals(ordinals: np.ndarray) -> np.ndarray:
+        """Return a 'datetime64[ns]' array from the number of days since 1970-01-01."""
+        return np.asarray(ordinals, dtype=np.int64).astype("datetime64[D]").astype("datetime64[ns]")
@@ -1,11 +1,21 @@
 """Script used to get tables related to some Brazilian Economic Indexers, registered in MongoDB."""
 
+import os
+import time
+import logging
 import pymongo
+import threading
+import contextvars
+
+from bson import ObjectId
+from bson.errors import InvalidId
 
 from abc import ABC
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
 import pandas as pd
 
-from datetime import datetime
+from datetime import datetime, timezone
 
 try:
     from dates import DateOperations as date
@@ -17,6 +27,24 @@ try:
 except ModuleNotFoundError:
     from API.interest_rate import InterestCalculation as interest
 
+try:
+    from indexer_series import IndexerSeries
+except ModuleNotFoundError:
+    from API.indexer_series import IndexerSeries
+
+try:
+    from indexer_snapshot import IndexerSnapshot
+except ModuleNotFoundError:
+    from API.indexer_snapshot import IndexerSnapshot
+
+try:
+    from business_days import BusinessDayCalendar
+except ModuleNotFoundError:
+    from API.business_days import BusinessDayCalendar
+
+
+logger = logging.getLogger(__name__)
+
 
 
 class DBCollection(ABC):
@@ -27,6 +55,8 @@ class DBCollection(ABC):
     DB_MONTH_COLUMN = "month"
     DB_YEAR_COLUMN = "year"
     DB_RATE_COLUMN = "value"
+    # Time (UTC) of the last write of the register, kept by the writers (see 'get_update_time')
+    DB_UPDATED_AT_COLUMN = "updated_at"
     
     # Stacked columns related to the renamed database collection
     STACKED_DAY_COLUMN = "Dia"
@@ -50,12 +80,70 @@ class DBCollection(ABC):
     TRANSPOSED_MONTHS_COLUMNS = date.MONTHS_LIST
     TRANSPOSED_YEARLY_RATE_COLUMN = "Anual(%)"
     
-    def __init__(self, mongo_client: pymongo.MongoClient, database_name: str, collection_name: str, title) -> None:
+    # Fields fetched from the database ('_id' is only needed for the last register)
+    DB_PROJECTION = {
+        DB_ID_COLUMN: 0,
+        DB_DAY_COLUMN: 1,
+        DB_MONTH_COLUMN: 1,
+        DB_YEAR_COLUMN: 1,
+        DB_RATE_COLUMN: 1,
+    }
+    # Fields fetched when loading the series ('updated_at' tells the registers corrected in place, see 'update_dataframe_from_db')
+    DB_SERIES_PROJECTION = dict(DB_PROJECTION, **{DB_UPDATED_AT_COLUMN: 1})
+    
+    # Compound index of the dates, shared with the bulk import (see 'create_date_index')
+    DATE_INDEX_NAME = "year_month_day"
+    DATE_INDEX_KEYS = [
+        (DB_YEAR_COLUMN, pymongo.ASCENDING),
+        (DB_MONTH_COLUMN, pymongo.ASCENDING),
+        (DB_DAY_COLUMN, pymongo.ASCENDING),
+    ]
+    
+    # Index of the last writes, so the registers corrected in place are found without scanning the collection
+    UPDATED_AT_INDEX_NAME = "updated_at"
+    UPDATED_AT_INDEX_KEYS = [(DB_UPDATED_AT_COLUMN, pymongo.DESCENDING)]
+    
+    # 'memory': the whole collection is loaded once and every query is answered from it
+    # 'database': the date range of each query is pushed down to MongoDB, so only the registers in it are transferred
+    QUERY_MODE_MEMORY = "memory"
+    QUERY_MODE_DATABASE = "database"
+    QUERY_MODES = [QUERY_MODE_MEMORY, QUERY_MODE_DATABASE]
+    
+    # 'monthly': one rate per month (day 1); 'daily': one rate per business day (see 'BusinessDayCalendar')
+    GRANULARITY_MONTHLY = "monthly"
+    GRANULARITY_DAILY = "daily"
+    PERIODS_PER_YEAR = {
+        GRANULARITY_MONTHLY: 12,
+        GRANULARITY_DAILY: BusinessDayCalendar.BUSINESS_DAYS_PER_YEAR,
+    }
+    
+    def __init__(self, mongo_client: pymongo.MongoClient, database_name: str, collection_name: str, title, snapshot_dir: str = None, query_mode: str = None, granularity: str = None) -> None:
         self._mongo_client = mongo_client
         self._database_name = database_name
         self._collection_name = collection_name
         self._title = title
-        self.update_dataframe_from_db()
+        self._snapshot_dir = snapshot_dir
+        self._query_mode = query_mode or self.QUERY_MODE_MEMORY
+        if self._query_mode not in self.QUERY_MODES:
+            raise ValueError(f"Invalid query mode for {title}: '{self._query_mode}' (expected one of {self.QUERY_MODES}).")
+        self._granularity = granularity or self.GRANULARITY_MONTHLY
+        if self._granularity not in self.PERIODS_PER_YEAR:
+            raise ValueError(f"Invalid granularity for {title}: '{self._granularity}' (expected one of {list(self.PERIODS_PER_YEAR)}).")
+        self._series = None
+        self._series_lock = threading.Lock()
+        # Only one thread updates the series from the database at a time (reentrant, see 'refresh_dataframe_from_db')
+        self._refresh_lock = threading.RLock()
+        # Time (epoch) of the last successful update from the database
+        self._synced_at = None
+        self._stacked_cache = None
+        self._transposed_cache = None
+        # (version, last '_id', last 'updated_at') of the data in the 'database' query mode, updated with the series (see 'get_data_version')
+        self._db_version = None
+        if self._query_mode == self.QUERY_MODE_MEMORY:
+            self.__load_from_snapshot_or_db()
+        else:
+            self.__create_indexes_if_allowed()
+            self.__update_db_version()
         self._link = None
     
     
@@ -68,6 +156,16 @@ class DBCollection(ABC):
     def get_title(self) -> str:
         return self._title
 
+    def get_query_mode(self) -> str:
+        return self._query_mode
+
+    def get_granularity(self) -> str:
+        return self._granularity
+
+    def get_periods_per_year(self) -> int:
+        """Number of rates per year (12 for monthly series, 252 business days for daily series)."""
+        return self.PERIODS_PER_YEAR[self._granularity]
+
 
     def set_link_for_scraping(self, link: str) -> None:
         self._link = link
@@ -76,76 +174,446 @@ class DBCollection(ABC):
         return self._link
 
 
-    def update_dataframe_from_db(self) -> None:
-        # Get the raw dataframe from database
-        db = self._mongo_client.get_database(self._database_name)
-        items = db.get_collection(self._collection_name).find().sort(self.DB_ID_COLUMN, pymongo.ASCENDING)
-        self._raw_dataframe = pd.DataFrame(list(items))
+    def get_snapshot_directory(self) -> str:
+        """Directory of the local snapshot, or None when snapshots are disabled."""
+        if self._snapshot_dir is None:
+            return None
+        return os.path.join(self._snapshot_dir, self._database_name, self._collection_name)
+
+    def save_snapshot(self) -> bool:
+        """Save the current series as the local snapshot. Return False if there is nothing to save."""
+        directory = self.get_snapshot_directory()
+        series = self._series
+        if directory is None or series is None or len(series) == 0:
+            return False
+        IndexerSnapshot.save(directory, series, {"title": self._title, "synced_at": self._synced_at})
+        return True
+
+    def load_snapshot(self) -> bool:
+        """Load the series from the local snapshot (memory-mapped). Return False if there is no valid snapshot."""
+        directory = self.get_snapshot_directory()
+        snapshot = None if directory is None else IndexerSnapshot.load(directory)
+        if snapshot is None:
+            return False
+        arrays, meta = snapshot
+        try:
+            last_id = ObjectId(meta["last_id"])
+        except InvalidId:
+            return False
+        updated_at = datetime.fromisoformat(meta["updated_at"]) if meta.get("updated_at") else None
+        self._series = IndexerSeries(arrays["ordinals"], arrays["rates"], last_id, arrays["factors"], arrays["log_factors"], updated_at)
+        # The snapshot may have been synchronized again (with no new registers) after it was saved
+        synced_at = [meta.get("synced_at"), IndexerSnapshot.get_synced_at(directory)]
+        self._synced_at = max([value for value in synced_at if value is not None], default=None)
+        return True
+
+    def update_dataframe_from_snapshot(self) -> bool:
+        """Load the snapshot when its version is not the current one (e.g. saved by another process sharing the snapshot directory).
         
-        # Get the stacked dataframe
-        self._stacked_dataframe = self.__get_stacked_dataframe()
+        Return True when the series was replaced. Otherwise, only the time of the last synchronization is updated.
+        """
+        directory = self.get_snapshot_directory()
+        series = self._series
+        if directory is None or series is None:
+            return False
+        current_version = IndexerSnapshot.get_current_version(directory)
+        if current_version is not None and current_version != series.get_version():
+            return self.load_snapshot()
+        synced_at = IndexerSnapshot.get_synced_at(directory)
+        if synced_at is not None and synced_at > (self._synced_at or 0.0):
+            self._synced_at = synced_at
+        return False
+
+    def __load_from_snapshot_or_db(self) -> None:
+        directory = self.get_snapshot_directory()
+        if directory is None:
+            self.__update_series_from_db()
+            return
         
-        # Get the renamed and transposed dataframe
-        self._transposed_stacked_dataframe = self.__get_transposed_stacked_dataframe()
+        # Processes sharing the snapshot load it one at a time: only the first one (if any) fetches the whole collection
+        with IndexerSnapshot.lock(directory):
+            if not self.load_snapshot():
+                self.__update_series_from_db()
+                return
+            
+            # Catch up with the registers inserted after the snapshot, if the database is reachable
+            try:
+                self.__update_series_from_db(incremental=True)
+            except pymongo.errors.PyMongoError as error:
+                logger.warning("%s: using the local snapshot, since the database is unavailable (%s)", self._title, error)
+
+
+    def __get_db_collection(self) -> pymongo.collection.Collection:
+        return self._mongo_client.get_database(self._database_name).get_collection(self._collection_name)
+
+    def create_date_index(self) -> str:
+        """Create (if missing) the unique index of (year, month, day), used by the date range queries."""
+        return self.__get_db_collection().create_index(self.DATE_INDEX_KEYS, unique=True, name=self.DATE_INDEX_NAME)
+
+    def create_updated_at_index(self) -> str:
+        """Create (if missing) the index of 'updated_at', used to find the registers corrected in place."""
+        return self.__get_db_collection().create_index(self.UPDATED_AT_INDEX_KEYS, name=self.UPDATED_AT_INDEX_NAME)
+
+    def __create_indexes_if_allowed(self, date_index: bool = True) -> None:
+        try:
+            if date_index:
+                self.create_date_index()
+            self.create_updated_at_index()
+        except pymongo.errors.OperationFailure as error:
+            # e.g. read-only credentials, or repeated dates in the collection
+            logger.warning("%s: the indexes could not be created, so some queries may scan the collection (%s)", self._title, error)
+
+    @staticmethod
+    def get_update_time() -> datetime:
+        """Return the current time for 'updated_at', as MongoDB stores it (UTC without the time zone, in milliseconds)."""
+        now = datetime.now(timezone.utc).replace(tzinfo=None)
+        return now.replace(microsecond=now.microsecond // 1000 * 1000)
+
+    @classmethod
+    def __get_updated_at_from_items(cls, items: list):
+        return max([item[cls.DB_UPDATED_AT_COLUMN] for item in items if item.get(cls.DB_UPDATED_AT_COLUMN) is not None], default=None)
+
+    def __get_arrays_from_items(self, items: list) -> tuple:
+        ordinals = date.get_ordinals_from_values(
+            [item[self.DB_YEAR_COLUMN] for item in items],
+            [item[self.DB_MONTH_COLUMN] for item in items],
+            [item[self.DB_DAY_COLUMN] for item in items],
+        )
+        rates = np.array([item[self.DB_RATE_COLUMN] for item in items], dtype=np.float64)
+        return ordinals, rates
 
+    def update_dataframe_from_db(self, incremental: bool = False) -> None:
+        """Load the collection from the database into the array-backed series.
+        
+        When 'incremental' is True, only the registers inserted after the last loaded one are fetched and appended,
+        unless some loaded register was corrected in place (a newer 'updated_at'); then the whole collection is loaded.
+        Dataframes are only built when some 'get_..._dataframe' method is called.
+        The local snapshot, when enabled, is saved after any change.
+        In the 'database' query mode, only the data version is updated until the whole collection is loaded (see 'get_series').
+        """
+        if self._series is not None or self._query_mode == self.QUERY_MODE_MEMORY:
+            self.__update_series_from_db(incremental)
+        if self._query_mode == self.QUERY_MODE_DATABASE:
+            self.__update_db_version()
+
+    def __update_series_from_db(self, incremental: bool = False) -> None:
+        with self._refresh_lock:
+            previous_series = self._series
+            if incremental and previous_series is not None and previous_series.get_last_id() is not None:
+                self.__append_series_from_db()
+            else:
+                self.__load_series_from_db()
+            self._synced_at = time.time()
+        
+        directory = self.get_snapshot_directory()
+        if directory is None:
+            return
+        try:
+            if self._series is not previous_series and self.save_snapshot():
+                # The saved arrays are mapped instead, so their memory is shared with the other processes using the snapshot
+                self.load_snapshot()
+            # Recorded after the new version, so the other processes never take the previous one as synchronized
+            IndexerSnapshot.set_synced_at(directory, self._synced_at)
+        except OSError as error:
+            logger.warning("%s: the local snapshot could not be saved (%s)", self._title, error)
+
+    def refresh_dataframe_from_db(self, max_staleness: float = 0.0) -> bool:
+        """Fetch the registers inserted after the last loaded one, unless another thread is already doing it.
+        
+        The readers keep the current series until the new one replaces it, so they never wait for the refresh.
+        When another thread is refreshing the collection, return at once. When the database fails, keep
+        the current series (see 'get_staleness') and return False.
+        
+        When the snapshot directory is shared by other processes (e.g. the API workers), only one process at a time
+        queries the database; the others load its snapshot. The database is not queried either when the snapshot
+        was synchronized less than 'max_staleness' seconds ago (e.g. by another process).
+        """
+        if not self._refresh_lock.acquire(blocking=False):
+            return True
+        try:
+            directory = self.get_snapshot_directory()
+            if directory is None:
+                self.update_dataframe_from_db(incremental=True)
+                return True
+            with IndexerSnapshot.lock(directory, blocking=False) as locked:
+                self.update_dataframe_from_snapshot()
+                if locked and self.__get_synchronization_age() >= max_staleness:
+                    self.update_dataframe_from_db(incremental=True)
+                elif self._query_mode == self.QUERY_MODE_DATABASE:
+                    self.__update_db_version()
+            return True
+        except pymongo.errors.PyMongoError as error:
+            logger.warning("%s: serving data synchronized %.0f s ago, since the update failed (%s)", self._title, self.get_staleness(), error)
+            return False
+        finally:
+            self._refresh_lock.release()
+
+    def get_staleness(self) -> float:
+        """Return the seconds since the series was last synchronized with the database.
+        
+        It is 0.0 in the 'database' query mode (the date ranges are always queried) or before the first load.
+        """
+        if self._query_mode == self.QUERY_MODE_DATABASE or self._synced_at is None:
+            return 0.0
+        return self.__get_synchronization_age()
+
+    def __get_synchronization_age(self) -> float:
+        synced_at = self._synced_at
+        return float("inf") if synced_at is None else max(time.time() - synced_at, 0.0)
+
+    def __load_series_from_db(self) -> None:
+        # The 'updated_at' index makes the checks of the incremental updates cheap (the date index is left to the 'database' query mode)
+        self.__create_indexes_if_allowed(date_index=False)
+        # Get the last '_id', so all the other registers can be fetched without it
+        db_collection = self.__get_db_collection()
+        last_item = db_collection.find_one({}, {self.DB_ID_COLUMN: 1}, sort=[(self.DB_ID_COLUMN, pymongo.DESCENDING)])
+        if last_item is None:
+            self._series = IndexerSeries([], [])
+            return
+        
+        last_id = last_item[self.DB_ID_COLUMN]
+        # The projection is copied, since drivers (e.g. mongomock) may change it while iterating
+        items = list(db_collection.find({self.DB_ID_COLUMN: {"$lte": last_id}}, dict(self.DB_SERIES_PROJECTION)))
+        ordinals, rates = self.__get_arrays_from_items(items)
+        self._series = IndexerSeries(ordinals, rates, last_id, updated_at=self.__get_updated_at_from_items(items))
+
+    def __is_updated_in_place(self) -> bool:
+        # Registers already loaded, written after the last write loaded (e.g. by 'bulk_import.py --update-existing')
+        updated_at = self._series.get_updated_at()
+        item = self.__get_db_collection().find_one({
+            self.DB_ID_COLUMN: {"$lte": self._series.get_last_id()},
+            self.DB_UPDATED_AT_COLUMN: {"$exists": True} if updated_at is None else {"$gt": updated_at},
+        }, {self.DB_ID_COLUMN: 1})
+        return item is not None
+
+    def __append_series_from_db(self) -> None:
+        if self.__is_updated_in_place():
+            logger.info("%s: registers were corrected in place, so the whole collection is loaded again", self._title)
+            self.__load_series_from_db()
+            return
+        
+        # Get only the registers inserted after the last one
+        items = list(self.__get_db_collection().find(
+            {self.DB_ID_COLUMN: {"$gt": self._series.get_last_id()}},
+            dict(self.DB_SERIES_PROJECTION, **{self.DB_ID_COLUMN: 1}),
+        ).sort(self.DB_ID_COLUMN, pymongo.ASCENDING))
+        if not items:
+            return
+        
+        # Registers older than the last date (e.g. a backfill) are sorted by the series itself
+        ordinals, rates = self.__get_arrays_from_items(items)
+        self._series = self._series.append(ordinals, rates, items[-1][self.DB_ID_COLUMN], self.__get_updated_at_from_items(items))
 
-    def get_raw_dataframe(self) -> pd.DataFrame:
-        """_id  day  month   year  value"""
-        return self._raw_dataframe.copy()
-
-
-    def __get_stacked_dataframe(self) -> pd.DataFrame:
-        df = self.get_raw_dataframe()
-               
-        # Adding the date column
-        df[self.STACKED_DATE_COLUMN] = pd.to_datetime(
-            df[[
-                self.DB_YEAR_COLUMN,
-                self.DB_MONTH_COLUMN,
-                self.DB_DAY_COLUMN,
-            ]]
-        )
+    def build_dataframes(self) -> None:
+        """Build the data shared by the dataframes now, instead of on the first 'get_..._dataframe' call."""
+        self.__get_stacked_arrays(self.get_series())
+        self.get_transposed_stacked_dataframe()
+
+    def get_series(self) -> IndexerSeries:
+        """Return the current array-backed series (it is never changed, only replaced by updates).
+        
+        In the 'database' query mode, the whole collection is only loaded when it is requested for the first time.
+        """
+        series = self._series
+        if series is None:
+            with self._series_lock:
+                # Another thread may have loaded the series while we were waiting
+                if self._series is None:
+                    self.__load_from_snapshot_or_db()
+                    if self._query_mode == self.QUERY_MODE_DATABASE:
+                        self.__update_db_version()
+                series = self._series
+        return series
+
+    def __update_db_version(self) -> None:
+        series = self._series
+        if series is not None:
+            # Loaded (e.g. from the snapshot), so the version is the same of the 'memory' query mode
+            self._db_version = (series.get_version(), series.get_last_id(), series.get_updated_at())
+            return
+        db_collection = self.__get_db_collection()
+        last_item = db_collection.find_one({}, {self.DB_ID_COLUMN: 1}, sort=[(self.DB_ID_COLUMN, pymongo.DESCENDING)])
+        last_id = None if last_item is None else last_item[self.DB_ID_COLUMN]
+        last_update = db_collection.find_one({self.DB_UPDATED_AT_COLUMN: {"$exists": True}}, {self.DB_UPDATED_AT_COLUMN: 1}, sort=self.UPDATED_AT_INDEX_KEYS)
+        updated_at = None if last_update is None else last_update[self.DB_UPDATED_AT_COLUMN]
+        updated_at_text = "" if updated_at is None else updated_at.isoformat()
+        self._db_version = (f"{last_id}-{db_collection.estimated_document_count()}-{updated_at_text}", last_id, updated_at)
+
+    def __get_db_version(self) -> tuple:
+        if self._db_version is None:
+            self.__update_db_version()
+        return self._db_version
+
+    def __get_last_writes(self) -> tuple:
+        # (last '_id', last 'updated_at') of the data loaded
+        if self._query_mode == self.QUERY_MODE_DATABASE:
+            return self.__get_db_version()[1:]
+        series = self._series
+        return series.get_last_id(), series.get_updated_at()
+
+    def get_data_version(self) -> str:
+        """Return the version of the data loaded (see 'IndexerSeries.get_version').
         
-        # Renaming some columns
-        df = df.rename(columns=self.COLLECTION_RENAME_DICT, inplace=False)
+        In the 'database' query mode, it is queried when the collection is created and then updated with the
+        series (e.g. by the IndexerCache, once per TTL), so the conditional requests do not query the database.
+        While the whole collection is not loaded, it is the last '_id', the number of registers and the last
+        'updated_at' in the database, so values corrected in place (e.g. 'bulk_import.py --update-existing') change it too.
+        """
+        if self._query_mode == self.QUERY_MODE_DATABASE:
+            return self.__get_db_version()[0]
+        return self._series.get_version()
+
+    def get_last_modified(self) -> datetime:
+        """Return the time (UTC) of the last write of the data loaded, or None when the collection is empty.
         
-        # Organizing the columns
-        return df[[
+        It is the insertion time of the last register or the last 'updated_at', if later (registers corrected in place).
+        """
+        last_id, updated_at = self.__get_last_writes()
+        times = []
+        if isinstance(last_id, ObjectId):
+            times.append(last_id.generation_time.astimezone(timezone.utc))
+        if updated_at is not None:
+            times.append(updated_at.replace(tzinfo=timezone.utc) if updated_at.tzinfo is None else updated_at.astimezone(timezone.utc))
+        return max(times, default=None)
+
+
+    @classmethod
+    def get_range_filter(cls, initial_date: datetime, final_date: datetime) -> dict:
+        """Return the MongoDB filter of the registers between the dates (both included).
+        
+        The year bounds are matched by the (year, month, day) index; the month and day bounds only refine them.
+        """
+        initial_year, initial_month, initial_day = date.get_values_from_ordinal(date.get_ordinal_from_datetime(initial_date, round_up=True))
+        final_year, final_month, final_day = date.get_values_from_ordinal(date.get_ordinal_from_datetime(final_date))
+        year, month, day = cls.DB_YEAR_COLUMN, cls.DB_MONTH_COLUMN, cls.DB_DAY_COLUMN
+        return {
+            year: {"$gte": initial_year, "$lte": final_year},
+            "$and": [
+                {"$or": [
+                    {year: {"$gt": initial_year}},
+                    {year: initial_year, month: {"$gt": initial_month}},
+                    {year: initial_year, month: initial_month, day: {"$gte": initial_day}},
+                ]},
+                {"$or": [
+                    {year: {"$lt": final_year}},
+                    {year: final_year, month: {"$lt": final_month}},
+                    {year: final_year, month: final_month, day: {"$lte": final_day}},
+                ]},
+            ],
+        }
+
+    def get_series_from_db(self, initial_date: datetime, final_date: datetime) -> IndexerSeries:
+        """Return a series with only the registers between the dates, fetched from the database."""
+        items = self.__get_db_collection().find(self.get_range_filter(initial_date, final_date), dict(self.DB_PROJECTION))
+        ordinals, rates = self.__get_arrays_from_items(list(items))
+        return IndexerSeries(ordinals, rates)
+
+    def get_factor_from_db(self, initial_date: datetime, final_date: datetime) -> tuple:
+        """Return the (growth factor, number of rates) between the dates, both computed by the database."""
+        pipeline = [
+            {"$match": self.get_range_filter(initial_date, final_date)},
+            {"$group": {
+                self.DB_ID_COLUMN: None,
+                "periods": {"$sum": 1},
+                "log_factor": {"$sum": {"$ln": {"$add": [1, {"$divide": [f"${self.DB_RATE_COLUMN}", 100]}]}}},
+            }},
+            {"$project": {self.DB_ID_COLUMN: 0, "periods": 1, "factor": {"$exp": "$log_factor"}}},
+        ]
+        result = next(iter(self.__get_db_collection().aggregate(pipeline)), None)
+        if result is None:
+            return 1.0, 0
+        return result["factor"], result["periods"]
+
+
+    def get_raw_dataframe(self) -> pd.DataFrame:
+        """day  month   year  value"""
+        df = self.get_stacked_dataframe(mutable=True)[[
             self.STACKED_DAY_COLUMN,
             self.STACKED_MONTH_COLUMN,
             self.STACKED_YEAR_COLUMN,
-            self.STACKED_DATE_COLUMN,
             self.STACKED_RATE_COLUMN,
         ]]
+        return df.rename(columns={value: key for key, value in self.COLLECTION_RENAME_DICT.items()}, inplace=False)
+
+
+    @staticmethod
+    def __get_read_only(array: np.ndarray) -> np.ndarray:
+        array.flags.writeable = False
+        return array
+
+    def __get_stacked_arrays(self, series: IndexerSeries) -> tuple:
+        # Built only once per series and shared by all the read-only dataframes
+        cache = self._stacked_cache
+        if cache is None or cache[0] is not series:
+            datetimes = pd.DatetimeIndex(series.get_datetimes())
+            day_month_year = np.stack([datetimes.day, datetimes.month, datetimes.year]).astype(np.int64)
+            cache = (series, self.__get_read_only(day_month_year), self.__get_read_only(datetimes.to_numpy()))
+            self._stacked_cache = cache
+        return cache[1], cache[2], series.get_rates()
+
+    def __get_stacked_dataframe(self, series: IndexerSeries, start: int, stop: int, mutable: bool) -> pd.DataFrame:
+        day_month_year, datetimes, rates = self.__get_stacked_arrays(series)
+        index = pd.RangeIndex(start, stop)
+        
+        # Each block is a view of the shared arrays (read-only), unless a mutable copy is asked
+        return pd.concat(
+            [
+                pd.DataFrame(
+                    day_month_year[:, start:stop].T,
+                    index=index,
+                    columns=[self.STACKED_DAY_COLUMN, self.STACKED_MONTH_COLUMN, self.STACKED_YEAR_COLUMN],
+                    copy=mutable,
+                ),
+                pd.DataFrame({self.STACKED_DATE_COLUMN: datetimes[start:stop]}, index=index, copy=mutable),
+                pd.DataFrame({self.STACKED_RATE_COLUMN: rates[start:stop]}, index=index, copy=mutable),
+            ],
+            axis="columns",
+            copy=False,
+        )
 
-    def get_stacked_dataframe(self) -> pd.DataFrame:
-        """Dia  Mês   Ano  Data  Taxa(%)"""
-        return self._stacked_dataframe.copy()
+    def get_stacked_dataframe(self, mutable=False) -> pd.DataFrame:
+        """Dia  Mês   Ano  Data  Taxa(%)
+        
+        By default, the dataframe is a read-only view of the collection data: new columns may be added,
+        but changing its values raises a ValueError. Use 'mutable=True' to get a writable copy.
+        """
+        series = self.get_series()
+        return self.__get_stacked_dataframe(series, 0, len(series), mutable)
 
 
-    def get_stacked_dataframe_from_dates(self, initial_date: datetime, final_date: datetime) -> pd.DataFrame:
+    def get_series_range_from_dates(self, initial_date: datetime, final_date: datetime) -> tuple:
+        """Return a series and the (start, stop) positions of its rates between the dates.
+        
+        In the 'database' query mode, the series has only the registers between the dates.
+        """
+        if self._query_mode == self.QUERY_MODE_DATABASE:
+            series = self.get_series_from_db(initial_date, final_date)
+            return series, 0, len(series)
+        series = self._series
+        return (series, *self.__get_index_range_from_dates(series, initial_date, final_date))
+
+    def get_stacked_dataframe_from_dates(self, initial_date: datetime, final_date: datetime, mutable=False) -> pd.DataFrame:
         """Dia  Mês   Ano  Data  Taxa(%)"""
-        return date.get_dataframe_from_dates(
-            self.get_stacked_dataframe(),
-            self.STACKED_DATE_COLUMN,
-            initial_date,
-            final_date,
-        )
+        series, start, stop = self.get_series_range_from_dates(initial_date, final_date)
+        return self.__get_stacked_dataframe(series, start, stop, mutable)
 
 
-    def get_stacked_dataframe_from_values(self, initial_value: float, initial_date: datetime, final_date: datetime) -> pd.DataFrame:
+    def get_stacked_dataframe_from_values(self, initial_value: float, initial_date: datetime, final_date: datetime, mutable=False) -> pd.DataFrame:
         """Dia  Mês   Ano  Data  Taxa(%)  Valor(R$)"""
-        df = self.get_stacked_dataframe_from_dates(initial_date, final_date)
+        df = self.get_stacked_dataframe_from_dates(initial_date, final_date, mutable)
         interest.set_cumulative_values_by_rates(df, self.STACKED_RATE_COLUMN, DBCollection.STACKED_VALUE_COLUMN, initial_value)
         return df
 
 
-    def get_stacked_dataframe_adjusted_from_values(self, initial_value: float, initial_date: datetime, final_date: datetime, rate_value: float, rate_type: str) -> pd.DataFrame:
-        """Dia  Mês   Ano  Data  Taxa(%)  Valor(R$)  Valor ajustado(R$)  Taxa ajustada(%)"""
-        df = self.get_stacked_dataframe_from_values(initial_value, initial_date, final_date)
+    def get_stacked_dataframe_adjusted_from_values(self, initial_value: float, initial_date: datetime, final_date: datetime, rate_value: float, rate_type: str, mutable=False) -> pd.DataFrame:
+        """Dia  Mês   Ano  Data  Taxa(%)  Valor(R$)  Valor ajustado(R$)  Taxa ajustada(%)
+        
+        Only the stacked columns are read-only (see 'get_stacked_dataframe'); the calculated ones are always writable.
+        """
+        df = self.get_stacked_dataframe_from_values(initial_value, initial_date, final_date, mutable)
         
         if rate_type == interest.PREFIXED_RATE:
-            df[self.STACKED_ADJ_RATE_COLUMN] = interest.get_monthly_rates_from_prefixed_yearly_rate(rate_value)
+            df[self.STACKED_ADJ_RATE_COLUMN] = interest.get_period_rates_from_prefixed_yearly_rate(rate_value, self.get_periods_per_year())
             interest.set_cumulative_values_by_rates(df, self.STACKED_ADJ_RATE_COLUMN, self.STACKED_ADJ_VALUE_COLUMN, initial_value)
             df[self.STACKED_ADJ_VALUE_COLUMN] -= initial_value
             df[self.STACKED_ADJ_VALUE_COLUMN] += df[self.STACKED_VALUE_COLUMN]
@@ -163,90 +631,324 @@ class DBCollection(ABC):
         return df
 
 
+    def get_prefix_log_factors(self) -> np.ndarray:
+        """Cumulative growth log-factors, aligned with the date-sorted stacked rates (first item is 0.0)."""
+        return self.get_series().get_log_factors()
+
+    def get_index_range_from_dates(self, initial_date: datetime, final_date: datetime) -> tuple:
+        """Return the (start, stop) positions of the rates between the dates, by binary search."""
+        return self.__get_index_range_from_dates(self.get_series(), initial_date, final_date)
+
+    @staticmethod
+    def __get_index_range_from_dates(series: IndexerSeries, initial_date: datetime, final_date: datetime) -> tuple:
+        return series.get_index_range(
+            date.get_ordinal_from_datetime(initial_date, round_up=True),
+            date.get_ordinal_from_datetime(final_date),
+        )
+
+
     def get_adjusted_value_from_values(self, initial_value: float, initial_date: datetime, final_date: datetime, rate_value: float, rate_type: str) -> float:
-        df = self.get_stacked_dataframe_adjusted_from_values(initial_value, initial_date, final_date, rate_value, rate_type)
-        return df[self.STACKED_ADJ_VALUE_COLUMN].iloc[-1]
+        """Same as the last value of 'get_stacked_dataframe_adjusted_from_values', but using the prefix index.
+        
+        In the 'database' query mode, the growth factor of the period is computed by the database instead.
+        """
+        if self._query_mode == self.QUERY_MODE_DATABASE:
+            factor, total_periods = self.get_factor_from_db(initial_date, final_date)
+        else:
+            series = self._series
+            index_factors = series.get_factors()
+            start, stop = self.__get_index_range_from_dates(series, initial_date, final_date)
+            factor, total_periods = index_factors[stop] / index_factors[start], stop - start
+        if total_periods == 0:
+            raise IndexError("There are no rates registered between the given dates.")
+        
+        final_value = initial_value * factor
+        
+        if rate_type == interest.PREFIXED_RATE:
+            period_rate = interest.get_period_rates_from_prefixed_yearly_rate(rate_value, self.get_periods_per_year()) / 100
+            return final_value + initial_value * (((1 + period_rate) ** total_periods) - 1)
+        
+        elif rate_type == interest.PROPORTIONAL_RATE:
+            return initial_value + (final_value - initial_value) * (rate_value / 100)
+        
+        else:
+            return final_value
+
+
+    def get_adjusted_values_from_arrays(self, initial_values: np.ndarray, initial_dates: np.ndarray, final_dates: np.ndarray, rate_values: np.ndarray, rate_type_indexes: np.ndarray) -> np.ndarray:
+        """Vectorized 'get_adjusted_value_from_values', where each item is a scenario.
+        
+        The dates must be 'datetime64[ns]' arrays and the rate types are given by their indexes
+        in 'InterestCalculation.ADDED_RATE_TYPE_LIST'. Scenarios without rates in the period are NaN.
+        In the 'database' query mode, the registers from the first initial date to the last final date are fetched once.
+        """
+        if self._query_mode == self.QUERY_MODE_DATABASE:
+            series = self.get_series_from_db(initial_dates.min(), final_dates.max()) if len(initial_dates) else IndexerSeries([], [])
+        else:
+            series = self._series
+        index_factors = series.get_factors()
+        starts, stops = series.get_index_ranges(
+            date.get_ordinals_from_datetimes(initial_dates, round_up=True),
+            date.get_ordinals_from_datetimes(final_dates),
+        )
+        total_periods = stops - starts
+        
+        final_values = initial_values * (index_factors[stops] / index_factors[starts])
+        
+        period_rates = interest.get_period_rates_from_prefixed_yearly_rate(rate_values, self.get_periods_per_year()) / 100
+        prefixed_values = final_values + initial_values * (np.power(1 + period_rates, total_periods) - 1)
+        proportional_values = initial_values + (final_values - initial_values) * (rate_values / 100)
+        
+        adjusted_values = np.select(
+            [rate_type_indexes == interest.PREFIXED_RATE_INDEX, rate_type_indexes == interest.PROPORTIONAL_RATE_INDEX],
+            [prefixed_values, proportional_values],
+            default=final_values,
+        )
+        adjusted_values[total_periods == 0] = np.nan
+        return adjusted_values
 
 
     def get_years_from_stacked_dataframe(self, unique=True) -> list:
-        df = self.get_stacked_dataframe()
+        years = pd.DatetimeIndex(self.get_series().get_datetimes()).year
         if unique:
-            return pd.unique(df[self.STACKED_YEAR_COLUMN]).tolist()
+            return pd.unique(years).tolist()
         else:
-            return df[self.STACKED_YEAR_COLUMN].tolist()
+            return years.tolist()
 
 
-    def __get_transposed_stacked_dataframe(self):
-        df = self.get_stacked_dataframe()
+    def __get_transposed_stacked_dataframe(self, series: IndexerSeries) -> pd.DataFrame:
+        # Daily rates are compounded per month first
+        months, monthly_rates = series.get_monthly_rates()
+        months_since_epoch = months.astype(np.int64)
         
-        # Transpose
-        df = df.pivot(
-            index=self.STACKED_YEAR_COLUMN,
-            columns=self.STACKED_MONTH_COLUMN,
-            values=self.STACKED_RATE_COLUMN,
+        # Transpose (all the months are kept, even when some year is incomplete)
+        years, year_positions = np.unique(months_since_epoch // 12 + 1970, return_inverse=True)
+        table = np.full((len(years), len(self.TRANSPOSED_MONTHS_COLUMNS)), np.nan)
+        table[year_positions, months_since_epoch % 12] = monthly_rates
+        df = pd.DataFrame(
+            table,
+            index=pd.Index(years, name=self.STACKED_YEAR_COLUMN),
+            columns=pd.Index(self.TRANSPOSED_MONTHS_COLUMNS, name=self.STACKED_MONTH_COLUMN),
         )
         
-        # Rename and sort
-        df = df.rename(columns=date.MONTHS_DICT, inplace=False)
+        # Sort
         df = df.sort_index(ascending=False, inplace=False)
         
         # Add yearly rate column
         interest.set_yearly_rate_from_monthly_rates(df, self.TRANSPOSED_YEARLY_RATE_COLUMN, self.TRANSPOSED_MONTHS_COLUMNS)
-        return df
-
-    def get_transposed_stacked_dataframe(self):
-        """Janeiro Fevereiro Março Abril Maio Junho Julho Agosto Setembro Outubro Novembro Dezembro"""
-        return self._transposed_stacked_dataframe.copy()
+        
+        # Keep all the columns in a single read-only block
+        return pd.DataFrame(self.__get_read_only(df.to_numpy(dtype=np.float64)), index=df.index, columns=df.columns, copy=False)
 
+    def get_transposed_stacked_dataframe(self, mutable=False):
+        """Janeiro Fevereiro Março Abril Maio Junho Julho Agosto Setembro Outubro Novembro Dezembro
+        
+        By default, the dataframe is a read-only view (see 'get_stacked_dataframe'). Use 'mutable=True' to get a writable copy.
+        """
+        # Built only once per series, when it is requested
+        series = self.get_series()
+        cache = self._transposed_cache
+        if cache is None or cache[0] is not series:
+            cache = (series, self.__get_transposed_stacked_dataframe(series))
+            self._transposed_cache = cache
+        return cache[1].copy(deep=mutable)
 
 
 class IPCACollection(DBCollection):
-    def __init__(self, mongo_client: pymongo.MongoClient) -> None:
-        super().__init__(mongo_client, "economic_indexers", "ipca", "IPCA")
-        self.set_link_for_scraping(r"https://www.debit.com.br/tabelas/ipca-indice-nacional-de-precos-ao-consumidor-amplo")
+    DATABASE_NAME = "economic_indexers"
+    COLLECTION_NAME = "ipca"
+    TITLE = "IPCA"
+    LINK_FOR_SCRAPING = r"https://www.debit.com.br/tabelas/ipca-indice-nacional-de-precos-ao-consumidor-amplo"
+    
+    def __init__(self, mongo_client: pymongo.MongoClient, snapshot_dir: str = None, query_mode: str = None, granularity: str = None) -> None:
+        super().__init__(mongo_client, self.DATABASE_NAME, self.COLLECTION_NAME, self.TITLE, snapshot_dir, query_mode, granularity)
+        self.set_link_for_scraping(self.LINK_FOR_SCRAPING)
 
 class CDICollection(DBCollection):
-    def __init__(self, mongo_client: pymongo.MongoClient) -> None:
-        super().__init__(mongo_client, "economic_indexers", "cdi", "CDI")
-        self.set_link_for_scraping(r"http://www.yahii.com.br/cetip.html")
+    DATABASE_NAME = "economic_indexers"
+    COLLECTION_NAME = "cdi"
+    TITLE = "CDI"
+    LINK_FOR_SCRAPING = r"http://www.yahii.com.br/cetip.html"
+    
+    def __init__(self, mongo_client: pymongo.MongoClient, snapshot_dir: str = None, query_mode: str = None, granularity: str = None) -> None:
+        super().__init__(mongo_client, self.DATABASE_NAME, self.COLLECTION_NAME, self.TITLE, snapshot_dir, query_mode, granularity)
+        self.set_link_for_scraping(self.LINK_FOR_SCRAPING)
 
 class SELICCollection(DBCollection):
-    def __init__(self, mongo_client: pymongo.MongoClient) -> None:
-        super().__init__(mongo_client, "economic_indexers", "selic", "SELIC")
-        self.set_link_for_scraping(r"http://www.yahii.com.br/Selic.html")
+    DATABASE_NAME = "economic_indexers"
+    COLLECTION_NAME = "selic"
+    TITLE = "SELIC"
+    LINK_FOR_SCRAPING = r"http://www.yahii.com.br/Selic.html"
+    
+    def __init__(self, mongo_client: pymongo.MongoClient, snapshot_dir: str = None, query_mode: str = None, granularity: str = None) -> None:
+        super().__init__(mongo_client, self.DATABASE_NAME, self.COLLECTION_NAME, self.TITLE, snapshot_dir, query_mode, granularity)
+        self.set_link_for_scraping(self.LINK_FOR_SCRAPING)
 
 class FGTSCollection(DBCollection):
-    def __init__(self, mongo_client: pymongo.MongoClient) -> None:
-        super().__init__(mongo_client, "economic_indexers", "fgts", "FGTS")
-        self.set_link_for_scraping(r"http://www.yahii.com.br/fgts03a06.html")
+    DATABASE_NAME = "economic_indexers"
+    COLLECTION_NAME = "fgts"
+    TITLE = "FGTS"
+    LINK_FOR_SCRAPING = r"http://www.yahii.com.br/fgts03a06.html"
+    
+    def __init__(self, mongo_client: pymongo.MongoClient, snapshot_dir: str = None, query_mode: str = None, granularity: str = None) -> None:
+        super().__init__(mongo_client, self.DATABASE_NAME, self.COLLECTION_NAME, self.TITLE, snapshot_dir, query_mode, granularity)
+        self.set_link_for_scraping(self.LINK_FOR_SCRAPING)
 
 class PoupancaCollection(DBCollection):
-    def __init__(self, mongo_client: pymongo.MongoClient) -> None:
-        super().__init__(mongo_client, "economic_indexers", "poupanca", "POUPANCA")
-        self.set_link_for_scraping(r"http://www.yahii.com.br/poupanca.html")
+    DATABASE_NAME = "economic_indexers"
+    COLLECTION_NAME = "poupanca"
+    TITLE = "POUPANCA"
+    LINK_FOR_SCRAPING = r"http://www.yahii.com.br/poupanca.html"
+    
+    def __init__(self, mongo_client: pymongo.MongoClient, snapshot_dir: str = None, query_mode: str = None, granularity: str = None) -> None:
+        super().__init__(mongo_client, self.DATABASE_NAME, self.COLLECTION_NAME, self.TITLE, snapshot_dir, query_mode, granularity)
+        self.set_link_for_scraping(self.LINK_FOR_SCRAPING)
 
 
 
 class EconomicIndexers:
-    def __init__(self, mongo_client) -> None:
+    """Collections of all the Economic Indexers, registered by title.
+    
+    Each collection is only loaded from the database when it is requested for the first time.
+    When 'snapshot_dir' is given (or the INDEXER_SNAPSHOT_DIR environment variable is set), the
+    collections start from their local snapshots and only fetch the registers inserted after them.
+    Processes using the same 'snapshot_dir' (e.g. the workers of the API) share it: one at a time
+    synchronizes each collection with the database and the others load its snapshot. In a memory file
+    system (e.g. '/dev/shm/econindexer'), they also share the memory of the series (memory-mapped).
+    The query mode of each collection (see 'DBCollection.QUERY_MODES') is given by 'query_modes' or by
+    the INDEXER_QUERY_MODES environment variable (e.g. 'CDI:database,SELIC:database'); the default is 'memory'.
+    Likewise, the granularity of each collection is given by 'granularities' or by the INDEXER_GRANULARITIES
+    environment variable (e.g. 'CDI:daily,SELIC:daily'); the default is 'monthly'.
+    """
+    
+    SNAPSHOT_DIR_ENVIRONMENT_VARIABLE = "INDEXER_SNAPSHOT_DIR"
+    QUERY_MODES_ENVIRONMENT_VARIABLE = "INDEXER_QUERY_MODES"
+    GRANULARITIES_ENVIRONMENT_VARIABLE = "INDEXER_GRANULARITIES"
+    
+    DB_COLLECTION_CLASSES = [
+        IPCACollection,
+        CDICollection,
+        SELICCollection,
+        FGTSCollection,
+        PoupancaCollection,
+    ]
+    
+    def __init__(self, mongo_client, snapshot_dir: str = None, query_modes: dict = None, granularities: dict = None) -> None:
         self.mongo_client = mongo_client
+        self.snapshot_dir = snapshot_dir or os.getenv(self.SNAPSHOT_DIR_ENVIRONMENT_VARIABLE)
 
         self.db_collection_dict = {}
-        self.ipca = self.__add_to_db_collection_dict(IPCACollection(self.mongo_client))
-        self.cdi = self.__add_to_db_collection_dict(CDICollection(self.mongo_client))
-        self.selic = self.__add_to_db_collection_dict(SELICCollection(self.mongo_client))
-        self.fgts = self.__add_to_db_collection_dict(FGTSCollection(self.mongo_client))
-        self.poup = self.__add_to_db_collection_dict(PoupancaCollection(self.mongo_client))
-
-    def __add_to_db_collection_dict(self, db_collection: DBCollection, ) -> DBCollection:
-        self.db_collection_dict[db_collection.get_title()] = db_collection
-        return db_collection
+        self._db_collection_classes = {db_collection_class.TITLE: db_collection_class for db_collection_class in self.DB_COLLECTION_CLASSES}
+        self.query_modes = self.get_settings_from_environment(self.QUERY_MODES_ENVIRONMENT_VARIABLE) if query_modes is None else dict(query_modes)
+        self.granularities = self.get_settings_from_environment(self.GRANULARITIES_ENVIRONMENT_VARIABLE) if granularities is None else dict(granularities)
+        for title in list(self.query_modes) + list(self.granularities):
+            if title not in self._db_collection_classes:
+                logger.warning("Settings ignored for the unknown indexer '%s'", title)
+        self._db_collection_locks = {title: threading.Lock() for title in self._db_collection_classes}
+        self._load_times = {}
+
+    @staticmethod
+    def get_settings_from_environment(environment_variable: str) -> dict:
+        """Return the settings by title from an environment variable like 'CDI:database,SELIC:database'."""
+        settings = {}
+        for item in os.getenv(environment_variable, "").split(","):
+            if item.strip():
+                title, _, setting = item.partition(":")
+                settings[title.strip()] = setting.strip()
+        return settings
+
+    @property
+    def ipca(self) -> IPCACollection:
+        return self.get_db_collection_by_indexer(IPCACollection.TITLE)
+
+    @property
+    def cdi(self) -> CDICollection:
+        return self.get_db_collection_by_indexer(CDICollection.TITLE)
+
+    @property
+    def selic(self) -> SELICCollection:
+        return self.get_db_collection_by_indexer(SELICCollection.TITLE)
+
+    @property
+    def fgts(self) -> FGTSCollection:
+        return self.get_db_collection_by_indexer(FGTSCollection.TITLE)
+
+    @property
+    def poup(self) -> PoupancaCollection:
+        return self.get_db_collection_by_indexer(PoupancaCollection.TITLE)
 
     def get_db_collection_by_indexer(self, indexer_reference: str) -> DBCollection:
-        return self.db_collection_dict.get(indexer_reference)
+        """Return the collection, loading it on the first access. Unknown titles return None."""
+        return self.__get_db_collection(indexer_reference, build_dataframes=False)
+
+    def __get_db_collection(self, indexer_reference: str, build_dataframes: bool) -> DBCollection:
+        db_collection = self.db_collection_dict.get(indexer_reference)
+        if db_collection is not None or indexer_reference not in self._db_collection_classes:
+            return db_collection
+        with self._db_collection_locks[indexer_reference]:
+            # Another thread may have loaded the collection while we were waiting
+            db_collection = self.db_collection_dict.get(indexer_reference)
+            if db_collection is None:
+                start_time = time.perf_counter()
+                db_collection = self._db_collection_classes[indexer_reference](
+                    self.mongo_client, self.snapshot_dir, self.query_modes.get(indexer_reference), self.granularities.get(indexer_reference),
+                )
+                if build_dataframes:
+                    db_collection.build_dataframes()
+                self._load_times[indexer_reference] = time.perf_counter() - start_time
+                self.db_collection_dict[indexer_reference] = db_collection
+        return db_collection
+
+    def load_db_collections(self, indexer_references: list = None, build_dataframes: bool = False, max_workers: int = None) -> list:
+        """Return the collections (all of them by default), loading the missing ones concurrently.
+        
+        Each worker queries its collection (sharing the MongoClient connection pool) and, when 'build_dataframes'
+        is True, also builds its dataframes. Then, the cold start is close to the slowest collection alone.
+        """
+        if indexer_references is None:
+            indexer_references = self.get_db_collection_titles_list()
+        missing_references = [reference for reference in indexer_references if reference not in self.db_collection_dict]
+        if len(missing_references) > 1:
+            with ThreadPoolExecutor(max_workers=max_workers or len(missing_references)) as executor:
+                # Each worker runs in a copy of the caller context (e.g. to attribute its queries to the current request)
+                futures = [
+                    executor.submit(contextvars.copy_context().run, self.__get_db_collection, reference, build_dataframes)
+                    for reference in missing_references
+                ]
+                for future in futures:
+                    future.result()
+        elif missing_references:
+            self.__get_db_collection(missing_references[0], build_dataframes)
+        
+        for reference in missing_references:
+            if reference in self._load_times:
+                logger.info("%s loaded in %.3f s", reference, self._load_times[reference])
+        return [self.get_db_collection_by_indexer(reference) for reference in indexer_references]
+
+    def is_loaded(self, indexer_reference: str) -> bool:
+        """Return True when the collection is already loaded (then, getting it does not query the database)."""
+        return indexer_reference in self.db_collection_dict
+
+    def get_load_times(self) -> dict:
+        """Return the seconds spent loading each collection already loaded, by title."""
+        return dict(self._load_times)
 
     def get_db_collection_titles_list(self) -> list:
-        return [collection.get_title() for collection in self.db_collection_dict.values()]
+        return list(self._db_collection_classes)
+
+    def update_dataframes_from_db(self, incremental: bool = False) -> None:
+        """Update the collections already loaded (the others are loaded up to date when requested)."""
+        for collection in list(self.db_collection_dict.values()):
+            collection.update_dataframe_from_db(incremental)
+
+    def refresh_dataframes_from_db(self, max_staleness: float = 0.0) -> bool:
+        """Refresh the collections already loaded (see 'DBCollection.refresh_dataframe_from_db'). Return False if any of them failed."""
+        results = [collection.refresh_dataframe_from_db(max_staleness) for collection in list(self.db_collection_dict.values())]
+        return all(results)
+
+    def get_staleness(self) -> float:
+        """Return the staleness (in seconds) of the most outdated collection loaded (see 'DBCollection.get_staleness')."""
+        return max([collection.get_staleness() for collection in list(self.db_collection_dict.values())], default=0.0)
 
 
 
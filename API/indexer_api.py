@@ -1,8 +1,18 @@
 """This is an API, based on FastAPI, used to calculate Interest Value and Interest Rate based on some Brazilian Economic Indexers."""
 
+try:
+    import orjson as json
+except ModuleNotFoundError:
+    import json
+
+import numpy as np
+import pandas as pd
 import pymongo
 
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Header, Request, Response
+from fastapi.responses import PlainTextResponse, StreamingResponse
+
+from pydantic import BaseModel
 
 from datetime import datetime
 
@@ -17,12 +27,41 @@ except ModuleNotFoundError:
     from API.interest_rate import InterestCalculation as interest
 
 try:
-    from db_collection import EconomicIndexers
+    from indexer_cache import IndexerCache
+except ModuleNotFoundError:
+    from API.indexer_cache import IndexerCache
+
+try:
+    from db_collection import DBCollection, EconomicIndexers
+except ModuleNotFoundError:
+    from API.db_collection import DBCollection, EconomicIndexers
+
+try:
+    from series_export import ExportFormat, SeriesExport
+except ModuleNotFoundError:
+    from API.series_export import ExportFormat, SeriesExport
+
+try:
+    from request_executor import RequestExecutor
+except ModuleNotFoundError:
+    from API.request_executor import RequestExecutor
+
+try:
+    from request_metrics import RequestMetrics, MetricsMiddleware, MongoCommandListener
+except ModuleNotFoundError:
+    from API.request_metrics import RequestMetrics, MetricsMiddleware, MongoCommandListener
+
+try:
+    from request_profiler import ProfiledRoute, ProfilingMiddleware, get_profiled_function
 except ModuleNotFoundError:
-    from API.db_collection import EconomicIndexers
+    from API.request_profiler import ProfiledRoute, ProfilingMiddleware, get_profiled_function
+
+try:
+    from conditional_requests import ConditionalRequestMiddleware
+except ModuleNotFoundError:
+    from API.conditional_requests import ConditionalRequestMiddleware
 
 import os
-print(os.path.abspath(os.curdir))
 
 
 
@@ -51,17 +90,93 @@ app = FastAPI(
     version = "1.0.0",
 )
 
+# Latency per route, MongoDB commands per request and cache accesses (see '/metrics')
+request_metrics = RequestMetrics()
+
+# Slow requests are profiled on demand (see API_PROFILE, API_PROFILE_TOKEN and API_PROFILE_THRESHOLD_MS)
+app.router.route_class = ProfiledRoute
+
 
 
 from dotenv import load_dotenv
 load_dotenv(encoding="iso-8859-1")
 mongodb_credentials = os.getenv("MONGODB_CREDENTIALS")
-mongo_client = pymongo.MongoClient(mongodb_credentials)
+mongo_client = pymongo.MongoClient(mongodb_credentials, event_listeners=[MongoCommandListener(request_metrics)])
+
+# Indexers are loaded once and shared by all requests (see INDEXER_CACHE_TTL)
+indexer_cache = IndexerCache(mongo_client)
+cache_token = os.getenv("INDEXER_CACHE_TOKEN")
+
+# Blocking work of the routes runs in bounded thread pools, off the event loop (see API_IO_WORKERS and API_CPU_WORKERS)
+request_executor = RequestExecutor()
+
+
+@app.on_event("shutdown")
+def shutdown_request_executor():
+    request_executor.shutdown()
+
+
+def load_indexer_collection(indexer_reference: str) -> DBCollection:
+    """Return the collection of the indexer (None for an invalid reference), querying the database if needed."""
+    return indexer_cache.get_indexers().get_db_collection_by_indexer(indexer_reference)
+
+def load_indexer_collections(indexer_references: list) -> list:
+    """Return the collections of the valid references, loading the missing ones concurrently (see 'EconomicIndexers.load_db_collections')."""
+    indexers = indexer_cache.get_indexers()
+    titles = indexers.get_db_collection_titles_list()
+    return indexers.load_db_collections([reference for reference in indexer_references if reference in titles])
+
+async def get_indexer_collection(indexer_reference: str) -> DBCollection:
+    """Return the collection of the indexer (None for an invalid reference).
+
+    The request only waits on an I/O worker when the snapshot or the collection must be loaded from the database.
+    """
+    indexers = indexer_cache.get_indexers_if_fresh()
+    if indexers is not None and indexers.is_loaded(indexer_reference):
+        return indexers.get_db_collection_by_indexer(indexer_reference)
+    return await request_executor.run_io(get_profiled_function(load_indexer_collection), indexer_reference)
+
+async def run_indexer_query(indexer: DBCollection, function, *args):
+    """Run a query of the collection: in an I/O worker for the 'database' query mode, or directly otherwise.
+
+    In the 'memory' query mode, the queries are a few binary searches over arrays, cheaper than a thread hop.
+    """
+    function = get_profiled_function(function)
+    if indexer.get_query_mode() == DBCollection.QUERY_MODE_DATABASE:
+        return await request_executor.run_io(function, *args)
+    return function(*args)
+
+async def get_indexer_data_version(query_params: dict) -> tuple:
+    """Return the (version, last_modified, staleness) of the indexer used by the request, or None for an invalid 'indexer_reference'.
+
+    The staleness grows up to the cache TTL, or beyond it while the database is unavailable (the data loaded is still served).
+    The version is kept by the collection in both query modes, so it is read on the event loop, without an I/O worker.
+    """
+    indexer = await get_indexer_collection(query_params.get("indexer_reference"))
+    if indexer is None:
+        return None
+    return indexer.get_data_version(), indexer.get_last_modified(), indexer.get_staleness()
+
+# Middlewares are added after loading the environment, since they read their settings from it
+app.add_middleware(
+    ConditionalRequestMiddleware,
+    paths=["/final_value_by_indexer", "/interest_value_by_indexer", "/interest_rate_by_indexer", "/benchmarking_by_indexer"],
+    get_data_version=get_indexer_data_version,
+)
+# Exports are negotiated by the 'Accept' header and may be compressed
+app.add_middleware(
+    ConditionalRequestMiddleware,
+    paths=["/series_by_indexer", "/table_by_indexer"],
+    get_data_version=get_indexer_data_version,
+    vary=["Accept", "Accept-Encoding"],
+)
+app.add_middleware(MetricsMiddleware, metrics=request_metrics)
+app.add_middleware(ProfilingMiddleware)
 
 
 
 @app.get("/")
-def root():
+async def root():
     """Return a dictionary with some __APP properties__."""
     return {
         "App": "ECONIndexer API",
@@ -71,6 +186,35 @@ def root():
 
 
 
+@app.get("/metrics", response_class=PlainTextResponse)
+async def get_metrics():
+    """Return the __API metrics__ in the Prometheus text format: requests and latency per route,
+    MongoDB commands and documents per route, and the accesses to the Indexers snapshot.
+    """
+    content = request_metrics.get_prometheus_text(indexer_cache.get_stats())
+    return PlainTextResponse(content, media_type="text/plain; version=0.0.4")
+
+
+
+@app.post("/cache/invalidate")
+async def invalidate_cache(x_cache_token: str = Header(None)):
+    """Discard the __Indexers snapshot__ kept in memory, so the next request reloads it from the database.
+
+    Args:
+    > __X-Cache-Token (header):__ required only when the 'INDEXER_CACHE_TOKEN' environment variable is set  
+
+    Returns:
+    > __version (int):__ the version of the discarded snapshot.
+    """
+    if cache_token and x_cache_token != cache_token:
+        raise HTTPException(status_code=403, detail="Token inválido para invalidar o cache.")
+    version = indexer_cache.get_version()
+    # The lock may be held by a snapshot being built
+    await request_executor.run_io(indexer_cache.invalidate)
+    return {"version": version}
+
+
+
 @app.get("/interest_value")
 def get_interest_value(
     initial_value: float = 0.0,
@@ -110,7 +254,7 @@ def get_interest_rate(
 
 
 @app.get("/final_value_by_indexer")
-def get_final_value_by_indexer(
+async def get_final_value_by_indexer(
 	initial_value: float,
 	initial_date: datetime,
 	final_date: datetime,
@@ -131,17 +275,16 @@ def get_final_value_by_indexer(
     Returns:
     > __final_value (float):__ the total amount of money.
     """
-    indexers = EconomicIndexers(mongo_client)
-    indexer = indexers.get_db_collection_by_indexer(indexer_reference)
+    indexer = await get_indexer_collection(indexer_reference)
     if indexer:
         rate_value = indexer_add_rate
         rate_type = interest.ADDED_RATE_TYPE_LIST[indexer_type]
-        return indexer.get_adjusted_value_from_values(initial_value, initial_date, final_date, rate_value, rate_type)
+        return await run_indexer_query(indexer, indexer.get_adjusted_value_from_values, initial_value, initial_date, final_date, rate_value, rate_type)
     else:
         raise HTTPException(status_code=500, detail="O valor para a variável 'indexer_reference' é inválido.")
 
 @app.get("/interest_value_by_indexer")
-def get_interest_value_by_indexer(
+async def get_interest_value_by_indexer(
 	initial_value: float,
 	initial_date: datetime,
 	final_date: datetime,
@@ -162,12 +305,12 @@ def get_interest_value_by_indexer(
     Returns:
     > __interest_value_by_indexer (float):__ is the difference between Final and Initial values, considering the Economic Indexer and the given period.
     """
-    final_value_by_indexer = get_final_value_by_indexer(initial_value, initial_date, final_date, indexer_reference, indexer_type, indexer_add_rate)
+    final_value_by_indexer = await get_final_value_by_indexer(initial_value, initial_date, final_date, indexer_reference, indexer_type, indexer_add_rate)
     interest_value_by_indexer = get_interest_value(initial_value, final_value_by_indexer)
     return interest_value_by_indexer
 
 @app.get("/interest_rate_by_indexer")
-def get_interest_rate_by_indexer(
+async def get_interest_rate_by_indexer(
 	initial_value: float,
 	initial_date: datetime,
 	final_date: datetime,
@@ -188,14 +331,14 @@ def get_interest_rate_by_indexer(
     Returns:
     > __interest_rate_by_indexer (float):__ is the difference between Final and Initial values, divided per the Initial value, considering the Economic Indexer and the given period.
     """
-    final_value_by_indexer = get_final_value_by_indexer(initial_value, initial_date, final_date, indexer_reference, indexer_type, indexer_add_rate)
+    final_value_by_indexer = await get_final_value_by_indexer(initial_value, initial_date, final_date, indexer_reference, indexer_type, indexer_add_rate)
     interest_rate_by_indexer = get_interest_rate(initial_value, final_value_by_indexer)
     return interest_rate_by_indexer
 
 
 
 @app.get("/benchmarking_by_indexer")
-def get_benchmarking_by_indexer(
+async def get_benchmarking_by_indexer(
 	initial_value: float,
     final_value: float,
 	initial_date: datetime,
@@ -219,8 +362,7 @@ def get_benchmarking_by_indexer(
     Returns:
     > __benchmarking_by_indexer (float):__ is the Indexer Interest Value divided per the User Interest Value.
     """
-    indexers = EconomicIndexers(mongo_client)
-    indexer = indexers.get_db_collection_by_indexer(indexer_reference)
+    indexer = await get_indexer_collection(indexer_reference)
     if indexer_reference == "CDI":
         pass
     elif indexer is None:
@@ -229,7 +371,250 @@ def get_benchmarking_by_indexer(
         raise HTTPException(status_code=501, detail="Método ainda não implementado para o valor da variável 'indexer_reference'.")
     indexer_type = 0 # None
     indexer_add_rate = 0.0 # None
-    interest_value_by_indexer = get_interest_value_by_indexer(initial_value, initial_date, final_date, indexer_reference, indexer_type, indexer_add_rate)
+    interest_value_by_indexer = await get_interest_value_by_indexer(initial_value, initial_date, final_date, indexer_reference, indexer_type, indexer_add_rate)
     interest_value = get_interest_value(initial_value, final_value)
     benchmarking_by_indexer = interest_value / interest_value_by_indexer
     return benchmarking_by_indexer
+
+
+
+async def iterate_in_cpu_executor(chunks):
+    """Yield the items of a (blocking) iterator, each one computed by a CPU worker."""
+    chunks = iter(chunks)
+    while True:
+        chunk = await request_executor.run_cpu(next, chunks, None)
+        if chunk is None:
+            return
+        yield chunk
+
+
+def get_export_format(export_format: str, accept: str, formats: list) -> str:
+    """Return the format given by 'export_format' or, when missing, the one preferred by the 'Accept' header (the first of 'formats' by default)."""
+    if export_format is None:
+        return ExportFormat.get_format_from_accept(accept, formats) or formats[0]
+    if export_format not in formats:
+        raise HTTPException(status_code=422, detail=f"O valor para a variável 'export_format' deve ser {', '.join(formats[:-1])} ou {formats[-1]}.")
+    if not ExportFormat.is_available(export_format):
+        raise HTTPException(status_code=406, detail=f"O formato '{export_format}' requer o pacote 'pyarrow', não instalado na API.")
+    return export_format
+
+
+@app.get("/series_by_indexer")
+async def get_series_by_indexer(
+	initial_value: float,
+	initial_date: datetime,
+	final_date: datetime,
+	indexer_reference: str,
+	indexer_type: int,
+	indexer_add_rate: float,
+    export_format: str = None,
+    accept: str = Header(None),
+    accept_encoding: str = Header(None),
+    ):
+    """Return the __Adjusted Series__ of some Economic Indexer, period by period, as CSV, NDJSON, Arrow IPC stream or Parquet.
+
+    The rows are sent while they are calculated (except for Parquet), so long periods start arriving immediately.
+    The format is given by 'export_format' or by the 'Accept' header (e.g. _application/vnd.apache.arrow.stream_).
+    When the request accepts 'gzip' (header 'Accept-Encoding'), CSV and NDJSON are compressed.
+
+    Args:
+    > __initial_value (float):__ the Initial amount of money  
+    > __initial_date (datetime):__ the initial date  
+    > __final_date (datetime):__ the final date  
+    > __indexer_reference (str):__ a string with _IPCA_, _CDI_, _SELIC_, _FGTS_ or _POUPANCA_  
+    > __indexer_type (int):__ 0=None; 1=Prefixed; 2=Proportional  
+    > __indexer_add_rate (float)[%]:__ if Prefixed type, a rate to 'sum'; if Proportional type, a rate to multiply per the indexer rate  
+    > __export_format (str, optional):__ _csv_, _ndjson_, _arrow_ or _parquet_ (the last two require 'pyarrow'). Defaults to the 'Accept' header, or _csv_.  
+    
+    Returns:
+    > __series (csv/ndjson/arrow/parquet):__ one row per period, with _date_, _rate_ (%), _value_, _adjusted_rate_ (%) and _adjusted_value_.
+    The last _adjusted_value_ is the result of '/final_value_by_indexer'.
+    """
+    export_format = get_export_format(export_format, accept, SeriesExport.FORMATS)
+    if indexer_type not in range(len(interest.ADDED_RATE_TYPE_LIST)):
+        raise HTTPException(status_code=422, detail="O valor para a variável 'indexer_type' deve ser 0, 1 ou 2.")
+    indexer = await get_indexer_collection(indexer_reference)
+    if indexer is None:
+        raise HTTPException(status_code=500, detail="O valor para a variável 'indexer_reference' é inválido.")
+    
+    series, start, stop = await run_indexer_query(indexer, indexer.get_series_range_from_dates, initial_date, final_date)
+    export = SeriesExport(series, start, stop, initial_value, indexer_add_rate, interest.ADDED_RATE_TYPE_LIST[indexer_type], indexer.get_periods_per_year())
+    media_type = ExportFormat.MEDIA_TYPES[export_format]
+    headers = {"Content-Disposition": f'attachment; filename="{indexer_reference}.{export_format}"'}
+    if export_format == ExportFormat.PARQUET:
+        content = await request_executor.run_cpu(get_profiled_function(export.get_parquet))
+        return Response(content=content, media_type=media_type, headers=headers)
+    
+    chunks = export.iter_chunks(export_format)
+    if export_format not in ExportFormat.ARROW_FORMATS and accept_encoding and "gzip" in accept_encoding.lower():
+        chunks = ExportFormat.iter_gzip(chunks)
+        headers["Content-Encoding"] = "gzip"
+    return StreamingResponse(iterate_in_cpu_executor(chunks), media_type=media_type, headers=headers)
+
+
+
+TABLE_FORMATS = [ExportFormat.JSON, ExportFormat.ARROW, ExportFormat.PARQUET]
+
+def get_table_content(indexer: DBCollection, export_format: str) -> bytes:
+    df = indexer.get_transposed_stacked_dataframe()
+    if export_format == ExportFormat.JSON:
+        return df.reset_index().to_json(orient="records", double_precision=15, force_ascii=False).encode("utf-8")
+    table = ExportFormat.get_arrow_table_from_dataframe(df)
+    if export_format == ExportFormat.PARQUET:
+        return ExportFormat.get_parquet(table)
+    return b"".join(ExportFormat.iter_arrow_stream(table.schema, table.to_batches()))
+
+
+@app.get("/table_by_indexer")
+async def get_table_by_indexer(
+    indexer_reference: str,
+    export_format: str = None,
+    accept: str = Header(None),
+    ):
+    """Return the __Monthly Rates per Year__ of some Economic Indexer (the historic table of the user app), as JSON, Arrow IPC stream or Parquet.
+
+    The format is given by 'export_format' or by the 'Accept' header (e.g. _application/vnd.apache.parquet_).
+
+    Args:
+    > __indexer_reference (str):__ a string with _IPCA_, _CDI_, _SELIC_, _FGTS_ or _POUPANCA_  
+    > __export_format (str, optional):__ _json_, _arrow_ or _parquet_ (the last two require 'pyarrow'). Defaults to the 'Accept' header, or _json_.  
+    
+    Returns:
+    > __table (json/arrow/parquet):__ one row per year (most recent first), with _Ano_, the rates (%) of each month (null when missing) and _Anual(%)_.
+    """
+    export_format = get_export_format(export_format, accept, TABLE_FORMATS)
+    indexer = await get_indexer_collection(indexer_reference)
+    if indexer is None:
+        raise HTTPException(status_code=500, detail="O valor para a variável 'indexer_reference' é inválido.")
+    if indexer.get_query_mode() == DBCollection.QUERY_MODE_DATABASE:
+        # The whole collection is loaded first, so the CPU worker does not wait on the database
+        await request_executor.run_io(get_profiled_function(indexer.get_series))
+    # The pivot and the serialization of the whole table would block the event loop
+    content = await request_executor.run_cpu(get_profiled_function(get_table_content), indexer, export_format)
+    headers = {}
+    if export_format != ExportFormat.JSON:
+        headers["Content-Disposition"] = f'attachment; filename="{indexer_reference}.{export_format}"'
+    return Response(content=content, media_type=ExportFormat.MEDIA_TYPES[export_format], headers=headers)
+
+
+
+class IndexerScenario(BaseModel):
+    """One scenario of the '/final_values_by_indexer' batch, with the same fields of '/final_value_by_indexer'."""
+    initial_value: float
+    initial_date: datetime
+    final_date: datetime
+    indexer_reference: str
+    indexer_type: int
+    indexer_add_rate: float
+
+
+def get_scenarios_dataframe_from_json(body: bytes) -> pd.DataFrame:
+    """Parse a JSON array of scenarios into a columnar dataframe, without building one object per scenario."""
+    try:
+        scenarios = json.loads(body)
+    except ValueError:
+        raise HTTPException(status_code=422, detail="O corpo da requisição não é um JSON válido.")
+    if not isinstance(scenarios, list) or (scenarios and not isinstance(scenarios[0], dict)):
+        raise HTTPException(status_code=422, detail="O corpo da requisição deve ser uma lista de cenários.")
+    
+    fields = list(IndexerScenario.__fields__)
+    try:
+        df = pd.DataFrame(scenarios, columns=fields)
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=422, detail="O corpo da requisição deve ser uma lista de cenários.")
+    missing_fields = [field for field in fields if df[field].isna().any()]
+    if missing_fields:
+        raise HTTPException(status_code=422, detail=f"Campos ausentes ou nulos nos cenários: {missing_fields}.")
+    invalid_rows = np.flatnonzero(~df["indexer_reference"].map(lambda value: isinstance(value, str)).to_numpy(dtype=bool)).tolist()
+    if invalid_rows:
+        raise HTTPException(status_code=422, detail=f"O valor para a variável 'indexer_reference' deve ser um texto nos cenários: {invalid_rows}.")
+    titles = [db_collection_class.TITLE for db_collection_class in EconomicIndexers.DB_COLLECTION_CLASSES]
+    unknown_rows = np.flatnonzero(~df["indexer_reference"].isin(titles).to_numpy(dtype=bool)).tolist()
+    if unknown_rows:
+        raise HTTPException(status_code=422, detail=f"O valor para a variável 'indexer_reference' é inválido nos cenários: {unknown_rows}.")
+
+    try:
+        for field in ["initial_value", "indexer_add_rate"]:
+            df[field] = pd.to_numeric(df[field], errors="raise").astype(np.float64)
+        df["indexer_type"] = pd.to_numeric(df["indexer_type"], errors="raise", downcast="integer")
+        for field in ["initial_date", "final_date"]:
+            df[field] = pd.to_datetime(df[field], errors="raise")
+    except (ValueError, TypeError) as error:
+        raise HTTPException(status_code=422, detail=f"Valor inválido nos cenários: {error}.")
+    
+    if not df["indexer_type"].isin(range(len(interest.ADDED_RATE_TYPE_LIST))).all():
+        raise HTTPException(status_code=422, detail="O valor para a variável 'indexer_type' deve ser 0, 1 ou 2.")
+    return df
+
+
+def get_final_values_from_scenarios(df: pd.DataFrame) -> pd.DataFrame:
+    """Evaluate all scenarios, one vectorized pass per Economic Indexer."""
+    indexers = indexer_cache.get_indexers()
+    final_values = np.full(len(df), np.nan)
+    scenarios_by_indexer = df.groupby("indexer_reference").indices
+    
+    # Indexers not loaded yet are loaded concurrently
+    load_indexer_collections(list(scenarios_by_indexer))
+    
+    for indexer_reference, positions in scenarios_by_indexer.items():
+        indexer = indexers.get_db_collection_by_indexer(indexer_reference)
+        if indexer is None:
+            raise HTTPException(status_code=500, detail=f"O valor para a variável 'indexer_reference' é inválido: {indexer_reference}.")
+        scenarios = df.iloc[positions]
+        final_values[positions] = indexer.get_adjusted_values_from_arrays(
+            scenarios["initial_value"].to_numpy(),
+            scenarios["initial_date"].to_numpy(dtype="datetime64[ns]"),
+            scenarios["final_date"].to_numpy(dtype="datetime64[ns]"),
+            scenarios["indexer_add_rate"].to_numpy(),
+            scenarios["indexer_type"].to_numpy(),
+        )
+    
+    initial_values = df["initial_value"].to_numpy()
+    interest_values = final_values - initial_values
+    with np.errstate(divide="ignore", invalid="ignore"):
+        interest_rates = np.where(initial_values != 0, interest_values / initial_values, np.nan)
+    return pd.DataFrame({
+        "final_value": final_values,
+        "interest_value": interest_values,
+        "interest_rate": interest_rates,
+    })
+
+
+def get_final_values_content(df: pd.DataFrame) -> str:
+    """Evaluate all scenarios and return the JSON content of the '/final_values_by_indexer' response."""
+    return get_final_values_from_scenarios(df).to_json(orient="records", double_precision=15)
+
+
+@app.post(
+    "/final_values_by_indexer",
+    openapi_extra={
+        "requestBody": {
+            "required": True,
+            "content": {"application/json": {"schema": {"type": "array", "items": IndexerScenario.schema()}}},
+        },
+    },
+)
+async def get_final_values_by_indexer(request: Request):
+    """Return the __Final Value__, __Interest Value__ and __Interest Rate__ for a batch of scenarios.
+
+    Each scenario has the same parameters of '/final_value_by_indexer', and the scenarios may
+    use different Economic Indexers. All of them are evaluated at once, as arrays.
+
+    Args:
+    > __body (list):__ a JSON array of scenarios, like  
+    > _[{"initial_value": 1000, "initial_date": "2010-01-01", "final_date": "2020-12-01", "indexer_reference": "CDI", "indexer_type": 2, "indexer_add_rate": 110}]_  
+
+    Returns:
+    > __results (list):__ one item per scenario, in the same order, with _final_value_, _interest_value_ and _interest_rate_.
+    Values are _null_ when there are no indexer rates in the period (or the initial value is zero, for the rate).
+    """
+    body = await request.body()
+    df = await request_executor.run_cpu(get_profiled_function(get_scenarios_dataframe_from_json), body)
+    
+    # Indexers are loaded first, so the CPU workers do not wait on the database (unless in the 'database' query mode)
+    indexers = await request_executor.run_io(get_profiled_function(load_indexer_collections), df["indexer_reference"].unique().tolist())
+    if any(indexer.get_query_mode() == DBCollection.QUERY_MODE_DATABASE for indexer in indexers):
+        content = await request_executor.run_io(get_profiled_function(get_final_values_content), df)
+    else:
+        content = await request_executor.run_cpu(get_profiled_function(get_final_values_content), df)
+    return Response(content=content, media_type="application/json")
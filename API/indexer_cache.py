@@ -0,0 +1,166 @@
+"""Script used to keep a process-wide snapshot of the Economic Indexers registered in MongoDB."""
+
+import os
+import time
+import threading
+
+import pymongo
+
+try:
+    from db_collection import EconomicIndexers
+except ModuleNotFoundError:
+    from API.db_collection import EconomicIndexers
+
+
+
+class IndexerCache:
+    """Thread-safe and versioned snapshot of the EconomicIndexers, shared by the whole process.
+
+    The snapshot is built on the first access and reused until the TTL expires. Then, the
+    next access fetches only the registers inserted since the last load ('incremental' update),
+    while the concurrent accesses keep getting the current snapshot (stale-while-revalidate).
+    When the update fails, the current snapshot is still served and the update is retried
+    after 'retry_seconds' (see 'get_staleness').
+    When the processes (e.g. the API workers) share a snapshot directory, only one of them updates each
+    collection from the database and the others load its snapshot (see 'EconomicIndexers').
+    After 'invalidate' is called, the next access rebuilds the whole snapshot.
+    """
+
+    # Time to live (in seconds) of the snapshot, when not given by the caller
+    DEFAULT_TTL_SECONDS = 900.0
+    TTL_ENVIRONMENT_VARIABLE = "INDEXER_CACHE_TTL"
+
+    # Time (in seconds) before retrying a failed update
+    DEFAULT_RETRY_SECONDS = 30.0
+
+    def __init__(self, mongo_client: pymongo.MongoClient, ttl_seconds: float = None, retry_seconds: float = None) -> None:
+        self._mongo_client = mongo_client
+        self._ttl_seconds = self.get_ttl_from_environment() if ttl_seconds is None else ttl_seconds
+        self._retry_seconds = self.DEFAULT_RETRY_SECONDS if retry_seconds is None else retry_seconds
+        self._lock = threading.Lock()
+        # Held by the single thread updating an expired snapshot
+        self._update_lock = threading.Lock()
+        self._indexers = None
+        self._loaded_at = 0.0
+        self._retry_at = 0.0
+        self._version = 0
+        # Not synchronized on the fast path: the counts may miss concurrent accesses
+        self._hits = 0
+        self._misses = 0
+        self._updates = 0
+        self._stale_hits = 0
+        self._failed_updates = 0
+
+
+    @classmethod
+    def get_ttl_from_environment(cls) -> float:
+        return float(os.getenv(cls.TTL_ENVIRONMENT_VARIABLE, cls.DEFAULT_TTL_SECONDS))
+
+    def get_ttl(self) -> float:
+        return self._ttl_seconds
+
+    def get_version(self) -> int:
+        """Return a number incremented every time a new snapshot is built."""
+        return self._version
+
+    def get_age(self) -> float:
+        """Return the age (in seconds) of the current snapshot."""
+        return time.monotonic() - self._loaded_at
+
+    def get_staleness(self) -> float:
+        """Return the seconds since the most outdated collection of the snapshot was synchronized with the database."""
+        indexers = self._indexers
+        return 0.0 if indexers is None else indexers.get_staleness()
+
+    def get_stats(self) -> dict:
+        """Return the accesses served by the current snapshot (hits), by a new one (misses), by an updated one (updates)
+        or by the previous one, while another thread updates it (stale hits).
+        """
+        return {
+            "hits_total": self._hits,
+            "misses_total": self._misses,
+            "updates_total": self._updates,
+            "stale_hits_total": self._stale_hits,
+            "failed_updates_total": self._failed_updates,
+            "version": self._version,
+            "age_seconds": self.get_age() if self._indexers is not None else 0.0,
+            "staleness_seconds": self.get_staleness(),
+        }
+
+
+    def __is_expired(self) -> bool:
+        if self._indexers is None:
+            return True
+        return self.get_age() >= self._ttl_seconds and time.monotonic() >= self._retry_at
+
+    def __update(self, indexers: EconomicIndexers) -> None:
+        # With a shared snapshot (see 'EconomicIndexers'), the collections synchronized by another process less than a TTL ago are only reloaded
+        updated = indexers.refresh_dataframes_from_db(self._ttl_seconds)
+        if indexers is not self._indexers:
+            # Invalidated while updating
+            return
+        if updated:
+            # The snapshot expires a TTL after its synchronization (by this or another process), checked again after 'retry_seconds' at least
+            self._loaded_at = time.monotonic() - min(indexers.get_staleness(), max(self._ttl_seconds - self._retry_seconds, 0.0))
+            self._version += 1
+            self._updates += 1
+        else:
+            # The current snapshot is kept (the collections log the errors)
+            self._retry_at = time.monotonic() + self._retry_seconds
+            self._failed_updates += 1
+
+    def get_indexers(self) -> EconomicIndexers:
+        """Return the current snapshot, building it if missing or updating it if expired.
+
+        Only one thread updates an expired snapshot; the others get it as is, without waiting.
+        """
+        indexers = self._indexers
+        if indexers is not None and not self.__is_expired():
+            self._hits += 1
+            return indexers
+        if indexers is None:
+            with self._lock:
+                # Another thread may have built the snapshot while we were waiting
+                if self._indexers is None:
+                    self._indexers = EconomicIndexers(self._mongo_client)
+                    self._loaded_at = time.monotonic()
+                    self._retry_at = 0.0
+                    self._version += 1
+                    self._misses += 1
+                else:
+                    self._hits += 1
+                return self._indexers
+
+        if not self._update_lock.acquire(blocking=False):
+            self._stale_hits += 1
+            return indexers
+        try:
+            # Another thread may have updated the snapshot meanwhile
+            if self.__is_expired():
+                self.__update(indexers)
+            else:
+                self._hits += 1
+        finally:
+            self._update_lock.release()
+        return indexers
+
+    def get_indexers_if_fresh(self) -> EconomicIndexers:
+        """Return the current snapshot without waiting, or None when it must be built or updated first (see 'get_indexers').
+
+        While another thread updates the snapshot, the current one is returned.
+        """
+        indexers = self._indexers
+        if indexers is None:
+            return None
+        if self.__is_expired():
+            if not self._update_lock.locked():
+                return None
+            self._stale_hits += 1
+            return indexers
+        self._hits += 1
+        return indexers
+
+    def invalidate(self) -> None:
+        """Force the next access to build a new snapshot (e.g. after inserting new registers)."""
+        with self._lock:
+            self._indexers = None
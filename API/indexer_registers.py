@@ -0,0 +1,140 @@
+"""Script used to read and write the latest registers of the Brazilian Economic Indexers, without loading their history."""
+
+import logging
+import pymongo
+
+from datetime import date
+
+try:
+    from db_collection import DBCollection, EconomicIndexers
+except ModuleNotFoundError:
+    from API.db_collection import DBCollection, EconomicIndexers
+
+
+logger = logging.getLogger(__name__)
+
+
+
+class IndexerRegisters:
+    """Lightweight data path of the admin app: the last register of every indexer and the insertion of a new month.
+
+    Nothing is loaded from the collections besides their last register.
+    """
+
+    DB_COLLECTION_CLASSES = EconomicIndexers.DB_COLLECTION_CLASSES
+
+    # Field added to the aggregated registers, so each one can be related to its collection
+    COLLECTION_FIELD = "_collection"
+
+    # Error code returned by servers without transactions (standalone servers)
+    ILLEGAL_OPERATION_CODE = 20
+
+    def __init__(self, mongo_client: pymongo.MongoClient) -> None:
+        self._mongo_client = mongo_client
+        self._db_collection_classes = {db_collection_class.TITLE: db_collection_class for db_collection_class in self.DB_COLLECTION_CLASSES}
+
+
+    def get_titles_list(self) -> list:
+        return list(self._db_collection_classes)
+
+    def get_link_for_scraping(self, title: str) -> str:
+        return self._db_collection_classes[title].LINK_FOR_SCRAPING
+
+    def __get_db_collection(self, title: str) -> pymongo.collection.Collection:
+        db_collection_class = self._db_collection_classes[title]
+        return self._mongo_client.get_database(db_collection_class.DATABASE_NAME).get_collection(db_collection_class.COLLECTION_NAME)
+
+
+    def get_last_items(self) -> dict:
+        """Return the last register (year, month, day, value) of each indexer, by title.
+
+        The registers are fetched in a single round trip ('$unionWith', MongoDB 4.4+), or one query
+        per indexer when the server does not support it. Indexers without registers are not returned.
+        """
+        try:
+            return self.__get_last_items_by_aggregation()
+        except (pymongo.errors.OperationFailure, NotImplementedError) as error:
+            logger.info("Last registers fetched one by one ($unionWith not supported: %s)", error)
+            return self.__get_last_items_by_collection()
+
+    def __get_last_item_pipeline(self, title: str) -> list:
+        return [
+            {"$sort": {DBCollection.DB_ID_COLUMN: pymongo.DESCENDING}},
+            {"$limit": 1},
+            {"$addFields": {self.COLLECTION_FIELD: title}},
+        ]
+
+    def __get_last_items_by_aggregation(self) -> dict:
+        titles = self.get_titles_list()
+        database_names = {db_collection_class.DATABASE_NAME for db_collection_class in self.DB_COLLECTION_CLASSES}
+        if len(database_names) > 1:
+            # '$unionWith' only reads collections of the same database
+            return self.__get_last_items_by_collection()
+
+        pipeline = self.__get_last_item_pipeline(titles[0])
+        for title in titles[1:]:
+            pipeline.append({"$unionWith": {
+                "coll": self._db_collection_classes[title].COLLECTION_NAME,
+                "pipeline": self.__get_last_item_pipeline(title),
+            }})
+        items = self.__get_db_collection(titles[0]).aggregate(pipeline)
+        return {item.pop(self.COLLECTION_FIELD): item for item in items}
+
+    def __get_last_items_by_collection(self) -> dict:
+        last_items = {}
+        for title in self.get_titles_list():
+            item = self.__get_db_collection(title).find_one({}, sort=[(DBCollection.DB_ID_COLUMN, pymongo.DESCENDING)])
+            if item is not None:
+                last_items[title] = item
+        return last_items
+
+
+    @staticmethod
+    def get_item(item_date: date, item_rate: float) -> dict:
+        return {
+            DBCollection.DB_YEAR_COLUMN: item_date.year,
+            DBCollection.DB_MONTH_COLUMN: item_date.month,
+            DBCollection.DB_DAY_COLUMN: item_date.day,
+            DBCollection.DB_RATE_COLUMN: item_rate,
+        }
+
+    def insert_items(self, item_date: date, rates: dict) -> None:
+        """Insert the register of 'item_date' for each indexer ('rates' by title): either all of them or none.
+
+        The registers are inserted in a transaction (replica sets and sharded clusters). On servers without
+        transactions, they are inserted one by one and the inserted ones are deleted if any insertion fails.
+        """
+        updated_at = DBCollection.get_update_time()
+        items = {title: dict(self.get_item(item_date, rate), **{DBCollection.DB_UPDATED_AT_COLUMN: updated_at}) for title, rate in rates.items()}
+        try:
+            self.__insert_items_in_transaction(items)
+        except (pymongo.errors.OperationFailure, pymongo.errors.ConfigurationError, NotImplementedError) as error:
+            if not self.__is_transaction_not_supported(error):
+                raise
+            logger.info("Registers inserted without a transaction (not supported: %s)", error)
+            self.__insert_items_with_compensation(items)
+
+    def __is_transaction_not_supported(self, error: Exception) -> bool:
+        if isinstance(error, pymongo.errors.OperationFailure):
+            return error.code == self.ILLEGAL_OPERATION_CODE
+        return True
+
+    def __insert_items_in_transaction(self, items: dict) -> None:
+        def insert_items(session) -> None:
+            for title, item in items.items():
+                # A copy is inserted, since the driver adds the '_id' to the document (and the transaction may be retried)
+                self.__get_db_collection(title).insert_one(dict(item), session=session)
+
+        with self._mongo_client.start_session() as session:
+            session.with_transaction(insert_items)
+
+    def __insert_items_with_compensation(self, items: dict) -> None:
+        inserted_ids = {}
+        try:
+            for title, item in items.items():
+                # A copy is inserted, since the driver adds the '_id' to the document
+                inserted_ids[title] = self.__get_db_collection(title).insert_one(dict(item)).inserted_id
+        except pymongo.errors.PyMongoError:
+            for title, inserted_id in inserted_ids.items():
+                self.__get_db_collection(title).delete_one({DBCollection.DB_ID_COLUMN: inserted_id})
+            raise
@@ -0,0 +1,142 @@
+"""Script used to store the rates of some Brazilian Economic Indexer as compact arrays."""
+
+import zlib
+
+import numpy as np
+
+try:
+    from dates import DateOperations as date
+except ModuleNotFoundError:
+    from API.dates import DateOperations as date
+
+try:
+    from interest_rate import InterestCalculation as interest
+except ModuleNotFoundError:
+    from API.interest_rate import InterestCalculation as interest
+
+
+
+class IndexerSeries:
+    """Immutable series of rates, sorted by date, with its prefix of cumulative growth factors.
+
+    Dates are stored as 'int32' ordinals (days since 1970-01-01) and rates as 'float64' (%).
+    A new series is created for every update, so readers holding the previous one are never affected.
+    """
+
+    def __init__(self, ordinals: np.ndarray, rates: np.ndarray, last_id=None, factors: np.ndarray = None, log_factors: np.ndarray = None, updated_at=None) -> None:
+        ordinals = np.asarray(ordinals, dtype=np.int32)
+        rates = np.asarray(rates, dtype=np.float64)
+        if len(ordinals) > 1 and np.any(ordinals[1:] < ordinals[:-1]):
+            order = np.argsort(ordinals, kind="stable")
+            ordinals, rates = ordinals[order], rates[order]
+            factors, log_factors = None, None
+
+        self._ordinals = self.__get_read_only(ordinals)
+        self._rates = self.__get_read_only(rates)
+        self._factors = self.__get_read_only(interest.get_prefix_factors_from_rates(rates) if factors is None else factors)
+        self._log_factors = self.__get_read_only(interest.get_prefix_log_factors_from_rates(rates) if log_factors is None else log_factors)
+        self._last_id = last_id
+        self._updated_at = updated_at
+        self._version = None
+
+    @staticmethod
+    def __get_read_only(array: np.ndarray) -> np.ndarray:
+        array = array.view()
+        array.flags.writeable = False
+        return array
+
+
+    @classmethod
+    def from_values(cls, years: np.ndarray, months: np.ndarray, days: np.ndarray, rates: np.ndarray, last_id=None):
+        return cls(date.get_ordinals_from_values(years, months, days), rates, last_id)
+
+    def append(self, ordinals: np.ndarray, rates: np.ndarray, last_id=None, updated_at=None):
+        """Return a new series with the rates appended, extending the prefix factors from the last one.
+
+        The new ordinals must be after the last one; otherwise the whole series is sorted and rebuilt.
+        """
+        ordinals = np.asarray(ordinals, dtype=np.int32)
+        rates = np.asarray(rates, dtype=np.float64)
+        last_id = self._last_id if last_id is None else last_id
+        updated_at = max([value for value in [self._updated_at, updated_at] if value is not None], default=None)
+        all_ordinals = np.concatenate([self._ordinals, ordinals])
+        all_rates = np.concatenate([self._rates, rates])
+        if len(ordinals) == 0 or (len(self) and ordinals.min() <= self._ordinals[-1]) or np.any(np.diff(ordinals) < 0):
+            return IndexerSeries(all_ordinals, all_rates, last_id, updated_at=updated_at)
+        return IndexerSeries(
+            all_ordinals,
+            all_rates,
+            last_id,
+            np.concatenate([self._factors, self._factors[-1] * interest.get_prefix_factors_from_rates(rates)[1:]]),
+            np.concatenate([self._log_factors, self._log_factors[-1] + interest.get_prefix_log_factors_from_rates(rates)[1:]]),
+            updated_at,
+        )
+
+
+    def __len__(self) -> int:
+        return len(self._ordinals)
+
+    def get_last_id(self):
+        """The '_id' of the last database register included in the series."""
+        return self._last_id
+
+    def get_updated_at(self):
+        """The latest 'updated_at' of the database registers included in the series (None when none of them has it)."""
+        return self._updated_at
+
+    def get_version(self) -> str:
+        """Identify the data of the series ('<last _id>-<length>-<checksum>').
+
+        It changes whenever registers are added or removed and, thanks to the checksum of the
+        dates, rates and last update time, also when existing registers are corrected.
+        """
+        if self._version is None:
+            checksum = zlib.crc32(self._rates.tobytes(), zlib.crc32(self._ordinals.tobytes()))
+            if self._updated_at is not None:
+                checksum = zlib.crc32(self._updated_at.isoformat().encode("ascii"), checksum)
+            self._version = f"{self._last_id}-{len(self)}-{checksum:08x}"
+        return self._version
+
+    def get_ordinals(self) -> np.ndarray:
+        return self._ordinals
+
+    def get_rates(self) -> np.ndarray:
+        return self._rates
+
+    def get_factors(self) -> np.ndarray:
+        """Cumulative growth factors, where 'factors[k]' is the growth of the first 'k' rates (first item is 1.0)."""
+        return self._factors
+
+    def get_log_factors(self) -> np.ndarray:
+        """Cumulative growth log-factors, where 'log_factors[k]' is the log-growth of the first 'k' rates (first item is 0.0)."""
+        return self._log_factors
+
+    def get_datetimes(self) -> np.ndarray:
+        return date.get_datetimes_from_ordinals(self._ordinals)
+
+    def get_monthly_rates(self) -> tuple:
+        """Return the months ('datetime64[M]') with rates and the rate (%) of each one, compounding the rates of the same month.
+
+        For series with one rate per month, the rates are returned as they are.
+        """
+        months = self._ordinals.astype("datetime64[D]").astype("datetime64[M]")
+        if len(months) == 0:
+            return months, self._rates
+        starts = np.flatnonzero(np.concatenate([[True], months[1:] != months[:-1]]))
+        if len(starts) == len(months):
+            return months, self._rates
+        factors = np.multiply.reduceat(np.divide(self._rates, 100) + 1, starts)
+        return months[starts], (factors - 1) * 100
+
+
+    def get_index_range(self, initial_ordinal: int, final_ordinal: int) -> tuple:
+        """Return the (start, stop) positions of the rates between the ordinals (both included), by binary search."""
+        start = int(np.searchsorted(self._ordinals, np.int32(initial_ordinal), side="left"))
+        stop = int(np.searchsorted(self._ordinals, np.int32(final_ordinal), side="right"))
+        return start, max(start, stop)
+
+    def get_index_ranges(self, initial_ordinals: np.ndarray, final_ordinals: np.ndarray) -> tuple:
+        """Vectorized 'get_index_range'."""
+        starts = np.searchsorted(self._ordinals, np.asarray(initial_ordinals, dtype=np.int32), side="left")
+        stops = np.searchsorted(self._ordinals, np.asarray(final_ordinals, dtype=np.int32), side="right")
+        return starts, np.maximum(starts, stops)
@@ -0,0 +1,199 @@
+"""Script used to save and load local snapshots of the Economic Indexers series (memory-mapped '.npy' files)."""
+
+import os
+import time
+import json
+import shutil
+import tempfile
+import contextlib
+
+try:
+    import fcntl
+except ModuleNotFoundError:
+    # Windows
+    fcntl = None
+    import msvcrt
+
+import numpy as np
+
+try:
+    from indexer_series import IndexerSeries
+except ModuleNotFoundError:
+    from API.indexer_series import IndexerSeries
+
+
+
+class IndexerSnapshot:
+    """Versioned snapshot of one series, stored in its own directory:
+
+        <directory>/CURRENT                      name of the current version
+        <directory>/SYNCED                       time (epoch) of the last synchronization with the database
+        <directory>/LOCK                         locked by the process synchronizing the snapshot
+        <directory>/<version>/meta.json          format, last '_id' and update, length, etc.
+        <directory>/<version>/<array>.npy        ordinals, rates, factors and log-factors
+
+    A new version is written aside and then 'CURRENT' is replaced atomically, so readers
+    (even from other processes) never see a partial snapshot.
+    In a memory file system (e.g. '/dev/shm'), the processes mapping the same version share its memory.
+    """
+
+    FORMAT_VERSION = 1
+    CURRENT_FILE = "CURRENT"
+    SYNCED_FILE = "SYNCED"
+    LOCK_FILE = "LOCK"
+    META_FILE = "meta.json"
+    ARRAYS = ["ordinals", "rates", "factors", "log_factors"]
+
+    @classmethod
+    def save(cls, directory: str, series: IndexerSeries, metadata: dict = None) -> str:
+        """Save the series as the current version and return the version name."""
+        os.makedirs(directory, exist_ok=True)
+        version = series.get_version()
+        version_directory = os.path.join(directory, version)
+
+        if not os.path.isdir(version_directory):
+            temporary_directory = tempfile.mkdtemp(prefix=".tmp-", dir=directory)
+            arrays = {
+                "ordinals": series.get_ordinals(),
+                "rates": series.get_rates(),
+                "factors": series.get_factors(),
+                "log_factors": series.get_log_factors(),
+            }
+            for name, array in arrays.items():
+                np.save(os.path.join(temporary_directory, f"{name}.npy"), array)
+            updated_at = series.get_updated_at()
+            meta = dict(
+                metadata or {},
+                format_version=cls.FORMAT_VERSION,
+                last_id=str(series.get_last_id()),
+                updated_at=None if updated_at is None else updated_at.isoformat(),
+                length=len(series),
+            )
+            with open(os.path.join(temporary_directory, cls.META_FILE), "w", encoding="utf-8") as meta_file:
+                json.dump(meta, meta_file)
+            try:
+                os.rename(temporary_directory, version_directory)
+            except OSError:
+                # Another process has just saved the same version
+                shutil.rmtree(temporary_directory, ignore_errors=True)
+
+        cls.__set_current_version(directory, version)
+        cls.__remove_old_versions(directory, version)
+        return version
+
+    @staticmethod
+    def __write_file(directory: str, name: str, content: str) -> None:
+        # Replaced atomically, so other processes read either the old or the new content
+        file_descriptor, temporary_file = tempfile.mkstemp(prefix=".tmp-", dir=directory)
+        with os.fdopen(file_descriptor, "w", encoding="utf-8") as file:
+            file.write(content)
+        os.replace(temporary_file, os.path.join(directory, name))
+
+    @staticmethod
+    def __read_file(directory: str, name: str) -> str:
+        try:
+            with open(os.path.join(directory, name), encoding="utf-8") as file:
+                return file.read().strip()
+        except OSError:
+            return None
+
+    @classmethod
+    def __set_current_version(cls, directory: str, version: str) -> None:
+        cls.__write_file(directory, cls.CURRENT_FILE, version)
+
+    @classmethod
+    def get_current_version(cls, directory: str) -> str:
+        """Return the name of the current version, or None when there is no snapshot."""
+        return cls.__read_file(directory, cls.CURRENT_FILE)
+
+    @classmethod
+    def set_synced_at(cls, directory: str, synced_at: float) -> None:
+        """Record the time (epoch) when the current version was last synchronized with the database."""
+        os.makedirs(directory, exist_ok=True)
+        cls.__write_file(directory, cls.SYNCED_FILE, repr(synced_at))
+
+    @classmethod
+    def get_synced_at(cls, directory: str) -> float:
+        """Return the time (epoch) of the last synchronization with the database, or None when unknown."""
+        try:
+            return float(cls.__read_file(directory, cls.SYNCED_FILE))
+        except (TypeError, ValueError):
+            return None
+
+    @classmethod
+    @contextlib.contextmanager
+    def lock(cls, directory: str, blocking: bool = True):
+        """Hold the exclusive lock of the directory among processes (and threads), yielding whether it was acquired.
+
+        The lock is released by the operating system if the process dies, so it is never left behind.
+        When the lock file cannot be created (e.g. a read-only snapshot), there is nothing to coordinate: it yields True.
+        """
+        try:
+            os.makedirs(directory, exist_ok=True)
+            lock_file = open(os.path.join(directory, cls.LOCK_FILE), "a+b")
+        except OSError:
+            yield True
+            return
+        with lock_file:
+            acquired = cls.__lock_file(lock_file, blocking)
+            try:
+                yield acquired
+            finally:
+                if acquired:
+                    cls.__unlock_file(lock_file)
+
+    @staticmethod
+    def __lock_file(lock_file, blocking: bool) -> bool:
+        if fcntl is not None:
+            try:
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX | (0 if blocking else fcntl.LOCK_NB))
+                return True
+            except BlockingIOError:
+                return False
+        while True:
+            try:
+                lock_file.seek(0)
+                msvcrt.locking(lock_file.fileno(), msvcrt.LK_NBLCK, 1)
+                return True
+            except OSError:
+                if not blocking:
+                    return False
+                time.sleep(0.05)
+
+    @staticmethod
+    def __unlock_file(lock_file) -> None:
+        if fcntl is not None:
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+        else:
+            lock_file.seek(0)
+            msvcrt.locking(lock_file.fileno(), msvcrt.LK_UNLCK, 1)
+
+    @classmethod
+    def __remove_old_versions(cls, directory: str, current_version: str) -> None:
+        # Files still memory-mapped by other processes remain readable (or are kept, on Windows)
+        for name in os.listdir(directory):
+            path = os.path.join(directory, name)
+            if name != current_version and os.path.isdir(path) and not name.startswith(".tmp-"):
+                shutil.rmtree(path, ignore_errors=True)
+
+    @classmethod
+    def load(cls, directory: str) -> tuple:
+        """Return the (arrays, meta) of the current version, with the arrays memory-mapped (read-only).
+
+        Return None when there is no valid snapshot in the directory.
+        """
+        version = cls.get_current_version(directory)
+        if not version:
+            return None
+        version_directory = os.path.join(directory, version)
+        try:
+            with open(os.path.join(version_directory, cls.META_FILE), encoding="utf-8") as meta_file:
+                meta = json.load(meta_file)
+            if meta.get("format_version") != cls.FORMAT_VERSION:
+                return None
+            arrays = {name: np.load(os.path.join(version_directory, f"{name}.npy"), mmap_mode="r") for name in cls.ARRAYS}
+        except (OSError, ValueError):
+            return None
+        if any(len(arrays[name]) != meta["length"] for name in ["ordinals", "rates"]):
+            return None
+        return arrays, meta
@@ -1,5 +1,6 @@
 """Script used to perform some calculation related to Interest Values and Rates."""
 
+import numpy as np
 import pandas as pd
 
 
@@ -17,22 +18,36 @@ class InterestCalculation:
     
     @staticmethod
     def set_yearly_rate_from_monthly_rates(df: pd.DataFrame, yearly_rate_column: str, months_columns: list) -> None:
-        df_copy = df.copy()
-        df_copy[months_columns] = df_copy[months_columns].div(100)
-        df_copy[months_columns] = df_copy[months_columns].add(1)
-        df[yearly_rate_column] = df_copy[months_columns].product(axis="columns")
-        df[yearly_rate_column] = df[yearly_rate_column].sub(1)
-        df[yearly_rate_column] = df[yearly_rate_column].mul(100)
+        monthly_factors = df[months_columns].div(100).add(1)
+        df[yearly_rate_column] = monthly_factors.product(axis="columns").sub(1).mul(100)
 
     @staticmethod
     def get_monthly_rates_from_prefixed_yearly_rate(yearly_rate: float):
+        return InterestCalculation.get_period_rates_from_prefixed_yearly_rate(yearly_rate, 12)
+
+    @staticmethod
+    def get_period_rates_from_prefixed_yearly_rate(yearly_rate: float, periods_per_year: int):
+        """Return the rate (%) per period (e.g. 252 for business days) equivalent to the yearly rate (%)."""
         adjusted_yearly_rate = (yearly_rate / 100) + 1
-        return ((adjusted_yearly_rate ** (1/12)) - 1) * 100
+        return ((adjusted_yearly_rate ** (1/periods_per_year)) - 1) * 100
 
     @staticmethod
     def set_cumulative_values_by_rates(df: pd.DataFrame, rate_column: str, value_column: str, initial_value: float) -> None:
-        df_copy = df.copy()
-        df_copy[rate_column] = df_copy[rate_column].div(100)
-        df_copy[rate_column] = df_copy[rate_column].add(1)
-        df[value_column] = df_copy[rate_column].cumprod()
-        df[value_column] = df[value_column].mul(initial_value)
+        factors = df[rate_column].to_numpy(dtype=np.float64) / 100 + 1
+        df[value_column] = np.cumprod(factors) * initial_value
+
+    @staticmethod
+    def get_prefix_factors_from_rates(rates: np.ndarray) -> np.ndarray:
+        """Return the cumulative growth factors, where 'factors[k]' is the growth of the first 'k' rates."""
+        factors = np.empty(len(rates) + 1, dtype=np.float64)
+        factors[0] = 1.0
+        np.cumprod(np.divide(rates, 100) + 1, out=factors[1:])
+        return factors
+
+    @staticmethod
+    def get_prefix_log_factors_from_rates(rates: np.ndarray) -> np.ndarray:
+        """Return the cumulative growth log-factors, where 'log_factors[k]' is the log-growth of the first 'k' rates."""
+        log_factors = np.empty(len(rates) + 1, dtype=np.float64)
+        log_factors[0] = 0.0
+        np.cumsum(np.log1p(np.divide(rates, 100)), out=log_factors[1:])
+        return log_factors
@@ -0,0 +1,53 @@
+"""Script used to run the blocking work of the async API routes in bounded thread pools, off the event loop."""
+
+import os
+import asyncio
+import functools
+import contextvars
+
+from concurrent.futures import ThreadPoolExecutor
+
+
+
+class RequestExecutor:
+    """Bounded thread pools for the blocking work of the async routes.
+
+    > 'io': MongoDB round trips (e.g. loading a collection or a date range), which mostly wait on the network;
+    > 'cpu': pandas/numpy work over many rows, limited to the number of CPUs, since it holds the GIL.
+
+    Each call runs in a copy of the current context, so its MongoDB commands and profile are still
+    attributed to the request (see 'request_metrics' and 'request_profiler').
+    """
+
+    IO_WORKERS_ENVIRONMENT_VARIABLE = "API_IO_WORKERS"
+    CPU_WORKERS_ENVIRONMENT_VARIABLE = "API_CPU_WORKERS"
+    # Measured with 'benchmarks/load_test.py' (200 clients, 20 ms round trips): fewer workers queue the 'database'
+    # query mode, while more of them only contend for the GIL with the 'memory' requests
+    DEFAULT_IO_WORKERS = 32
+
+    def __init__(self, io_workers: int = None, cpu_workers: int = None) -> None:
+        self._io_workers = int(os.getenv(self.IO_WORKERS_ENVIRONMENT_VARIABLE, self.DEFAULT_IO_WORKERS)) if io_workers is None else io_workers
+        self._cpu_workers = int(os.getenv(self.CPU_WORKERS_ENVIRONMENT_VARIABLE, os.cpu_count() or 1)) if cpu_workers is None else cpu_workers
+        self._io_executor = ThreadPoolExecutor(max_workers=self._io_workers, thread_name_prefix="api-io")
+        self._cpu_executor = ThreadPoolExecutor(max_workers=self._cpu_workers, thread_name_prefix="api-cpu")
+
+
+    def get_workers(self) -> dict:
+        return {"io": self._io_workers, "cpu": self._cpu_workers}
+
+    @staticmethod
+    async def __run(executor: ThreadPoolExecutor, function, *args, **kwargs):
+        context = contextvars.copy_context()
+        return await asyncio.get_running_loop().run_in_executor(executor, functools.partial(context.run, function, *args, **kwargs))
+
+    async def run_io(self, function, *args, **kwargs):
+        """Run a function that waits on MongoDB, without blocking the event loop."""
+        return await self.__run(self._io_executor, function, *args, **kwargs)
+
+    async def run_cpu(self, function, *args, **kwargs):
+        """Run a CPU-bound function (e.g. over a whole dataframe), without blocking the event loop."""
+        return await self.__run(self._cpu_executor, function, *args, **kwargs)
+
+    def shutdown(self) -> None:
+        self._io_executor.shutdown(wait=False, cancel_futures=True)
+        self._cpu_executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,204 @@
+"""Script used to collect request metrics of the API (latency, MongoDB commands and cache) in the Prometheus text format."""
+
+import time
+import bisect
+import threading
+import contextvars
+
+from pymongo import monitoring
+
+
+# Statistics of the MongoDB commands issued while serving the current request (None out of requests)
+current_request_stats = contextvars.ContextVar("current_request_stats", default=None)
+
+UNMATCHED_ROUTE = "unmatched"
+
+
+def get_route_template(scope: dict) -> str:
+    """Return the path template of the route that served the request (e.g. '/final_value_by_indexer').
+
+    The router adds the matched 'endpoint' to the scope shared with the middlewares, once the request is served.
+    """
+    endpoint = scope.get("endpoint")
+    if endpoint is not None:
+        for route in scope["app"].router.routes:
+            if getattr(route, "endpoint", None) is endpoint:
+                return route.path
+    return UNMATCHED_ROUTE
+
+
+
+class RequestStats:
+    """MongoDB commands issued while serving one request, by command name: [commands, documents, seconds]."""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self.commands = {}
+
+    def add_command(self, command_name: str, documents: int, seconds: float) -> None:
+        # Commands of one request may run in several threads (e.g. collections loaded concurrently)
+        with self._lock:
+            stats = self.commands.setdefault(command_name, [0, 0, 0.0])
+            stats[0] += 1
+            stats[1] += documents
+            stats[2] += seconds
+
+
+
+class RequestMetrics:
+    """Process-wide counters and latency histograms, labelled by route template (e.g. '/final_value_by_indexer').
+
+    The counters are kept per process: with several workers, each one exposes its own '/metrics'.
+    """
+
+    PREFIX = "econindexer"
+    LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+    NO_ROUTE = ""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._requests = {}     # (method, route, status): count
+        self._latencies = {}    # (method, route): [bucket counts..., +Inf count, sum]
+        self._commands = {}     # (route, command): [commands, documents, seconds]
+
+
+    def observe_request(self, method: str, route: str, status: int, seconds: float, stats: RequestStats = None) -> None:
+        bucket = bisect.bisect_left(self.LATENCY_BUCKETS, seconds)
+        with self._lock:
+            key = (method, route, status)
+            self._requests[key] = self._requests.get(key, 0) + 1
+            latency = self._latencies.get((method, route))
+            if latency is None:
+                latency = self._latencies[(method, route)] = [0] * (len(self.LATENCY_BUCKETS) + 1) + [0.0]
+            latency[bucket] += 1
+            latency[-1] += seconds
+            if stats is not None:
+                for command_name, command_stats in stats.commands.items():
+                    self.__add_command(route, command_name, *command_stats)
+
+    def observe_command(self, command_name: str, documents: int, seconds: float) -> None:
+        """Add a MongoDB command to the current request (or to the commands issued out of requests)."""
+        stats = current_request_stats.get()
+        if stats is not None:
+            stats.add_command(command_name, documents, seconds)
+        else:
+            with self._lock:
+                self.__add_command(self.NO_ROUTE, command_name, 1, documents, seconds)
+
+    def __add_command(self, route: str, command_name: str, commands: int, documents: int, seconds: float) -> None:
+        totals = self._commands.setdefault((route, command_name), [0, 0, 0.0])
+        totals[0] += commands
+        totals[1] += documents
+        totals[2] += seconds
+
+
+    @staticmethod
+    def __get_labels(**labels) -> str:
+        escaped = (str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for value in labels.values())
+        return "{" + ",".join(f'{name}="{value}"' for name, value in zip(labels, escaped)) + "}"
+
+    def get_prometheus_text(self, cache_stats: dict = None) -> str:
+        """Return all metrics in the Prometheus text exposition format (version 0.0.4)."""
+        with self._lock:
+            requests = dict(self._requests)
+            latencies = {key: list(values) for key, values in self._latencies.items()}
+            commands = {key: list(values) for key, values in self._commands.items()}
+
+        prefix = self.PREFIX
+        lines = [
+            f"# HELP {prefix}_http_requests_total Requests served, by route template and status code.",
+            f"# TYPE {prefix}_http_requests_total counter",
+        ]
+        for (method, route, status), count in sorted(requests.items()):
+            lines.append(f"{prefix}_http_requests_total{self.__get_labels(method=method, route=route, status=status)} {count}")
+
+        lines += [
+            f"# HELP {prefix}_http_request_duration_seconds Time to serve the requests, by route template.",
+            f"# TYPE {prefix}_http_request_duration_seconds histogram",
+        ]
+        for (method, route), latency in sorted(latencies.items()):
+            cumulative = 0
+            for upper_bound, count in zip(list(self.LATENCY_BUCKETS) + ["+Inf"], latency[:-1]):
+                cumulative += count
+                lines.append(f"{prefix}_http_request_duration_seconds_bucket{self.__get_labels(method=method, route=route, le=upper_bound)} {cumulative}")
+            lines.append(f"{prefix}_http_request_duration_seconds_sum{self.__get_labels(method=method, route=route)} {latency[-1]}")
+            lines.append(f"{prefix}_http_request_duration_seconds_count{self.__get_labels(method=method, route=route)} {cumulative}")
+
+        command_metrics = [
+            ("mongo_commands_total", "MongoDB commands issued, by route template (empty out of requests).", 0),
+            ("mongo_documents_returned_total", "Documents returned by the MongoDB commands, by route template.", 1),
+            ("mongo_command_duration_seconds_total", "Time spent in MongoDB commands, by route template.", 2),
+        ]
+        for name, help_text, position in command_metrics:
+            lines += [f"# HELP {prefix}_{name} {help_text}", f"# TYPE {prefix}_{name} counter"]
+            for (route, command_name), totals in sorted(commands.items()):
+                lines.append(f"{prefix}_{name}{self.__get_labels(route=route, command=command_name)} {totals[position]}")
+
+        for name, value in (cache_stats or {}).items():
+            metric_type = "counter" if name.endswith("_total") else "gauge"
+            lines += [f"# TYPE {prefix}_indexer_cache_{name} {metric_type}", f"{prefix}_indexer_cache_{name} {value}"]
+        return "\n".join(lines) + "\n"
+
+
+
+class MongoCommandListener(monitoring.CommandListener):
+    """Count the MongoDB commands (and the documents they return) into a RequestMetrics.
+
+    Pass it to the MongoClient with 'event_listeners=[MongoCommandListener(metrics)]'.
+    """
+
+    CURSOR_BATCHES = ("firstBatch", "nextBatch")
+
+    def __init__(self, metrics: RequestMetrics) -> None:
+        self._metrics = metrics
+
+    def started(self, event: monitoring.CommandStartedEvent) -> None:
+        pass
+
+    def succeeded(self, event: monitoring.CommandSucceededEvent) -> None:
+        documents = 0
+        cursor = event.reply.get("cursor")
+        if isinstance(cursor, dict):
+            for batch in self.CURSOR_BATCHES:
+                if batch in cursor:
+                    documents = len(cursor[batch])
+                    break
+        self._metrics.observe_command(event.command_name, documents, event.duration_micros / 1e6)
+
+    def failed(self, event: monitoring.CommandFailedEvent) -> None:
+        self._metrics.observe_command(event.command_name, 0, event.duration_micros / 1e6)
+
+
+
+class MetricsMiddleware:
+    """ASGI middleware timing every HTTP request and attributing its MongoDB commands to its route.
+
+    Routes are labelled by their template (see 'get_route_template'), so path values never
+    create new series. Requests not matching any route are labelled as 'unmatched'.
+    """
+
+    def __init__(self, app, metrics: RequestMetrics) -> None:
+        self.app = app
+        self._metrics = metrics
+
+    async def __call__(self, scope, receive, send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status = 500
+        async def send_wrapper(message) -> None:
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        stats = RequestStats()
+        token = current_request_stats.set(stats)
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            seconds = time.perf_counter() - start
+            current_request_stats.reset(token)
+            self._metrics.observe_request(scope["method"], get_route_template(scope), status, seconds, stats)
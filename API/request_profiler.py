@@ -0,0 +1,198 @@
+"""Script used to profile (with cProfile) the slow requests of the API, on demand, without redeploying."""
+
+import os
+import io
+import time
+import pstats
+import asyncio
+import cProfile
+import tempfile
+import functools
+import threading
+import contextvars
+
+from datetime import datetime
+
+from fastapi.routing import APIRoute
+from starlette.concurrency import run_in_threadpool
+
+try:
+    from request_metrics import get_route_template
+except ModuleNotFoundError:
+    from API.request_metrics import get_route_template
+
+
+# Profile of the current request (None when the request is not profiled)
+current_request_profile = contextvars.ContextVar("current_request_profile", default=None)
+
+
+
+class RequestProfile:
+    """cProfile profiles collected in the threads that served one request."""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._profiles = []
+
+    def add(self, profile: cProfile.Profile) -> None:
+        with self._lock:
+            self._profiles.append(profile)
+
+    def get_stats(self, stream=None) -> pstats.Stats:
+        """Return the stats of all the profiles merged (None when nothing was profiled)."""
+        with self._lock:
+            profiles = list(self._profiles)
+        if not profiles:
+            return None
+        stats = pstats.Stats(profiles[0], stream=stream)
+        for profile in profiles[1:]:
+            stats.add(profile)
+        return stats
+
+
+def get_profiled_function(function):
+    """Return a function that runs 'function' under cProfile when the current request is profiled.
+
+    cProfile only traces the thread where it is enabled, so the function must wrap the code that
+    actually runs in the worker thread (e.g. a sync endpoint, or a function given to 'run_in_threadpool').
+    """
+    @functools.wraps(function)
+    def wrapper(*args, **kwargs):
+        request_profile = current_request_profile.get()
+        if request_profile is None:
+            return function(*args, **kwargs)
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+        except ValueError:
+            # Another profiler is already active in this thread
+            return function(*args, **kwargs)
+        try:
+            return function(*args, **kwargs)
+        finally:
+            profile.disable()
+            request_profile.add(profile)
+    return wrapper
+
+
+
+class ProfiledRoute(APIRoute):
+    """Route whose sync endpoint is profiled when the request is (see 'ProfilingMiddleware').
+
+    Use it with 'app.router.route_class = ProfiledRoute', before declaring the routes. Async endpoints
+    must wrap their blocking calls with 'get_profiled_function' themselves.
+    """
+
+    def __init__(self, path: str, endpoint, **kwargs) -> None:
+        if not asyncio.iscoroutinefunction(endpoint):
+            endpoint = get_profiled_function(endpoint)
+        super().__init__(path, endpoint, **kwargs)
+
+
+
+class ProfilingMiddleware:
+    """ASGI middleware profiling the requests, and saving the profiles of those slower than a threshold.
+
+    A request is profiled when:
+    > the 'API_PROFILE' environment variable is '1' (every request); or
+    > the 'X-Profile' header matches the 'API_PROFILE_TOKEN' environment variable (when it is set).
+
+    Each slow request is saved in 'API_PROFILE_DIR' as a '.prof' file (for 'pstats' or 'snakeviz') and a '.txt'
+    report with the route, parameters and top functions. Only the latest 'API_PROFILE_MAX_FILES' are kept.
+    """
+
+    PROFILE_ENVIRONMENT_VARIABLE = "API_PROFILE"
+    TOKEN_ENVIRONMENT_VARIABLE = "API_PROFILE_TOKEN"
+    THRESHOLD_ENVIRONMENT_VARIABLE = "API_PROFILE_THRESHOLD_MS"
+    DIRECTORY_ENVIRONMENT_VARIABLE = "API_PROFILE_DIR"
+    MAX_FILES_ENVIRONMENT_VARIABLE = "API_PROFILE_MAX_FILES"
+    HEADER = b"x-profile"
+
+    DEFAULT_THRESHOLD_MS = 500.0
+    DEFAULT_DIRECTORY = os.path.join(tempfile.gettempdir(), "econindexer_profiles")
+    DEFAULT_MAX_FILES = 50
+    REPORT_LINES = 40
+
+    def __init__(self, app, profile_all: bool = None, token: str = None, threshold_ms: float = None, directory: str = None, max_files: int = None) -> None:
+        self.app = app
+        self._profile_all = os.getenv(self.PROFILE_ENVIRONMENT_VARIABLE) == "1" if profile_all is None else profile_all
+        self._token = os.getenv(self.TOKEN_ENVIRONMENT_VARIABLE) if token is None else token
+        self._threshold_ms = float(os.getenv(self.THRESHOLD_ENVIRONMENT_VARIABLE, self.DEFAULT_THRESHOLD_MS)) if threshold_ms is None else threshold_ms
+        self._directory = os.getenv(self.DIRECTORY_ENVIRONMENT_VARIABLE, self.DEFAULT_DIRECTORY) if directory is None else directory
+        self._max_files = int(os.getenv(self.MAX_FILES_ENVIRONMENT_VARIABLE, self.DEFAULT_MAX_FILES)) if max_files is None else max_files
+
+
+    def get_directory(self) -> str:
+        return self._directory
+
+    def __is_profiled(self, scope: dict) -> bool:
+        if self._profile_all:
+            return True
+        if self._token:
+            for name, value in scope["headers"]:
+                if name == self.HEADER:
+                    return value.decode("latin-1") == self._token
+        return False
+
+    async def __call__(self, scope, receive, send) -> None:
+        if scope["type"] != "http" or not self.__is_profiled(scope):
+            await self.app(scope, receive, send)
+            return
+
+        status = 500
+        async def send_wrapper(message) -> None:
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        request_profile = RequestProfile()
+        token = current_request_profile.set(request_profile)
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed_ms = (time.perf_counter() - start) * 1000
+            current_request_profile.reset(token)
+            if elapsed_ms >= self._threshold_ms:
+                await run_in_threadpool(self.save_profile, request_profile, scope, status, elapsed_ms)
+
+
+    def save_profile(self, request_profile: RequestProfile, scope: dict, status: int, elapsed_ms: float) -> str:
+        """Save the profile of one request and return the path of its report (None when nothing was profiled)."""
+        report = io.StringIO()
+        stats = request_profile.get_stats(stream=report)
+        if stats is None:
+            return None
+
+        route = get_route_template(scope)
+        query_string = scope.get("query_string", b"").decode("latin-1")
+        name = "{}_{}_{}_{:.0f}ms".format(
+            datetime.now().strftime("%Y%m%d-%H%M%S-%f"),
+            scope["method"],
+            route.strip("/").replace("/", "_") or "root",
+            elapsed_ms,
+        )
+        os.makedirs(self._directory, exist_ok=True)
+        base_path = os.path.join(self._directory, name)
+        stats.dump_stats(base_path + ".prof")
+
+        report.write(f"{scope['method']} {route} -> {status} in {elapsed_ms:.1f} ms\n")
+        report.write(f"Path: {scope['path']}\n")
+        report.write(f"Parameters: {query_string}\n\n")
+        stats.sort_stats("cumulative").print_stats(self.REPORT_LINES)
+        with open(base_path + ".txt", "w", encoding="utf-8") as report_file:
+            report_file.write(report.getvalue())
+
+        self.__remove_old_profiles()
+        return base_path + ".txt"
+
+    def __remove_old_profiles(self) -> None:
+        # Names start with the timestamp, so the oldest ones come first
+        names = sorted(name[:-len(".prof")] for name in os.listdir(self._directory) if name.endswith(".prof"))
+        for name in names[:max(0, len(names) - self._max_files)]:
+            for extension in [".prof", ".txt"]:
+                try:
+                    os.remove(os.path.join(self._directory, name + extension))
+                except OSError:
+                    pass
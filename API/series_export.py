@@ -0,0 +1,248 @@
+"""Script used to export the adjusted series (as 'get_stacked_dataframe_adjusted_from_values') and the tables of an Economic Indexer.
+
+The text formats (CSV, NDJSON and JSON) are always available; Arrow IPC and Parquet require the 'pyarrow' package.
+"""
+
+try:
+    import orjson
+except ModuleNotFoundError:
+    orjson = None
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ModuleNotFoundError:
+    pa = None
+    pq = None
+
+import io
+import csv
+import json
+import zlib
+
+import numpy as np
+import pandas as pd
+
+try:
+    from interest_rate import InterestCalculation as interest
+except ModuleNotFoundError:
+    from API.interest_rate import InterestCalculation as interest
+
+try:
+    from indexer_series import IndexerSeries
+except ModuleNotFoundError:
+    from API.indexer_series import IndexerSeries
+
+
+
+class ExportFormat:
+    """Formats of the exports, chosen by a parameter or by the 'Accept' header of the request."""
+
+    CSV = "csv"
+    NDJSON = "ndjson"
+    JSON = "json"
+    ARROW = "arrow"
+    PARQUET = "parquet"
+    MEDIA_TYPES = {
+        CSV: "text/csv",
+        NDJSON: "application/x-ndjson",
+        JSON: "application/json",
+        ARROW: "application/vnd.apache.arrow.stream",
+        PARQUET: "application/vnd.apache.parquet",
+    }
+
+    # Formats that require 'pyarrow'
+    ARROW_FORMATS = [ARROW, PARQUET]
+
+
+    @classmethod
+    def is_available(cls, export_format: str) -> bool:
+        return export_format not in cls.ARROW_FORMATS or pa is not None
+
+    @staticmethod
+    def __get_specificity(accepted_type: str, media_type: str) -> int:
+        # 2: same media type; 1: same type (e.g. 'text/*'); 0: any type ('*/*'); -1: not matched
+        if accepted_type == media_type:
+            return 2
+        if accepted_type == media_type.split("/")[0] + "/*":
+            return 1
+        return 0 if accepted_type == "*/*" else -1
+
+    @classmethod
+    def get_format_from_accept(cls, accept: str, formats: list) -> str:
+        """Return the available format (of 'formats') preferred by the 'Accept' header, or None when none is accepted.
+
+        The quality ('q') ranks the accepted media types, then the most specific one; ties keep the order of 'formats'.
+        """
+        best_format, best_rank = None, (0.0, -1)
+        for item in (accept or "").split(","):
+            accepted_type, *parameters = [part.strip().lower() for part in item.split(";")]
+            quality = 1.0
+            for parameter in parameters:
+                name, _, value = parameter.partition("=")
+                if name.strip() == "q":
+                    try:
+                        quality = float(value)
+                    except ValueError:
+                        quality = 0.0
+            for export_format in formats:
+                rank = (quality, cls.__get_specificity(accepted_type, cls.MEDIA_TYPES[export_format]))
+                if quality > 0 and rank[1] >= 0 and rank > best_rank and cls.is_available(export_format):
+                    best_format, best_rank = export_format, rank
+        return best_format
+
+    @staticmethod
+    def iter_arrow_stream(schema, batches):
+        """Yield an Arrow IPC stream in chunks of bytes: the schema, then one chunk per record batch."""
+        sink = io.BytesIO()
+        with pa.ipc.new_stream(sink, schema) as writer:
+            for batch in batches:
+                writer.write_batch(batch)
+                yield sink.getvalue()
+                sink.seek(0)
+                sink.truncate()
+        # Schema only (no batches) and the end of stream marker
+        yield sink.getvalue()
+
+    @staticmethod
+    def get_parquet(table) -> bytes:
+        """Return the Arrow table as a Parquet file."""
+        sink = io.BytesIO()
+        pq.write_table(table, sink)
+        return sink.getvalue()
+
+    @staticmethod
+    def get_arrow_table_from_dataframe(df: pd.DataFrame):
+        """Return the dataframe as an Arrow table, with its (named) index as the first column."""
+        return pa.Table.from_pandas(df.reset_index(), preserve_index=False)
+
+    @staticmethod
+    def iter_gzip(chunks, level: int = 1):
+        """Compress the chunks as a gzip stream, flushing each one so the client can decompress it at once.
+
+        The lowest level is the default: it is some times faster than the usual 6, for a slightly larger stream.
+        """
+        compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+        for chunk in chunks:
+            yield compressor.compress(chunk) + compressor.flush(zlib.Z_SYNC_FLUSH)
+        yield compressor.flush()
+
+
+
+class SeriesExport:
+    """Adjusted series of the rates between 'start' and 'stop', computed chunk by chunk from the prefix factors.
+
+    Each row has the same values of a 'get_stacked_dataframe_adjusted_from_values' row (and the last one
+    is the result of 'get_adjusted_value_from_values'), but only one chunk is in memory at a time.
+    """
+
+    # In the order of preference, when the 'Accept' header allows any of them
+    FORMATS = [ExportFormat.CSV, ExportFormat.NDJSON, ExportFormat.ARROW, ExportFormat.PARQUET]
+
+    # date, Taxa Índice(%), Valor Índice(R$), Taxa Índice + Adicional(%), Valor Índice + Adicional(R$)
+    COLUMNS = ["date", "rate", "value", "adjusted_rate", "adjusted_value"]
+
+    # Rows per chunk: large enough to be vectorized, small enough to arrive early
+    CHUNK_ROWS = 4096
+
+    def __init__(self, series: IndexerSeries, start: int, stop: int, initial_value: float, rate_value: float, rate_type: str, periods_per_year: int) -> None:
+        self._series = series
+        self._start = start
+        self._stop = stop
+        self._initial_value = initial_value
+        self._rate_value = rate_value
+        self._rate_type = rate_type
+        self._period_rate = interest.get_period_rates_from_prefixed_yearly_rate(rate_value, periods_per_year)
+
+
+    def __len__(self) -> int:
+        return self._stop - self._start
+
+    def get_columns(self, start: int, stop: int) -> dict:
+        """Return the columns (arrays) of the rows from 'start' to 'stop' (positions in the series).
+
+        The dates are the 'int32' ordinals (days since 1970-01-01) and the rates are views of the series.
+        """
+        rates = self._series.get_rates()[start:stop]
+        factors = self._series.get_factors()
+        values = factors[start + 1:stop + 1] * (self._initial_value / factors[self._start])
+
+        if self._rate_type == interest.PREFIXED_RATE:
+            total_periods = np.arange(start - self._start + 1, stop - self._start + 1)
+            adjusted_rates = rates + self._period_rate
+            adjusted_values = values + self._initial_value * ((1 + self._period_rate / 100) ** total_periods - 1)
+        elif self._rate_type == interest.PROPORTIONAL_RATE:
+            adjusted_rates = rates * (self._rate_value / 100)
+            adjusted_values = self._initial_value + (values - self._initial_value) * (self._rate_value / 100)
+        else:
+            adjusted_rates = rates
+            adjusted_values = values
+
+        ordinals = self._series.get_ordinals()[start:stop]
+        return dict(zip(self.COLUMNS, [ordinals, rates, values, adjusted_rates, adjusted_values]))
+
+    def __iter_columns(self):
+        for start in range(self._start, self._stop, self.CHUNK_ROWS):
+            yield self.get_columns(start, min(start + self.CHUNK_ROWS, self._stop))
+
+    def __iter_rows(self):
+        for columns in self.__iter_columns():
+            columns["date"] = np.datetime_as_string(columns["date"].astype("datetime64[D]"))
+            yield zip(*[column.tolist() for column in columns.values()])
+
+    def iter_csv(self):
+        """Yield the CSV (with header) in chunks of bytes."""
+        header = (",".join(self.COLUMNS) + "\n").encode("utf-8")
+        for rows in self.__iter_rows():
+            yield header + self.__get_csv_lines(rows)
+            header = b""
+        if header:
+            # No rates between the dates
+            yield header
+
+    @staticmethod
+    def __get_csv_lines(rows) -> bytes:
+        if orjson is None:
+            buffer = io.StringIO()
+            csv.writer(buffer, lineterminator="\n").writerows(rows)
+            return buffer.getvalue().encode("utf-8")
+        # Much faster than the 'csv' module (which formats each float in Python): the rows are dumped as a
+        # JSON array of arrays, then the brackets and quotes are removed (no value has commas or quotes)
+        return orjson.dumps(list(rows))[2:-2].replace(b"],[", b"\n").replace(b'"', b"") + b"\n"
+
+    def iter_ndjson(self):
+        """Yield the NDJSON (one object per row) in chunks of bytes."""
+        for rows in self.__iter_rows():
+            lines = [self.__dumps(dict(zip(self.COLUMNS, row))) for row in rows]
+            lines.append(b"")
+            yield b"\n".join(lines)
+
+    @staticmethod
+    def __dumps(row: dict) -> bytes:
+        return json.dumps(row).encode("utf-8") if orjson is None else orjson.dumps(row)
+
+    def get_arrow_schema(self):
+        return pa.schema([("date", pa.date32())] + [(name, pa.float64()) for name in self.COLUMNS[1:]])
+
+    def iter_arrow_batches(self):
+        """Yield the chunks as Arrow record batches, built over the arrays (the dates and rates are not copied)."""
+        schema = self.get_arrow_schema()
+        for columns in self.__iter_columns():
+            arrays = [pa.array(column, type=field.type) for column, field in zip(columns.values(), schema)]
+            yield pa.RecordBatch.from_arrays(arrays, schema=schema)
+
+    def iter_arrow(self):
+        """Yield the Arrow IPC stream in chunks of bytes (one record batch per chunk)."""
+        return ExportFormat.iter_arrow_stream(self.get_arrow_schema(), self.iter_arrow_batches())
+
+    def get_parquet(self) -> bytes:
+        """Return the whole series as a Parquet file (it is not streamed, since its footer depends on all the rows)."""
+        return ExportFormat.get_parquet(pa.Table.from_batches(list(self.iter_arrow_batches()), schema=self.get_arrow_schema()))
+
+    def iter_chunks(self, export_format: str):
+        """Yield the chunks of bytes in one of the streamed formats (CSV, NDJSON or Arrow IPC)."""
+        if export_format == ExportFormat.NDJSON:
+            return self.iter_ndjson()
+        if export_format == ExportFormat.ARROW:
+            return self.iter_arrow()
+        return self.iter_csv()
@@ -1,7 +1,5 @@
 """Script used to display a GUI interface, based on Streamlit, in order to register in MongoDB some values related to IPCA, SELIC, etc."""
 
-import pymongo
-
 from datetime import date
 
 import streamlit as st
@@ -10,6 +8,8 @@ from dateutil.relativedelta import relativedelta
 
 from API.db_collection import DBCollection, EconomicIndexers
 
+from API.indexer_registers import IndexerRegisters
+
 from db_connection import init_connection
 
 
@@ -22,28 +22,6 @@ TODAY_DATE_LESS_LAST_REGISTER_DATE = 75
 
 
 
-def insert_new_item(db_collection: DBCollection, item_date: date, item_rate: float) -> None:
-    """Insert a new register to the collection."""
-    db = db_collection._mongo_client.get_database(db_collection._database_name)
-    db.get_collection(db_collection._collection_name).insert_one(
-        {
-            DBCollection.DB_YEAR_COLUMN: item_date.year,
-            DBCollection.DB_MONTH_COLUMN: item_date.month,
-            DBCollection.DB_DAY_COLUMN: item_date.day,
-            DBCollection.DB_RATE_COLUMN: item_rate,
-        }
-    )
-
-
-
-def get_last_item_registered(db_collection: DBCollection) -> dict:
-    """Return a dictionary with year, month, day, value."""
-    db = db_collection._mongo_client.get_database(db_collection._database_name)
-    item = db.get_collection(db_collection._collection_name).find().sort(
-        DBCollection.DB_ID_COLUMN, pymongo.DESCENDING
-    ).limit(1)
-    return list(item)[0]
-
 def get_date_tuple_from_item_registered(item: dict) -> tuple:
     """Return a tuple with year, month, day from the register."""
     return (
@@ -69,18 +47,20 @@ def get_date_from_date_tuple(date_tuple: tuple) -> date:
 
 
 
-def get_last_register_string(db_collection: DBCollection) -> str:
+def get_last_register_string(last_item: dict) -> str:
     """Return a string related to the last register."""
-    last_item = get_last_item_registered(db_collection)
     last_date = get_date_from_item_registered(last_item)
     last_rate = get_rate_from_item_registered(last_item)
     return f"( {last_date}  :  {last_rate:.4f} )"
 
 
 
-def show_number_input(db_collection: DBCollection) -> float:
-    """Show a widget to insert the related rate."""
-    label = f"[{db_collection.get_title()}]({db_collection.get_link_for_scraping()}) {get_last_register_string(db_collection)}"
+def show_number_input(title: str) -> float:
+    """Show a widget to insert the related rate. Daily indexers return None, since they are not registered monthly."""
+    label = f"[{title}]({registers.get_link_for_scraping(title)}) {get_last_register_string(last_items[title])}"
+    if granularities.get(title) == DBCollection.GRANULARITY_DAILY:
+        st.caption(f"{label}  \nÍndice diário: os registros são importados com 'API/bulk_import.py'.")
+        return None
     return st.number_input(label, value=1.0000, step=0.0001, format="%.4f")
 
 
@@ -105,11 +85,16 @@ st.set_page_config(
 
 mongo_client = init_connection()
 
-indexers = EconomicIndexers(mongo_client)
+# Only the last register of each indexer is needed (fetched in a single round trip)
+registers = IndexerRegisters(mongo_client)
+last_items = registers.get_last_items()
+
+# Daily indexers (see INDEXER_GRANULARITIES) are not part of the monthly register
+granularities = EconomicIndexers.get_settings_from_environment(EconomicIndexers.GRANULARITIES_ENVIRONMENT_VARIABLE)
 
 
 
-last_date = get_date_from_item_registered(get_last_item_registered(indexers.ipca))
+last_date = get_date_from_item_registered(last_items["IPCA"])
 next_date = last_date + relativedelta(months=1)
 
 
@@ -126,26 +111,30 @@ st.write(f"")
 col1, col2, col3 = st.columns(3)
 
 with col1:
-    ipca_number = show_number_input(indexers.ipca)
+    ipca_number = show_number_input("IPCA")
 
 with col2:
-    cdi_number = show_number_input(indexers.cdi)
-    selic_number = show_number_input(indexers.selic)
+    cdi_number = show_number_input("CDI")
+    selic_number = show_number_input("SELIC")
 
 with col3:
-    fgts_number = show_number_input(indexers.fgts)
-    poup_number = show_number_input(indexers.poup)
+    fgts_number = show_number_input("FGTS")
+    poup_number = show_number_input("POUPANCA")
 
 
 
 st.write(f"")
 st.write(f"")
 if st.button("INSERIR REGISTRO", disabled=is_blocked_to_insert_new_register(last_date)):
-    insert_new_item(indexers.ipca, next_date, ipca_number)
-    insert_new_item(indexers.cdi, next_date, cdi_number)
-    insert_new_item(indexers.selic, next_date, selic_number)
-    insert_new_item(indexers.fgts, next_date, fgts_number)
-    insert_new_item(indexers.poup, next_date, poup_number)
+    # All the registers are inserted, or none of them
+    rates = {
+        "IPCA": ipca_number,
+        "CDI": cdi_number,
+        "SELIC": selic_number,
+        "FGTS": fgts_number,
+        "POUPANCA": poup_number,
+    }
+    registers.insert_items(next_date, {title: rate for title, rate in rates.items() if rate is not None})
     st.balloons()
     st.success("Registro salvo com sucesso! A página será recarregada.", icon="✅")
     st.experimental_rerun()
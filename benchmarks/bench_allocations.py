@@ -0,0 +1,85 @@
+"""Script used to measure the memory allocated per '/final_value_by_indexer' call (and per DBCollection call).
+
+Usage:
+    python benchmarks/bench_allocations.py [--repo PATH] [--years N] [--calls N]
+
+Use '--repo' with an older checkout (e.g. a 'git worktree') to compare before/after a change.
+"""
+
+import os
+import sys
+import argparse
+import tracemalloc
+
+from datetime import datetime
+
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, BENCHMARKS_DIR)
+
+import synthetic
+
+
+def get_peak_bytes_per_call(function, calls: int) -> float:
+    """Return the mean peak of traced memory (bytes) allocated by each call."""
+    function()  # warm up (caches, imports)
+    peaks = []
+    for _ in range(calls):
+        tracemalloc.reset_peak()
+        start, _ = tracemalloc.get_traced_memory()
+        function()
+        _, peak = tracemalloc.get_traced_memory()
+        peaks.append(peak - start)
+    return sum(peaks) / len(peaks)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repo", default=os.path.dirname(BENCHMARKS_DIR), help="repository root with the 'API' package")
+    parser.add_argument("--years", type=int, default=30, help="years of monthly history per indexer")
+    parser.add_argument("--calls", type=int, default=20, help="calls measured per case")
+    args = parser.parse_args()
+
+    sys.path.insert(0, os.path.abspath(args.repo))
+    from fastapi.testclient import TestClient
+    import API.indexer_api as indexer_api
+
+    mongo_client = synthetic.get_mongo_client(args.years)
+    indexer_api.mongo_client = mongo_client
+    if hasattr(indexer_api, "indexer_cache"):
+        indexer_api.indexer_cache = indexer_api.IndexerCache(mongo_client)
+    client = TestClient(indexer_api.app)
+
+    params = {
+        "initial_value": 1000.0,
+        "initial_date": "2000-01-01T00:00:00",
+        "final_date": "2010-12-01T00:00:00",
+        "indexer_reference": "CDI",
+        "indexer_type": 2,
+        "indexer_add_rate": 110.0,
+    }
+    collection = indexer_api.EconomicIndexers(mongo_client).get_db_collection_by_indexer("CDI") \
+        if hasattr(indexer_api, "EconomicIndexers") else indexer_api.indexer_cache.get_indexers().get_db_collection_by_indexer("CDI")
+    arguments = (1000.0, datetime(2000, 1, 1), datetime(2010, 12, 1), 110.0, "Proporcional(x)")
+
+    cases = {
+        "GET /final_value_by_indexer": lambda: client.get("/final_value_by_indexer", params=params),
+        "get_adjusted_value_from_values": lambda: collection.get_adjusted_value_from_values(*arguments),
+        "get_stacked_dataframe_adjusted_from_values": lambda: collection.get_stacked_dataframe_adjusted_from_values(*arguments),
+    }
+    try:
+        collection.get_stacked_dataframe_adjusted_from_values(*arguments, mutable=True)
+        cases["get_stacked_dataframe_adjusted_from_values(mutable=True)"] = \
+            lambda: collection.get_stacked_dataframe_adjusted_from_values(*arguments, mutable=True)
+    except TypeError:
+        pass
+
+    tracemalloc.start()
+    print(f"Repository: {os.path.abspath(args.repo)} ({args.years} years of monthly data)")
+    for name, function in cases.items():
+        print(f"{name:<60} {get_peak_bytes_per_call(function, args.calls) / 1024:>10.1f} KiB/call")
+    tracemalloc.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,200 @@
+"""Script used to measure the database queries and the memory of several API worker processes sharing the indexer snapshot.
+
+Usage:
+    python benchmarks/bench_shared_snapshot.py [--repo PATH] [--workers 4] [--years 100] [--ttl 10]
+
+Each worker process has its own mongomock client with the same synthetic (daily) histories and '_id's, standing
+for one MongoDB server. The workers start together and, when all of them are loaded, a register is inserted in every collection
+and each worker accesses its IndexerCache after the TTL expires (and again after 'retry_seconds'). It is run twice: with a snapshot directory shared
+by the workers (INDEXER_SNAPSHOT_DIR, in '/dev/shm' when available) and without it.
+
+For each run, the whole-collection loads and the incremental queries of all the workers are reported, with
+the memory of the series per worker: the proportional set size (PSS) of the memory-mapped snapshot files when
+shared, or the size of the arrays in each process otherwise.
+
+Use '--repo' with an older checkout (e.g. a 'git worktree') to compare before/after a change.
+"""
+
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import tempfile
+import subprocess
+
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, BENCHMARKS_DIR)
+
+import synthetic
+
+
+# Titles of the synthetic collections (all of them daily)
+TITLES = ["IPCA", "CDI", "SELIC", "FGTS", "POUPANCA"]
+
+# Seconds the workers wait, after the TTL expires, for the second access (after 'retry_seconds')
+RETRY_SECONDS = 1.0
+
+
+def get_mongo_client(total_years: int):
+    """Return a mongomock client with the daily histories and the same '_id's in every process."""
+    import mongomock
+    from bson import ObjectId
+
+    mongo_client = mongomock.MongoClient()
+    db = mongo_client.get_database(synthetic.DATABASE_NAME)
+    for position, collection_name in enumerate(synthetic.COLLECTION_NAMES):
+        items = synthetic.get_daily_items(total_years, position)
+        for number, item in enumerate(items):
+            item["_id"] = ObjectId(f"{position:08x}{number:016x}")
+        db.get_collection(collection_name).insert_many(items)
+    return mongo_client
+
+
+def count_queries(queries: dict) -> None:
+    """Count the whole-collection loads and the incremental queries of the mongomock collections."""
+    import mongomock
+
+    find = mongomock.collection.Collection.find
+
+    def counted_find(self, filter=None, *args, **kwargs):
+        condition = (filter or {}).get("_id", {})
+        if "$lte" in condition:
+            queries["full"] += 1
+        elif "$gt" in condition:
+            queries["incremental"] += 1
+        return find(self, filter, *args, **kwargs)
+
+    mongomock.collection.Collection.find = counted_find
+
+
+def get_mapped_pss_bytes(directory: str) -> int:
+    """Return the PSS of the mappings of files in the directory (Linux only)."""
+    total, mapped = 0, False
+    with open("/proc/self/smaps", encoding="utf-8") as smaps:
+        for line in smaps:
+            fields = line.split()
+            if "-" in fields[0] and len(fields) >= 5:
+                # Header of a mapping: address, permissions, offset, device, inode [, path]
+                mapped = len(fields) > 5 and fields[5].startswith(directory)
+            elif mapped and fields[0] == "Pss:":
+                total += int(fields[1]) * 1024
+    return total
+
+
+def get_series_bytes(indexers) -> int:
+    """Return the size of the arrays of the series, reading them all (so the mapped pages are resident, as when serving)."""
+    total = 0
+    for collection in indexers.db_collection_dict.values():
+        series = collection.get_series()
+        for array in [series.get_ordinals(), series.get_rates(), series.get_factors(), series.get_log_factors()]:
+            array.sum()
+            total += array.nbytes
+    return total
+
+
+def wait_for_parent(message: str) -> None:
+    """Tell the parent that the worker reached a step, then wait until all the workers reach it."""
+    print(message, flush=True)
+    sys.stdin.readline()
+
+
+def work(args: argparse.Namespace) -> None:
+    """Run one worker (in a child process) and print its results as JSON."""
+    sys.path.insert(0, os.path.abspath(args.repo))
+    from datetime import datetime
+    from bson import ObjectId
+    from API.indexer_cache import IndexerCache
+    from API.db_collection import EconomicIndexers
+
+    if args.snapshot_dir:
+        os.environ[EconomicIndexers.SNAPSHOT_DIR_ENVIRONMENT_VARIABLE] = args.snapshot_dir
+    os.environ[EconomicIndexers.GRANULARITIES_ENVIRONMENT_VARIABLE] = ",".join(f"{title}:daily" for title in TITLES)
+    mongo_client = get_mongo_client(args.years)
+    queries = {"full": 0, "incremental": 0}
+    count_queries(queries)
+
+    # Start: every worker loads all the collections
+    indexer_cache = IndexerCache(mongo_client, ttl_seconds=args.ttl, retry_seconds=RETRY_SECONDS)
+    indexer_cache.get_indexers().load_db_collections()
+    startup = dict(queries)
+    wait_for_parent("loaded")
+
+    # The same register is inserted in the (same) database, then the TTL expires
+    db = mongo_client.get_database(synthetic.DATABASE_NAME)
+    for position, collection_name in enumerate(synthetic.COLLECTION_NAMES):
+        db.get_collection(collection_name).insert_one({"_id": ObjectId(f"{position:08x}{'f' * 16}"), "year": synthetic.LAST_YEAR + 1, "month": 1, "day": 2, "value": 0.04})
+    time.sleep(args.ttl)
+    indexer_cache.get_indexers()
+    time.sleep(RETRY_SECONDS + 0.5)
+    indexers = indexer_cache.get_indexers()
+
+    final_date = datetime(synthetic.LAST_YEAR + 1, 1, 2)
+    updated = all(collection.get_series().get_ordinals()[-1] == (final_date.date() - synthetic.EPOCH).days for collection in indexers.db_collection_dict.values())
+    series_bytes = get_series_bytes(indexers)
+
+    # The PSS is measured while all the workers are mapping the snapshot (until the parent closes 'stdin')
+    wait_for_parent("ready")
+    print(json.dumps({
+        "startup": startup,
+        "refresh": {name: queries[name] - startup[name] for name in queries},
+        "updated": updated,
+        "series_bytes": get_mapped_pss_bytes(args.snapshot_dir) if args.snapshot_dir else series_bytes,
+    }), flush=True)
+    sys.stdin.read()
+
+
+def run(args: argparse.Namespace, snapshot_dir: str) -> list:
+    """Run the workers together and return their results."""
+    command = [sys.executable, os.path.abspath(__file__), "--work", "--repo", args.repo, "--years", str(args.years),
+               "--ttl", str(args.ttl), "--snapshot-dir", snapshot_dir or ""]
+    processes = [subprocess.Popen(command, stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True) for _ in range(args.workers)]
+    try:
+        for message in ["loaded", "ready"]:
+            for process in processes:
+                if process.stdout.readline().strip() != message:
+                    raise RuntimeError("A worker failed.")
+            for process in processes:
+                process.stdin.write("go\n")
+                process.stdin.flush()
+        return [json.loads(process.stdout.readline()) for process in processes]
+    finally:
+        for process in processes:
+            process.communicate()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repo", default=os.path.dirname(BENCHMARKS_DIR), help="repository root with the 'API' package")
+    parser.add_argument("--workers", type=int, default=4, help="worker processes")
+    parser.add_argument("--years", type=int, default=100, help="years of daily history per indexer")
+    parser.add_argument("--ttl", type=float, default=10.0, help="TTL (seconds) of the IndexerCache of the workers")
+    parser.add_argument("--work", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--snapshot-dir", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.work:
+        work(args)
+        return
+
+    snapshot_dir = tempfile.mkdtemp(prefix="econindexer-", dir="/dev/shm" if os.path.isdir("/dev/shm") else None)
+    try:
+        runs = {"shared snapshot": run(args, snapshot_dir), "no snapshot": run(args, None)}
+    finally:
+        shutil.rmtree(snapshot_dir, ignore_errors=True)
+
+    print(f"{args.workers} workers, {args.years} years of daily history, TTL {args.ttl:.0f} s ({args.repo})")
+    print(f"{'':<16} {'startup full':>13} {'startup incr.':>14} {'refresh full':>13} {'refresh incr.':>14} {'updated':>8} {'series MiB/worker':>18}")
+    for label, results in runs.items():
+        total = lambda stage, name: sum(result[stage][name] for result in results)
+        series_mib = sum(result["series_bytes"] for result in results) / len(results) / 2 ** 20
+        print(
+            f"{label:<16} {total('startup', 'full'):>13} {total('startup', 'incremental'):>14} {total('refresh', 'full'):>13} "
+            f"{total('refresh', 'incremental'):>14} {str(all(result['updated'] for result in results)):>8} {series_mib:>18.2f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,185 @@
+"""Script used to load test the API with many concurrent clients, against synthetic histories in mongomock with network latency.
+
+Usage:
+    python benchmarks/load_test.py [--repo PATH] [--clients 200] [--duration 10] [--latency-ms 20] [--years 30]
+
+The API is served by uvicorn (one worker), with every MongoDB command waiting '--latency-ms' as a round trip
+to a remote server would. Half of the clients request '/final_value_by_indexer' for IPCA (answered from memory)
+and the other half for CDI in the 'database' query mode (INDEXER_QUERY_MODES), which queries MongoDB on every
+request. The throughput and latency percentiles are reported per indexer.
+
+mongomock runs the queries in the API process, so with long histories ('--years') its CPU cost, not the
+latency, bounds the 'database' indexer on small machines.
+
+Use '--repo' with an older checkout (e.g. a 'git worktree') to compare before/after a change.
+"""
+
+import os
+import sys
+import time
+import asyncio
+import argparse
+import subprocess
+import statistics
+
+from urllib.parse import urlencode
+
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, BENCHMARKS_DIR)
+
+import synthetic
+
+
+DATABASE_INDEXER = "CDI"
+MEMORY_INDEXER = "IPCA"
+
+# Methods of the mongomock collections that would be a round trip to the server
+ROUND_TRIP_METHODS = ["find", "find_one", "aggregate", "estimated_document_count", "count_documents"]
+
+
+def add_latency(latency_seconds: float) -> None:
+    """Make every round trip of the mongomock collections wait 'latency_seconds' (releasing the GIL, like a socket)."""
+    import functools
+    import mongomock
+
+    def get_delayed_method(method):
+        @functools.wraps(method)
+        def delayed_method(*args, **kwargs):
+            time.sleep(latency_seconds)
+            return method(*args, **kwargs)
+        return delayed_method
+
+    for name in ROUND_TRIP_METHODS:
+        setattr(mongomock.collection.Collection, name, get_delayed_method(getattr(mongomock.collection.Collection, name)))
+
+
+def serve(args: argparse.Namespace) -> None:
+    """Serve the API of '--repo' (run in a child process)."""
+    sys.path.insert(0, os.path.abspath(args.repo))
+    os.environ["INDEXER_QUERY_MODES"] = f"{DATABASE_INDEXER}:database"
+    import uvicorn
+    import API.indexer_api as indexer_api
+
+    mongo_client = synthetic.get_mongo_client(args.years)
+    indexer_api.indexer_cache = indexer_api.IndexerCache(mongo_client)
+    # Both collections are loaded before the clients start
+    indexer_api.indexer_cache.get_indexers().load_db_collections([MEMORY_INDEXER, DATABASE_INDEXER])
+    add_latency(args.latency_ms / 1000)
+    uvicorn.run(indexer_api.app, host="127.0.0.1", port=args.port, log_level="warning")
+
+
+async def get_status(reader: asyncio.StreamReader, writer: asyncio.StreamWriter, request: bytes) -> int:
+    """Send a request on a keep-alive connection and return the status code, after reading the whole response."""
+    writer.write(request)
+    await writer.drain()
+    headers = await reader.readuntil(b"\r\n\r\n")
+    content_length = 0
+    for line in headers.split(b"\r\n")[1:]:
+        name, _, value = line.partition(b":")
+        if name.strip().lower() == b"content-length":
+            content_length = int(value)
+    await reader.readexactly(content_length)
+    return int(headers.split(b" ", 2)[1])
+
+
+async def run_client(port: int, indexer_reference: str, latencies: list, errors: list, start_time: float, stop_time: float) -> None:
+    """One client, with its own connection (a light client, so the load generator is not the bottleneck)."""
+    params = {
+        "initial_value": 1000.0,
+        "initial_date": f"{synthetic.LAST_YEAR - 9}-01-01T00:00:00",
+        "final_date": f"{synthetic.LAST_YEAR}-12-01T00:00:00",
+        "indexer_reference": indexer_reference,
+        "indexer_type": 2,
+        "indexer_add_rate": 110.0,
+    }
+    request = f"GET /final_value_by_indexer?{urlencode(params)} HTTP/1.1\r\nHost: 127.0.0.1\r\n\r\n".encode("latin-1")
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    try:
+        while time.perf_counter() < stop_time:
+            request_start = time.perf_counter()
+            try:
+                failed = await get_status(reader, writer, request) != 200
+            except (OSError, asyncio.IncompleteReadError, ValueError):
+                failed = True
+                writer.close()
+                reader, writer = await asyncio.open_connection("127.0.0.1", port)
+            request_stop = time.perf_counter()
+            # Requests started during the warm up are not counted
+            if request_start >= start_time:
+                (errors if failed else latencies).append(request_stop - request_start)
+    finally:
+        writer.close()
+
+
+async def run_clients(args: argparse.Namespace) -> dict:
+    start_time = time.perf_counter() + args.warm_up
+    stop_time = start_time + args.duration
+    results = {reference: ([], []) for reference in [MEMORY_INDEXER, DATABASE_INDEXER]}
+    await asyncio.gather(*[
+        run_client(args.port, [MEMORY_INDEXER, DATABASE_INDEXER][position % 2], *results[[MEMORY_INDEXER, DATABASE_INDEXER][position % 2]], start_time, stop_time)
+        for position in range(args.clients)
+    ])
+    return results
+
+
+def get_percentile(values: list, percentile: float) -> float:
+    return statistics.quantiles(values, n=1000)[int(percentile * 10) - 1] if len(values) > 1 else float("nan")
+
+
+async def wait_for_server(port: int, process: subprocess.Popen, timeout: float = 120.0) -> None:
+    deadline = time.perf_counter() + timeout
+    while time.perf_counter() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError("The API server stopped before the load test.")
+        try:
+            reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        except OSError:
+            await asyncio.sleep(0.2)
+            continue
+        try:
+            if await get_status(reader, writer, b"GET / HTTP/1.1\r\nHost: 127.0.0.1\r\n\r\n") == 200:
+                return
+        finally:
+            writer.close()
+    raise RuntimeError("The API server did not start.")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repo", default=os.path.dirname(BENCHMARKS_DIR), help="repository root with the 'API' package")
+    parser.add_argument("--clients", type=int, default=200, help="concurrent clients (half per indexer)")
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds measured")
+    parser.add_argument("--warm-up", type=float, default=2.0, help="seconds before measuring")
+    parser.add_argument("--latency-ms", type=float, default=20.0, help="latency of each MongoDB round trip")
+    parser.add_argument("--years", type=int, default=30, help="years of monthly history per indexer")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--serve", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.serve:
+        serve(args)
+        return
+
+    command = [sys.executable, os.path.abspath(__file__), "--serve", "--repo", args.repo, "--port", str(args.port),
+               "--latency-ms", str(args.latency_ms), "--years", str(args.years)]
+    process = subprocess.Popen(command)
+    try:
+        asyncio.run(wait_for_server(args.port, process))
+        results = asyncio.run(run_clients(args))
+    finally:
+        process.terminate()
+        process.wait()
+
+    print(f"{args.clients} clients, {args.duration:.0f} s, MongoDB latency {args.latency_ms:.0f} ms ({args.repo})")
+    print(f"{'indexer':<22} {'requests':>9} {'req/s':>8} {'p50 ms':>9} {'p99 ms':>9} {'errors':>7}")
+    for reference, (latencies, errors) in results.items():
+        label = f"{reference} ({'database' if reference == DATABASE_INDEXER else 'memory'})"
+        print(
+            f"{label:<22} {len(latencies):>9} {len(latencies) / args.duration:>8.1f} "
+            f"{get_percentile(latencies, 50) * 1000:>9.1f} {get_percentile(latencies, 99) * 1000:>9.1f} {len(errors):>7}"
+        )
+
+
+if __name__ == "__main__":
+    main()
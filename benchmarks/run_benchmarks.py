@@ -0,0 +1,280 @@
+"""Script used to benchmark the calculation core and the API routes against synthetic Economic Indexers histories.
+
+Usage:
+    python benchmarks/run_benchmarks.py [--years 30 300] [--daily-years 30] [--output FILE] [--compare FILE] [--mongodb-uri URI]
+
+The results (microseconds per call) are saved as JSON, by default in 'benchmarks/results/<commit>.json',
+so two commits can be compared with '--compare'.
+
+The query modes of the collections ('memory' and 'database') are compared with short ranges. Their
+database cases run against mongomock by default, which scans in Python and has no indexes; give
+'--mongodb-uri' to run them against a real server (in a scratch database, dropped at the end).
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import platform
+import subprocess
+import statistics
+
+from datetime import datetime
+
+import pandas as pd
+
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+REPOSITORY_DIR = os.path.dirname(BENCHMARKS_DIR)
+sys.path.insert(0, BENCHMARKS_DIR)
+sys.path.insert(0, REPOSITORY_DIR)
+
+import synthetic
+
+from API.dates import DateOperations as date
+from API.interest_rate import InterestCalculation as interest
+from API.db_collection import DBCollection, CDICollection
+
+
+# Scratch database of '--mongodb-uri' (never the one used by the apps)
+BENCHMARK_DATABASE_NAME = "econindexer_benchmarks"
+
+
+def get_time_per_call(function, repeat: int = 5, min_time: float = 0.2) -> dict:
+    """Return the min/median time per call (in microseconds), calling the function in loops of 'min_time' seconds."""
+    function()  # warm up (caches, imports)
+    number = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(number):
+            function()
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_time or number >= 1_000_000:
+            break
+        number *= 10 if elapsed < min_time / 10 else 2
+    timings = [elapsed / number]
+    for _ in range(repeat - 1):
+        start = time.perf_counter()
+        for _ in range(number):
+            function()
+        timings.append((time.perf_counter() - start) / number)
+    return {
+        "min_us": min(timings) * 1e6,
+        "median_us": statistics.median(timings) * 1e6,
+        "calls": number * repeat,
+    }
+
+
+def get_core_cases(collection: CDICollection, label: str) -> dict:
+    """Cases of the calculation core, for one collection (with 'label' describing its history)."""
+    series = collection.get_series()
+    first_date, last_date = pd.to_datetime(date.get_datetimes_from_ordinals(series.get_ordinals()[[0, -1]])).to_pydatetime()
+    ten_years_date = datetime(last_date.year - 9, 1, 1)
+    stacked_dataframe = collection.get_stacked_dataframe(mutable=True)
+    transposed_dataframe = collection.get_transposed_stacked_dataframe(mutable=True)
+    return {
+        f"{label} update_dataframe_from_db": collection.update_dataframe_from_db,
+        f"{label} update_dataframe_from_db(incremental)": lambda: collection.update_dataframe_from_db(incremental=True),
+        f"{label} get_stacked_dataframe_adjusted_from_values(10 years)":
+            lambda: collection.get_stacked_dataframe_adjusted_from_values(1000.0, ten_years_date, last_date, 110.0, interest.PROPORTIONAL_RATE),
+        f"{label} get_stacked_dataframe_adjusted_from_values(all)":
+            lambda: collection.get_stacked_dataframe_adjusted_from_values(1000.0, first_date, last_date, 5.0, interest.PREFIXED_RATE),
+        f"{label} get_adjusted_value_from_values(all)":
+            lambda: collection.get_adjusted_value_from_values(1000.0, first_date, last_date, 5.0, interest.PREFIXED_RATE),
+        f"{label} get_transposed_stacked_dataframe":
+            collection.get_transposed_stacked_dataframe,
+        f"{label} DateOperations.get_dataframe_from_dates":
+            lambda: date.get_dataframe_from_dates(stacked_dataframe, collection.STACKED_DATE_COLUMN, ten_years_date, last_date),
+        f"{label} InterestCalculation.set_cumulative_values_by_rates":
+            lambda: interest.set_cumulative_values_by_rates(stacked_dataframe, collection.STACKED_RATE_COLUMN, collection.STACKED_VALUE_COLUMN, 1000.0),
+        f"{label} InterestCalculation.set_yearly_rate_from_monthly_rates":
+            lambda: interest.set_yearly_rate_from_monthly_rates(transposed_dataframe, collection.TRANSPOSED_YEARLY_RATE_COLUMN, collection.TRANSPOSED_MONTHS_COLUMNS),
+    }
+
+
+def get_query_mode_cases(mongo_client, database_name: str, label: str) -> dict:
+    """Cases of one year queries, against the whole history in memory and against the database (range pushdown)."""
+    collections = {
+        query_mode: DBCollection(mongo_client, database_name, "cdi", "CDI", query_mode=query_mode)
+        for query_mode in DBCollection.QUERY_MODES
+    }
+    series = collections[DBCollection.QUERY_MODE_MEMORY].get_series()
+    last_date = pd.to_datetime(date.get_datetimes_from_ordinals(series.get_ordinals()[[-1]])).to_pydatetime()[0]
+    one_year_date = datetime(last_date.year, 1, 1)
+    cases = {}
+    for query_mode, collection in collections.items():
+        cases.update({
+            f"{label} {query_mode} get_adjusted_value_from_values(1 year)":
+                lambda collection=collection: collection.get_adjusted_value_from_values(1000.0, one_year_date, last_date, 5.0, interest.PREFIXED_RATE),
+            f"{label} {query_mode} get_stacked_dataframe_adjusted_from_values(1 year)":
+                lambda collection=collection: collection.get_stacked_dataframe_adjusted_from_values(1000.0, one_year_date, last_date, 110.0, interest.PROPORTIONAL_RATE),
+            # A new collection (cold start) answering its first query
+            f"{label} {query_mode} first get_adjusted_value_from_values(1 year)":
+                lambda query_mode=query_mode: DBCollection(mongo_client, database_name, "cdi", "CDI", query_mode=query_mode)
+                    .get_adjusted_value_from_values(1000.0, one_year_date, last_date, 5.0, interest.PREFIXED_RATE),
+        })
+    return cases
+
+
+def get_api_cases(total_years: int) -> dict:
+    """Cases for each route of the API, served by a test client (no network)."""
+    from fastapi.routing import APIRoute
+    from fastapi.testclient import TestClient
+    import API.indexer_api as indexer_api
+    from API.series_export import ExportFormat
+
+    indexer_api.indexer_cache = indexer_api.IndexerCache(synthetic.get_mongo_client(total_years))
+    client = TestClient(indexer_api.app)
+
+    label = f"API {total_years}y monthly"
+    last_year = synthetic.LAST_YEAR
+    params = {
+        "initial_value": 1000.0,
+        "initial_date": f"{last_year - 9}-01-01T00:00:00",
+        "final_date": f"{last_year}-12-01T00:00:00",
+        "indexer_reference": "CDI",
+        "indexer_type": 2,
+        "indexer_add_rate": 110.0,
+    }
+    benchmarking_params = {key: params[key] for key in ["initial_value", "initial_date", "final_date", "indexer_reference"]}
+    scenarios = [dict(params, indexer_reference=reference) for reference in ["IPCA", "CDI", "SELIC", "FGTS", "POUPANCA"]] * 200
+    # The exports cover the whole history
+    series_params = dict(params, initial_date=f"{last_year - total_years + 1}-01-01T00:00:00")
+    # The test client accepts 'gzip' by default (and decompresses the response, as a browser would)
+    encodings = {"": "identity", ", gzip": "gzip"}
+    # Only the text formats are compressed; Arrow and Parquet are skipped without 'pyarrow'
+    series_formats = [export_format for export_format in indexer_api.SeriesExport.FORMATS if ExportFormat.is_available(export_format)]
+    table_formats = [export_format for export_format in indexer_api.TABLE_FORMATS if ExportFormat.is_available(export_format)]
+
+    routes = {
+        ("GET", "/"): lambda: client.get("/"),
+        ("GET", "/interest_value"): lambda: client.get("/interest_value", params={"initial_value": 1000, "final_value": 1500}),
+        ("GET", "/interest_rate"): lambda: client.get("/interest_rate", params={"initial_value": 1000, "final_value": 1500}),
+        ("GET", "/final_value_by_indexer"): lambda: client.get("/final_value_by_indexer", params=params),
+        ("GET", "/interest_value_by_indexer"): lambda: client.get("/interest_value_by_indexer", params=params),
+        ("GET", "/interest_rate_by_indexer"): lambda: client.get("/interest_rate_by_indexer", params=params),
+        ("GET", "/benchmarking_by_indexer"): lambda: client.get("/benchmarking_by_indexer", params=dict(benchmarking_params, final_value=3000.0)),
+        ("POST", "/final_values_by_indexer"): lambda: client.post("/final_values_by_indexer", json=scenarios),
+        ("GET", "/metrics"): lambda: client.get("/metrics"),
+        ("POST", "/cache/invalidate"): lambda: client.post("/cache/invalidate"),
+    }
+    # Routes with one case per variant (e.g. format and compression of the exports)
+    route_variants = {
+        ("GET", "/series_by_indexer"): {
+            f"({export_format}{suffix})":
+                lambda export_format=export_format, encoding=encoding:
+                    client.get("/series_by_indexer", params=dict(series_params, export_format=export_format), headers={"Accept-Encoding": encoding})
+            for export_format in series_formats
+            for suffix, encoding in (encodings.items() if export_format not in ExportFormat.ARROW_FORMATS else [("", "identity")])
+        },
+        ("GET", "/table_by_indexer"): {
+            f"({export_format})": lambda export_format=export_format: client.get("/table_by_indexer", params={"indexer_reference": "CDI", "export_format": export_format})
+            for export_format in table_formats
+        },
+    }
+
+    # New routes must get a case here, otherwise they are reported as missing
+    for route in indexer_api.app.routes:
+        if isinstance(route, APIRoute):
+            for method in route.methods:
+                if (method, route.path) not in routes and (method, route.path) not in route_variants:
+                    print(f"WARNING: no benchmark for {method} {route.path}")
+
+    # The cache is invalidated after the other routes, then it does not affect them
+    invalidate_case = routes.pop(("POST", "/cache/invalidate"))
+    cases = {f"{label} {method} {path}": function for (method, path), function in routes.items()}
+    for (method, path), variants in route_variants.items():
+        cases.update({f"{label} {method} {path}{variant}": function for variant, function in variants.items()})
+    cases[f"{label} POST /cache/invalidate"] = invalidate_case
+
+    # Every case must succeed, otherwise the error path would be measured
+    for name, function in cases.items():
+        response = function()
+        if response.status_code >= 400:
+            raise RuntimeError(f"{name} returned {response.status_code}: {response.text}")
+    return cases
+
+
+def get_commit() -> str:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=REPOSITORY_DIR, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def print_comparison(results: dict, previous_results: dict) -> None:
+    print(f"\n{'case':<90} {'before':>12} {'after':>12} {'ratio':>7}")
+    for name, result in results.items():
+        previous = previous_results.get(name)
+        if previous:
+            ratio = result["median_us"] / previous["median_us"]
+            print(f"{name:<90} {previous['median_us']:>10.1f}us {result['median_us']:>10.1f}us {ratio:>6.2f}x")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--years", type=int, nargs="*", default=[30, 300], help="years of the monthly histories")
+    parser.add_argument("--daily-years", type=int, nargs="*", default=[30], help="years of the daily histories (weekdays)")
+    parser.add_argument("--api-years", type=int, default=30, help="years of the histories served by the API")
+    parser.add_argument("--filter", default="", help="only run the cases containing this text")
+    parser.add_argument("--output", help="JSON file for the results (default: benchmarks/results/<commit>.json)")
+    parser.add_argument("--compare", help="JSON file of previous results to compare with")
+    parser.add_argument("--mongodb-uri", help=f"MongoDB server for the query mode cases (database '{BENCHMARK_DATABASE_NAME}')")
+    args = parser.parse_args()
+
+    commit = get_commit()
+    output = args.output or os.path.join(BENCHMARKS_DIR, "results", f"{commit}.json")
+
+    cases = {}
+    for granularity, years_list in [("monthly", args.years), ("daily", args.daily_years)]:
+        for total_years in years_list:
+            mongo_client = synthetic.get_mongo_client(total_years, granularity, collection_names=["cdi"])
+            cases.update(get_core_cases(CDICollection(mongo_client), f"{total_years}y {granularity}"))
+
+    server_client = None
+    if args.mongodb_uri:
+        import pymongo
+        server_client = pymongo.MongoClient(args.mongodb_uri)
+    for granularity, years_list in [("monthly", args.years), ("daily", args.daily_years)]:
+        for total_years in years_list:
+            label = f"{total_years}y {granularity} {'server' if server_client else 'mongomock'}"
+            if server_client:
+                # Each history gets its own database, since the cases are only run after all of them are created
+                database_name = f"{BENCHMARK_DATABASE_NAME}_{total_years}y_{granularity}"
+                mongo_client = synthetic.get_mongo_client(total_years, granularity, ["cdi"], server_client, database_name)
+            else:
+                database_name = synthetic.DATABASE_NAME
+                mongo_client = synthetic.get_mongo_client(total_years, granularity, collection_names=["cdi"])
+            cases.update(get_query_mode_cases(mongo_client, database_name, label))
+    cases.update(get_api_cases(args.api_years))
+
+    results = {}
+    for name, function in cases.items():
+        if args.filter in name:
+            results[name] = get_time_per_call(function)
+            print(f"{name:<90} {results[name]['median_us']:>12.1f} us/call")
+
+    if server_client:
+        for database_name in server_client.list_database_names():
+            if database_name.startswith(BENCHMARK_DATABASE_NAME):
+                server_client.drop_database(database_name)
+
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w", encoding="utf-8") as output_file:
+        json.dump({
+            "commit": commit,
+            "date": datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+            "results": results,
+        }, output_file, indent=2)
+    print(f"\nResults saved in {output}")
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as previous_file:
+            print_comparison(results, json.load(previous_file)["results"])
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,58 @@
+"""Script used to generate synthetic Economic Indexers histories in an in-process MongoDB stand-in (mongomock)."""
+
+import random
+
+from datetime import date, timedelta
+
+import mongomock
+
+
+DATABASE_NAME = "economic_indexers"
+COLLECTION_NAMES = ["ipca", "cdi", "selic", "fgts", "poupanca"]
+
+# Histories end in the last complete year (300 years still fit in 'datetime64[ns]')
+LAST_YEAR = date.today().year - 1
+
+# Origin of the ordinals (days since 1970-01-01)
+EPOCH = date(1970, 1, 1)
+
+
+def get_monthly_items(total_years: int, seed: int = 0) -> list:
+    """Return a list of registers (year, month, day, value), one per month, ending in LAST_YEAR."""
+    first_year = LAST_YEAR - total_years + 1
+    generator = random.Random(seed)
+    return [
+        {"year": year, "month": month, "day": 1, "value": round(generator.uniform(-0.5, 2.0), 4)}
+        for year in range(first_year, first_year + total_years)
+        for month in range(1, 13)
+    ]
+
+
+def get_daily_items(total_years: int, seed: int = 0) -> list:
+    """Return a list of registers (year, month, day, value), one per business day, ending in LAST_YEAR."""
+    # Imported here, since the scripts only add the repository to the path when they run
+    from API.business_days import BusinessDayCalendar
+
+    business_days = BusinessDayCalendar.get_business_days(
+        (date(LAST_YEAR - total_years + 1, 1, 1) - EPOCH).days, (date(LAST_YEAR, 12, 31) - EPOCH).days,
+    )
+    generator = random.Random(seed)
+    items = []
+    for ordinal in business_days.tolist():
+        item_date = EPOCH + timedelta(days=ordinal)
+        items.append({"year": item_date.year, "month": item_date.month, "day": item_date.day, "value": round(generator.uniform(0.0, 0.08), 6)})
+    return items
+
+
+def get_mongo_client(total_years: int = 30, granularity: str = "monthly", collection_names: list = None, mongo_client=None, database_name: str = DATABASE_NAME):
+    """Return a mongomock client with the Economic Indexers collections (all by default) filled ('monthly' or 'daily').
+
+    When 'mongo_client' is given (e.g. a real server), its 'database_name' collections are replaced instead.
+    """
+    get_items = get_daily_items if granularity == "daily" else get_monthly_items
+    mongo_client = mongomock.MongoClient() if mongo_client is None else mongo_client
+    db = mongo_client.get_database(database_name)
+    for seed, collection_name in enumerate(collection_names or COLLECTION_NAMES):
+        db.drop_collection(collection_name)
+        db.get_collection(collection_name).insert_many(get_items(total_years, seed))
+    return mongo_client
@@ -0,0 +1,48 @@
+"""Script used to make the 'API' package importable by the tests (as in the benchmarks) and to share the fixtures of the API tests."""
+
+import os
+import sys
+import random
+
+import mongomock
+import pytest
+
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from API.db_collection import EconomicIndexers
+
+
+def get_monthly_items(first_year: int, last_year: int, seed: int = 0) -> list:
+    """Return one register (year, month, day, value) per month, from January of the first year to December of the last one."""
+    generator = random.Random(seed)
+    return [
+        {"year": year, "month": month, "day": 1, "value": round(generator.uniform(-0.5, 2.0), 4)}
+        for year in range(first_year, last_year + 1)
+        for month in range(1, 13)
+    ]
+
+
+@pytest.fixture
+def api_mongo_client():
+    """Return a mongomock client with monthly registers (2000 to 2009) of every indexer."""
+    mongo_client = mongomock.MongoClient()
+    for seed, db_collection_class in enumerate(EconomicIndexers.DB_COLLECTION_CLASSES):
+        db = mongo_client.get_database(db_collection_class.DATABASE_NAME)
+        db.get_collection(db_collection_class.COLLECTION_NAME).insert_many(get_monthly_items(2000, 2009, seed))
+    return mongo_client
+
+
+@pytest.fixture
+def api(monkeypatch, api_mongo_client):
+    """Return the 'indexer_api' module, with its IndexerCache over 'api_mongo_client'."""
+    from API import indexer_api
+    monkeypatch.setattr(indexer_api, "indexer_cache", indexer_api.IndexerCache(api_mongo_client))
+    return indexer_api
+
+
+@pytest.fixture
+def client(api):
+    """Return a TestClient of the API (without the startup and shutdown events, so the executors are kept among the tests)."""
+    from fastapi.testclient import TestClient
+    return TestClient(api.app)
@@ -0,0 +1,134 @@
+"""Tests of the adjusted values of DBCollection (prefix factors) against the rate-by-rate compounding of the original implementation."""
+
+import random
+
+from datetime import date, datetime, timedelta
+
+import mongomock
+import numpy as np
+import pytest
+
+from API.business_days import BusinessDayCalendar
+from API.db_collection import DBCollection, CDICollection
+from API.interest_rate import InterestCalculation as interest
+
+
+EPOCH = date(1970, 1, 1)
+FIRST_YEAR = 2000
+TOTAL_YEARS = 8
+
+# Collection of the CDI registers
+DATABASE_NAME = "economic_indexers"
+COLLECTION_NAME = "cdi"
+
+# Periods (initial date, final date), including partial months and dates out of the history
+PERIODS = [
+    (datetime(2000, 1, 1), datetime(2007, 12, 31)),
+    (datetime(2001, 3, 1), datetime(2004, 7, 1)),
+    (datetime(2002, 5, 17), datetime(2002, 11, 3)),
+    (datetime(2003, 8, 1), datetime(2003, 8, 31)),
+    (datetime(1995, 1, 1), datetime(2001, 6, 30)),
+    (datetime(2006, 2, 10), datetime(2012, 1, 1)),
+]
+
+
+def get_items(granularity: str) -> list:
+    """Return registers (year, month, day, value): one per month or one per business day."""
+    generator = random.Random(granularity)
+    if granularity == DBCollection.GRANULARITY_DAILY:
+        ordinals = BusinessDayCalendar.get_business_days(
+            (date(FIRST_YEAR, 1, 1) - EPOCH).days, (date(FIRST_YEAR + TOTAL_YEARS - 1, 12, 31) - EPOCH).days,
+        ).tolist()
+        dates = [EPOCH + timedelta(days=ordinal) for ordinal in ordinals]
+        return [{"year": day.year, "month": day.month, "day": day.day, "value": round(generator.uniform(0.0, 0.08), 6)} for day in dates]
+    return [
+        {"year": year, "month": month, "day": 1, "value": round(generator.uniform(-0.5, 2.0), 4)}
+        for year in range(FIRST_YEAR, FIRST_YEAR + TOTAL_YEARS)
+        for month in range(1, 13)
+    ]
+
+
+def get_baseline_adjusted_value(items: list, initial_value: float, initial_date: datetime, final_date: datetime, rate_value: float, rate_type: str, periods_per_year: int) -> float:
+    """Compound the rates of the period one by one, as the cumulative products of the original dataframes."""
+    value = initial_value
+    adjusted_value = initial_value
+    period_rate = ((1 + rate_value / 100) ** (1 / periods_per_year) - 1) * 100
+    for item in items:
+        if initial_date <= datetime(item["year"], item["month"], item["day"]) <= final_date:
+            value *= 1 + item["value"] / 100
+            adjusted_value *= 1 + period_rate / 100
+    if rate_type == interest.PREFIXED_RATE:
+        return adjusted_value - initial_value + value
+    if rate_type == interest.PROPORTIONAL_RATE:
+        return initial_value + (value - initial_value) * (rate_value / 100)
+    return value
+
+
+@pytest.fixture(scope="module", params=[DBCollection.GRANULARITY_MONTHLY, DBCollection.GRANULARITY_DAILY])
+def history(request) -> tuple:
+    """Return the (registers, mongomock client) of a CDI history."""
+    items = get_items(request.param)
+    mongo_client = mongomock.MongoClient()
+    # Shuffled, since the registers are not always inserted in date order
+    mongo_client.get_database(DATABASE_NAME).get_collection(COLLECTION_NAME).insert_many(
+        [dict(item) for item in random.Random(0).sample(items, len(items))]
+    )
+    return items, mongo_client, request.param
+
+
+@pytest.mark.parametrize("query_mode", DBCollection.QUERY_MODES)
+@pytest.mark.parametrize("rate_type", interest.ADDED_RATE_TYPE_LIST)
+def test_adjusted_value_matches_baseline(history, query_mode, rate_type):
+    items, mongo_client, granularity = history
+    collection = CDICollection(mongo_client, query_mode=query_mode, granularity=granularity)
+    rate_value = 6.5 if rate_type == interest.PREFIXED_RATE else 110.0
+    for initial_date, final_date in PERIODS:
+        expected = get_baseline_adjusted_value(items, 1000.0, initial_date, final_date, rate_value, rate_type, collection.get_periods_per_year())
+        value = collection.get_adjusted_value_from_values(1000.0, initial_date, final_date, rate_value, rate_type)
+        assert value == pytest.approx(expected, rel=1e-12)
+
+
+@pytest.mark.parametrize("query_mode", DBCollection.QUERY_MODES)
+@pytest.mark.parametrize("rate_type", interest.ADDED_RATE_TYPE_LIST)
+def test_adjusted_dataframe_ends_with_adjusted_value(history, query_mode, rate_type):
+    # The user app takes the final value from the last row of the adjusted dataframe
+    items, mongo_client, granularity = history
+    collection = CDICollection(mongo_client, query_mode=query_mode, granularity=granularity)
+    rate_value = 6.5 if rate_type == interest.PREFIXED_RATE else 110.0
+    for initial_date, final_date in PERIODS:
+        expected = get_baseline_adjusted_value(items, 1000.0, initial_date, final_date, rate_value, rate_type, collection.get_periods_per_year())
+        df = collection.get_stacked_dataframe_adjusted_from_values(1000.0, initial_date, final_date, rate_value, rate_type)
+        assert df[collection.STACKED_ADJ_VALUE_COLUMN].iloc[-1] == pytest.approx(expected, rel=1e-12)
+
+
+@pytest.mark.parametrize("query_mode", DBCollection.QUERY_MODES)
+def test_adjusted_values_from_arrays_match_baseline(history, query_mode):
+    items, mongo_client, granularity = history
+    collection = CDICollection(mongo_client, query_mode=query_mode, granularity=granularity)
+    scenarios = [
+        (initial_date, final_date, rate_type_index)
+        for initial_date, final_date in PERIODS
+        for rate_type_index in range(len(interest.ADDED_RATE_TYPE_LIST))
+    ]
+    initial_dates, final_dates, rate_type_indexes = [np.array(column) for column in zip(*scenarios)]
+    rate_values = np.where(rate_type_indexes == interest.PREFIXED_RATE_INDEX, 6.5, 110.0)
+    values = collection.get_adjusted_values_from_arrays(
+        np.full(len(scenarios), 1000.0), initial_dates.astype("datetime64[ns]"), final_dates.astype("datetime64[ns]"), rate_values, rate_type_indexes,
+    )
+    expected = [
+        get_baseline_adjusted_value(items, 1000.0, initial_date, final_date, rate_value, interest.ADDED_RATE_TYPE_LIST[rate_type_index], collection.get_periods_per_year())
+        for (initial_date, final_date, rate_type_index), rate_value in zip(scenarios, rate_values)
+    ]
+    np.testing.assert_allclose(values, expected, rtol=1e-12)
+
+
+@pytest.mark.parametrize("query_mode", DBCollection.QUERY_MODES)
+def test_period_without_rates(history, query_mode):
+    _, mongo_client, granularity = history
+    collection = CDICollection(mongo_client, query_mode=query_mode, granularity=granularity)
+    with pytest.raises(IndexError):
+        collection.get_adjusted_value_from_values(1000.0, datetime(1990, 1, 1), datetime(1990, 12, 31), 0.0, interest.NONE_RATE)
+    values = collection.get_adjusted_values_from_arrays(
+        np.array([1000.0]), np.array(["1990-01-01"], dtype="datetime64[ns]"), np.array(["1990-12-31"], dtype="datetime64[ns]"), np.array([0.0]), np.array([0]),
+    )
+    assert np.isnan(values[0])
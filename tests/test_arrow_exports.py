@@ -0,0 +1,152 @@
+"""Tests of the Arrow IPC and Parquet exports ('/series_by_indexer' and '/table_by_indexer') and of the negotiation of the format by the 'Accept' header."""
+
+import io
+import sys
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+import pytest
+
+from API.series_export import ExportFormat, SeriesExport
+
+
+PARAMS = {
+    "initial_value": 1000.0,
+    "initial_date": "2001-03-01T00:00:00",
+    "final_date": "2008-07-01T00:00:00",
+    "indexer_reference": "IPCA",
+    "indexer_type": 1,
+    "indexer_add_rate": 6.5,
+}
+
+TABLE_FORMATS = [ExportFormat.JSON, ExportFormat.ARROW, ExportFormat.PARQUET]
+
+
+def get_csv_dataframe(client, params: dict) -> pd.DataFrame:
+    response = client.get("/series_by_indexer", params=dict(params, export_format="csv"), headers={"Accept-Encoding": "identity"})
+    return pd.read_csv(io.StringIO(response.text), parse_dates=["date"], float_precision="round_trip")
+
+
+def get_arrow_dataframe(table: pa.Table) -> pd.DataFrame:
+    # The dates are 'date32' (objects in pandas), compared with the ones of the CSV
+    df = table.to_pandas()
+    df["date"] = pd.to_datetime(df["date"])
+    return df
+
+
+@pytest.fixture
+def without_pyarrow(monkeypatch):
+    monkeypatch.setattr(sys.modules[ExportFormat.__module__], "pa", None)
+
+
+
+@pytest.mark.parametrize("accept, formats, expected", [
+    ("application/vnd.apache.arrow.stream", SeriesExport.FORMATS, ExportFormat.ARROW),
+    ("application/vnd.apache.parquet", SeriesExport.FORMATS, ExportFormat.PARQUET),
+    ("text/csv;q=0.5, application/x-ndjson", SeriesExport.FORMATS, ExportFormat.NDJSON),
+    ("application/vnd.apache.parquet;q=0.9, application/vnd.apache.arrow.stream;q=0.8", SeriesExport.FORMATS, ExportFormat.PARQUET),
+    # With the same quality, the most specific media type is preferred
+    ("application/*, application/vnd.apache.arrow.stream", SeriesExport.FORMATS, ExportFormat.ARROW),
+    ("application/*", SeriesExport.FORMATS, ExportFormat.NDJSON),
+    ("*/*", SeriesExport.FORMATS, ExportFormat.CSV),
+    ("*/*", TABLE_FORMATS, ExportFormat.JSON),
+    ("application/vnd.apache.arrow.stream;q=0, */*;q=0.1", TABLE_FORMATS, ExportFormat.JSON),
+    ("APPLICATION/VND.APACHE.PARQUET ; Q=1", TABLE_FORMATS, ExportFormat.PARQUET),
+    ("text/csv;q=abc", SeriesExport.FORMATS, None),
+    ("text/html, image/*", SeriesExport.FORMATS, None),
+    ("", SeriesExport.FORMATS, None),
+    (None, TABLE_FORMATS, None),
+])
+def test_format_from_accept(accept, formats, expected):
+    assert ExportFormat.get_format_from_accept(accept, formats) == expected
+
+
+def test_arrow_formats_are_not_negotiated_without_pyarrow(without_pyarrow):
+    assert ExportFormat.get_format_from_accept("application/vnd.apache.arrow.stream, text/csv;q=0.1", SeriesExport.FORMATS) == ExportFormat.CSV
+    assert ExportFormat.get_format_from_accept("application/vnd.apache.parquet", TABLE_FORMATS) is None
+
+
+@pytest.mark.parametrize("export_format", [ExportFormat.ARROW, ExportFormat.PARQUET])
+def test_series_by_accept(client, export_format):
+    response = client.get("/series_by_indexer", params=PARAMS, headers={"Accept": ExportFormat.MEDIA_TYPES[export_format] + ", text/csv;q=0.5"})
+
+    assert response.status_code == 200
+    assert response.headers["content-type"] == ExportFormat.MEDIA_TYPES[export_format]
+    assert response.headers["content-disposition"] == f'attachment; filename="IPCA.{export_format}"'
+    # The binary formats are not compressed
+    assert "content-encoding" not in response.headers
+
+
+@pytest.mark.parametrize("indexer_type", [0, 1, 2])
+def test_series_arrow_round_trip(client, monkeypatch, indexer_type):
+    monkeypatch.setattr(SeriesExport, "CHUNK_ROWS", 16)
+    params = dict(PARAMS, indexer_type=indexer_type)
+    response = client.get("/series_by_indexer", params=dict(params, export_format="arrow"))
+
+    reader = pa.ipc.open_stream(response.content)
+    assert reader.schema == pa.schema([("date", pa.date32())] + [(name, pa.float64()) for name in SeriesExport.COLUMNS[1:]])
+    batches = list(reader)
+    # One record batch per chunk of the export
+    assert [batch.num_rows for batch in batches[:-1]] == [16] * (len(batches) - 1)
+    pd.testing.assert_frame_equal(get_arrow_dataframe(pa.Table.from_batches(batches)), get_csv_dataframe(client, params), check_exact=False, rtol=1e-15)
+
+
+@pytest.mark.parametrize("indexer_type", [0, 1, 2])
+def test_series_parquet_round_trip(client, indexer_type):
+    params = dict(PARAMS, indexer_type=indexer_type)
+    response = client.get("/series_by_indexer", params=dict(params, export_format="parquet"))
+
+    table = pq.read_table(io.BytesIO(response.content))
+    assert table.column_names == SeriesExport.COLUMNS
+    pd.testing.assert_frame_equal(get_arrow_dataframe(table), get_csv_dataframe(client, params), check_exact=False, rtol=1e-15)
+
+
+def test_series_without_rates(client):
+    params = dict(PARAMS, initial_date="1990-01-01T00:00:00", final_date="1990-12-01T00:00:00")
+
+    table = pa.ipc.open_stream(client.get("/series_by_indexer", params=dict(params, export_format="arrow")).content).read_all()
+    assert table.num_rows == 0 and table.column_names == SeriesExport.COLUMNS
+    assert pq.read_table(io.BytesIO(client.get("/series_by_indexer", params=dict(params, export_format="parquet")).content)).num_rows == 0
+
+
+@pytest.mark.parametrize("export_format", [ExportFormat.ARROW, ExportFormat.PARQUET])
+def test_table_round_trip(client, export_format):
+    json_response = client.get("/table_by_indexer", params={"indexer_reference": "IPCA"})
+    response = client.get("/table_by_indexer", params={"indexer_reference": "IPCA"}, headers={"Accept": ExportFormat.MEDIA_TYPES[export_format]})
+
+    assert json_response.headers["content-type"] == "application/json" and "content-disposition" not in json_response.headers
+    assert response.status_code == 200
+    assert response.headers["content-type"] == ExportFormat.MEDIA_TYPES[export_format]
+    assert response.headers["content-disposition"] == f'attachment; filename="IPCA.{export_format}"'
+    if export_format == ExportFormat.ARROW:
+        table = pa.ipc.open_stream(response.content).read_all()
+    else:
+        table = pq.read_table(io.BytesIO(response.content))
+    df = table.to_pandas()
+    json_df = pd.DataFrame(json_response.json())
+
+    # One row per year (2000 to 2009, most recent first), with the same rates of the JSON table
+    assert list(df.columns) == list(json_df.columns) and df.columns[0] == "Ano"
+    assert df["Ano"].tolist() == list(range(2009, 1999, -1))
+    pd.testing.assert_frame_equal(df.astype(float), json_df.astype(float), check_exact=False, rtol=1e-14)
+
+
+@pytest.mark.parametrize("path, params", [("/series_by_indexer", PARAMS), ("/table_by_indexer", {"indexer_reference": "IPCA"})])
+def test_invalid_format(client, path, params):
+    response = client.get(path, params=dict(params, export_format="xlsx"))
+
+    assert response.status_code == 422
+    assert "export_format" in response.json()["detail"]
+
+
+@pytest.mark.parametrize("path, params", [("/series_by_indexer", PARAMS), ("/table_by_indexer", {"indexer_reference": "IPCA"})])
+def test_arrow_formats_without_pyarrow(client, without_pyarrow, path, params):
+    for export_format in [ExportFormat.ARROW, ExportFormat.PARQUET]:
+        response = client.get(path, params=dict(params, export_format=export_format))
+        assert response.status_code == 406
+        assert "pyarrow" in response.json()["detail"]
+    # By the 'Accept' header, the default format is sent instead
+    response = client.get(path, params=params, headers={"Accept": ExportFormat.MEDIA_TYPES[ExportFormat.ARROW]})
+    assert response.status_code == 200
+    assert response.headers["content-type"] not in [ExportFormat.MEDIA_TYPES[ExportFormat.ARROW], ExportFormat.MEDIA_TYPES[ExportFormat.PARQUET]]
@@ -0,0 +1,122 @@
+"""Tests of the bulk import of historical series (bulk_import.py): reading, validation and idempotent upserts."""
+
+import mongomock
+import pytest
+
+from API import bulk_import
+from API.bulk_import import IndexerFileReader, IndexerImporter
+from API.db_collection import DBCollection, IPCACollection
+
+
+CSV_CONTENT = """ano;mes;valor
+2020;1;0,21
+2020;2;0,25
+2020;3;0,07
+2020;4;-0,31
+"""
+
+HTML_CONTENT = """<html><body><table>
+<tr><th>Ano</th><th>Jan</th><th>Fev</th><th>Mar</th><th>Abr</th><th>Mai</th><th>Jun</th><th>Jul</th><th>Ago</th><th>Set</th><th>Out</th><th>Nov</th><th>Dez</th></tr>
+<tr><td>2020</td><td>0,21</td><td>0,25</td><td>0,07</td><td>-0,31</td><td>-0,38</td><td>0,26</td><td>0,36</td><td>0,24</td><td>0,64</td><td>0,86</td><td>0,89</td><td>1,35</td></tr>
+<tr><td>2021</td><td>0,25</td><td>0,86</td><td>-</td><td></td><td></td><td></td><td></td><td></td><td></td><td></td><td></td><td></td></tr>
+</table></body></html>
+"""
+
+
+def write_file(tmp_path, name: str, content: str) -> str:
+    path = tmp_path / name
+    path.write_text(content, encoding="utf-8")
+    return str(path)
+
+
+def get_registers(mongo_client) -> list:
+    db_collection = mongo_client.get_database(IPCACollection.DATABASE_NAME).get_collection(IPCACollection.COLLECTION_NAME)
+    return list(db_collection.find({}, {DBCollection.DB_ID_COLUMN: 0}).sort([("year", 1), ("month", 1), ("day", 1)]))
+
+
+@pytest.fixture
+def mongo_client():
+    return mongomock.MongoClient()
+
+
+
+def test_read_csv_and_html(tmp_path):
+    csv_df = IndexerFileReader.read_file(write_file(tmp_path, "ipca.csv", CSV_CONTENT))
+    html_df = IndexerFileReader.read_file(write_file(tmp_path, "ipca.html", HTML_CONTENT))
+
+    assert list(IndexerImporter.get_validated_dataframe(csv_df)["value"]) == [0.21, 0.25, 0.07, -0.31]
+    html_df = IndexerImporter.get_validated_dataframe(html_df)
+    # Empty cells and '-' are months not published yet
+    assert len(html_df) == 14
+    assert html_df.iloc[-1][["year", "month", "day", "value"]].tolist() == [2021, 2, 1, 0.86]
+
+
+def test_import_is_idempotent(tmp_path, mongo_client, capsys):
+    arguments = ["--indexer", "IPCA", write_file(tmp_path, "ipca.csv", CSV_CONTENT)]
+
+    assert bulk_import.main(arguments, mongo_client) == 0
+    registers = get_registers(mongo_client)
+    assert [(item["year"], item["month"], item["day"], item["value"]) for item in registers] == [(2020, 1, 1, 0.21), (2020, 2, 1, 0.25), (2020, 3, 1, 0.07), (2020, 4, 1, -0.31)]
+    assert all(item[DBCollection.DB_UPDATED_AT_COLUMN] is not None for item in registers)
+    assert "Inserted: 4  Updated: 0  Unchanged: 0" in capsys.readouterr().out
+
+    # Running again (even with '--update-existing') writes nothing
+    assert bulk_import.main(arguments + ["--update-existing"], mongo_client) == 0
+    assert get_registers(mongo_client) == registers
+    assert "Inserted: 0  Updated: 0  Unchanged: 4" in capsys.readouterr().out
+
+
+def test_existing_values_are_only_replaced_on_request(tmp_path, mongo_client, capsys):
+    assert bulk_import.main(["--indexer", "IPCA", write_file(tmp_path, "ipca.csv", CSV_CONTENT)], mongo_client) == 0
+    registers = get_registers(mongo_client)
+    corrected = write_file(tmp_path, "corrected.csv", "data,valor\n01/02/2020,0.27\n01/05/2020,-0.38\n")
+
+    assert bulk_import.main(["--indexer", "IPCA", corrected], mongo_client) == 0
+    assert get_registers(mongo_client)[1] == registers[1]
+    assert "Inserted: 1  Updated: 0  Unchanged: 1" in capsys.readouterr().out
+
+    assert bulk_import.main(["--indexer", "IPCA", corrected, "--update-existing"], mongo_client) == 0
+    new_registers = get_registers(mongo_client)
+    assert new_registers[1]["value"] == 0.27
+    assert new_registers[1][DBCollection.DB_UPDATED_AT_COLUMN] > registers[1][DBCollection.DB_UPDATED_AT_COLUMN]
+    # The other registers are not written again
+    assert [new_registers[position] for position in [0, 2, 3]] == [registers[position] for position in [0, 2, 3]]
+    assert "Inserted: 0  Updated: 1  Unchanged: 1" in capsys.readouterr().out
+
+
+@pytest.mark.parametrize("content, error", [
+    ("ano;mes;valor\n2020;13;0,21\n", "invalid date"),
+    ("ano;mes;valor\n2020;1;abc\n", "invalid value"),
+    ("ano;mes;valor\n2020;1;150\n", "invalid value"),
+    ("ano;mes;valor\n2020;1;0,21\n2020;1;0,22\n", "different values"),
+    ("ano;valor\n2020;0,21\n", "missing columns"),
+])
+def test_nothing_is_written_on_error(tmp_path, mongo_client, capsys, content, error):
+    valid_file = write_file(tmp_path, "valid.csv", CSV_CONTENT)
+    invalid_file = write_file(tmp_path, "invalid.csv", content)
+
+    assert bulk_import.main(["--indexer", "IPCA", valid_file, invalid_file], mongo_client) == 1
+    assert error in capsys.readouterr().err
+    assert get_registers(mongo_client) == []
+
+
+def test_every_error_is_listed():
+    df = IndexerFileReader.get_dataframe_from_table([["Ano", "Jan", "Fev", "Mar", "Abr", "Mai", "Jun"], ["2020", "0,21", "x", "0,07", "200", "0,1", "0,2"]], "table")
+
+    with pytest.raises(ValueError) as error:
+        IndexerImporter.get_validated_dataframe(df)
+    assert str(error.value).splitlines() == ["table, 2020/2: invalid value (nan)", "table, 2020/4: invalid value (200.0)"]
+
+
+def test_dry_run_writes_nothing(tmp_path, mongo_client, capsys):
+    assert bulk_import.main(["--indexer", "IPCA", write_file(tmp_path, "ipca.csv", CSV_CONTENT), "--dry-run"], mongo_client) == 0
+    assert "4 valid registers, from 01/2020 to 04/2020" in capsys.readouterr().out
+    assert get_registers(mongo_client) == []
+
+
+def test_unique_index_is_created(tmp_path, mongo_client):
+    assert bulk_import.main(["--indexer", "IPCA", write_file(tmp_path, "ipca.csv", CSV_CONTENT)], mongo_client) == 0
+    db_collection = mongo_client.get_database(IPCACollection.DATABASE_NAME).get_collection(IPCACollection.COLLECTION_NAME)
+    indexes = db_collection.index_information()
+
+    assert indexes[DBCollection.DATE_INDEX_NAME].get("unique") and DBCollection.UPDATED_AT_INDEX_NAME in indexes
@@ -0,0 +1,138 @@
+"""Tests of the conditional requests (ConditionalRequestMiddleware) of the indexer routes: ETag, Last-Modified and '304 Not Modified'."""
+
+from datetime import datetime, timedelta, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+
+import mongomock
+import pandas as pd
+import pytest
+
+from bson import ObjectId
+
+from API.bulk_import import IndexerImporter
+from API.conditional_requests import ConditionalRequestMiddleware
+from API.db_collection import EconomicIndexers, IPCACollection
+
+from conftest import get_monthly_items
+
+
+# Insertion time of the registers, so the later writes are always after it (HTTP dates have a precision of seconds)
+INSERTED_AT = datetime(2020, 1, 2, tzinfo=timezone.utc)
+
+PARAMS = {
+    "initial_value": 1000.0,
+    "initial_date": "2001-03-01T00:00:00",
+    "final_date": "2008-07-01T00:00:00",
+    "indexer_reference": "IPCA",
+    "indexer_type": 1,
+    "indexer_add_rate": 6.5,
+}
+
+
+@pytest.fixture
+def api_mongo_client():
+    """Return a mongomock client with monthly registers (2000 to 2009) of every indexer, inserted at INSERTED_AT."""
+    mongo_client = mongomock.MongoClient()
+    for seed, db_collection_class in enumerate(EconomicIndexers.DB_COLLECTION_CLASSES):
+        items = get_monthly_items(2000, 2009, seed)
+        for position, item in enumerate(items):
+            item["_id"] = ObjectId(f"{int(INSERTED_AT.timestamp()):08x}{seed:04x}{position:012x}")
+        mongo_client.get_database(db_collection_class.DATABASE_NAME).get_collection(db_collection_class.COLLECTION_NAME).insert_many(items)
+    return mongo_client
+
+
+def update_ipca(api, api_mongo_client, items: list) -> None:
+    """Correct IPCA registers in place (as 'bulk_import.py --update-existing' does) and update the cache (as its TTL would)."""
+    db_collection = api_mongo_client.get_database(IPCACollection.DATABASE_NAME).get_collection(IPCACollection.COLLECTION_NAME)
+    IndexerImporter(db_collection).import_dataframe(pd.DataFrame(items, columns=IndexerImporter.KEY_COLUMNS + ["value"]), update_existing=True)
+    assert api.indexer_cache.get_indexers().refresh_dataframes_from_db()
+
+
+
+def test_validators_are_sent(client):
+    response = client.get("/final_value_by_indexer", params=PARAMS)
+
+    assert response.status_code == 200
+    assert response.headers["etag"].startswith('"')
+    assert parsedate_to_datetime(response.headers["last-modified"]) == INSERTED_AT
+    assert response.headers["cache-control"].startswith("public, max-age=")
+    assert response.headers["x-data-staleness"] == "0"
+    # Another query of the same data has another ETag
+    assert client.get("/final_value_by_indexer", params=dict(PARAMS, initial_value=2000.0)).headers["etag"] != response.headers["etag"]
+
+
+def test_etag_match(client):
+    etag = client.get("/final_value_by_indexer", params=PARAMS).headers["etag"]
+
+    for if_none_match in [etag, f"W/{etag}", f'"other", {etag}', "*"]:
+        response = client.get("/final_value_by_indexer", params=PARAMS, headers={"If-None-Match": if_none_match})
+        assert response.status_code == 304
+        assert response.content == b"" and response.headers["etag"] == etag
+    assert client.get("/final_value_by_indexer", params=PARAMS, headers={"If-None-Match": '"other"'}).status_code == 200
+    # 'If-None-Match' has precedence over 'If-Modified-Since'
+    headers = {"If-None-Match": '"other"', "If-Modified-Since": format_datetime(datetime.now(timezone.utc), usegmt=True)}
+    assert client.get("/final_value_by_indexer", params=PARAMS, headers=headers).status_code == 200
+
+
+def test_if_modified_since(client):
+    last_modified = client.get("/final_value_by_indexer", params=PARAMS).headers["last-modified"]
+
+    assert client.get("/final_value_by_indexer", params=PARAMS, headers={"If-Modified-Since": last_modified}).status_code == 304
+    earlier = format_datetime(INSERTED_AT - timedelta(seconds=1), usegmt=True)
+    assert client.get("/final_value_by_indexer", params=PARAMS, headers={"If-Modified-Since": earlier}).status_code == 200
+    assert client.get("/final_value_by_indexer", params=PARAMS, headers={"If-Modified-Since": "not a date"}).status_code == 200
+
+
+def test_invalid_reference_has_no_validators(client):
+    response = client.get("/final_value_by_indexer", params=dict(PARAMS, indexer_reference="IGPM"), headers={"If-None-Match": "*"})
+
+    assert response.status_code != 304
+    assert "etag" not in response.headers
+
+
+def test_new_registers_are_not_validated_by_old_headers(api, api_mongo_client, client):
+    response = client.get("/final_value_by_indexer", params=PARAMS)
+    db_collection = api_mongo_client.get_database(IPCACollection.DATABASE_NAME).get_collection(IPCACollection.COLLECTION_NAME)
+    db_collection.insert_many(get_monthly_items(2010, 2010, seed=100))
+    assert api.indexer_cache.get_indexers().refresh_dataframes_from_db()
+
+    for headers in [{"If-None-Match": response.headers["etag"]}, {"If-Modified-Since": response.headers["last-modified"]}]:
+        new_response = client.get("/final_value_by_indexer", params=PARAMS, headers=headers)
+        assert new_response.status_code == 200
+        assert new_response.headers["etag"] != response.headers["etag"]
+
+
+def test_registers_corrected_in_place_are_not_validated_by_old_headers(api, api_mongo_client, client):
+    response = client.get("/final_value_by_indexer", params=PARAMS)
+    # A refresh without changes keeps the validators
+    assert api.indexer_cache.get_indexers().refresh_dataframes_from_db()
+    assert client.get("/final_value_by_indexer", params=PARAMS, headers={"If-None-Match": response.headers["etag"]}).status_code == 304
+
+    update_ipca(api, api_mongo_client, [{"year": 2005, "month": 6, "day": 1, "value": 9.99}])
+    for headers in [{"If-None-Match": response.headers["etag"]}, {"If-Modified-Since": response.headers["last-modified"]}]:
+        new_response = client.get("/final_value_by_indexer", params=PARAMS, headers=headers)
+        assert new_response.status_code == 200
+        assert new_response.headers["etag"] != response.headers["etag"]
+        assert parsedate_to_datetime(new_response.headers["last-modified"]) > INSERTED_AT
+        assert new_response.json() != response.json()
+
+
+def test_export_etag_varies_with_the_representation(client):
+    csv_response = client.get("/series_by_indexer", params=PARAMS, headers={"Accept": "text/csv"})
+    json_response = client.get("/series_by_indexer", params=PARAMS, headers={"Accept": "application/json"})
+
+    assert csv_response.headers["etag"] != json_response.headers["etag"]
+    assert csv_response.headers["vary"] == "accept, accept-encoding"
+    headers = {"Accept": "application/json", "If-None-Match": csv_response.headers["etag"]}
+    assert client.get("/series_by_indexer", params=PARAMS, headers=headers).status_code == 200
+
+
+@pytest.mark.parametrize("if_modified_since, expected", [
+    ("Thu, 02 Jan 2020 00:00:00 GMT", True),
+    ("Thu, 02 Jan 2020 00:00:01 GMT", True),
+    ("Wed, 01 Jan 2020 23:59:59 GMT", False),
+    ("Thu, 02 Jan 2020 00:00:00", False),
+    ("", False),
+])
+def test_is_not_modified_since(if_modified_since, expected):
+    assert ConditionalRequestMiddleware.is_not_modified_since(if_modified_since, INSERTED_AT + timedelta(microseconds=500)) is expected
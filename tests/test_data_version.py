@@ -0,0 +1,144 @@
+"""Tests of the data version of DBCollection (used by the conditional requests) in both query modes."""
+
+import mmap
+import random
+
+from datetime import datetime, timezone
+
+import mongomock
+import numpy as np
+import pandas as pd
+import pytest
+
+from bson import ObjectId
+
+from API.bulk_import import IndexerImporter
+from API.db_collection import DBCollection, CDICollection
+
+
+# Insertion time of the registers of the fixture, so the later writes are always after it (HTTP dates have a precision of seconds)
+INSERTED_AT = datetime(2020, 1, 2, tzinfo=timezone.utc)
+
+
+def get_items(first_year: int, last_year: int, seed: int = 0) -> list:
+    generator = random.Random(seed)
+    return [
+        {"year": year, "month": month, "day": 1, "value": round(generator.uniform(-0.5, 2.0), 4)}
+        for year in range(first_year, last_year + 1)
+        for month in range(1, 13)
+    ]
+
+
+def get_db_collection(mongo_client):
+    return mongo_client.get_database(CDICollection.DATABASE_NAME).get_collection(CDICollection.COLLECTION_NAME)
+
+
+def import_items(mongo_client, items: list, update_existing: bool = True) -> dict:
+    """Import the registers as 'bulk_import.py' does."""
+    return IndexerImporter(get_db_collection(mongo_client)).import_dataframe(pd.DataFrame(items, columns=IndexerImporter.KEY_COLUMNS + ["value"]), update_existing)
+
+
+def is_memory_mapped(array: np.ndarray) -> bool:
+    while isinstance(array, np.ndarray):
+        array = array.base
+    return isinstance(array, mmap.mmap)
+
+
+@pytest.fixture
+def mongo_client():
+    mongo_client = mongomock.MongoClient()
+    items = get_items(2000, 2009)
+    for position, item in enumerate(items):
+        item["_id"] = ObjectId(f"{int(INSERTED_AT.timestamp()):08x}{position:016x}")
+    get_db_collection(mongo_client).insert_many(items)
+    return mongo_client
+
+
+def get_counted_method(method, name: str, queries: list):
+    def counted_method(self, *args, **kwargs):
+        queries.append(name)
+        return method(self, *args, **kwargs)
+    return counted_method
+
+
+@pytest.fixture
+def queries(monkeypatch) -> list:
+    """Names of the mongomock methods called."""
+    queries = []
+    for name in ["find", "find_one", "estimated_document_count", "aggregate"]:
+        monkeypatch.setattr(mongomock.collection.Collection, name, get_counted_method(getattr(mongomock.collection.Collection, name), name, queries))
+    return queries
+
+
+def test_database_mode_version_is_not_queried_per_request(mongo_client, queries):
+    collection = CDICollection(mongo_client, query_mode=DBCollection.QUERY_MODE_DATABASE)
+    version, last_modified = collection.get_data_version(), collection.get_last_modified()
+    queries.clear()
+
+    for _ in range(3):
+        assert collection.get_data_version() == version
+        assert collection.get_last_modified() == last_modified
+    assert queries == []
+
+
+def test_database_mode_version_is_updated_with_the_refresh(mongo_client):
+    collection = CDICollection(mongo_client, query_mode=DBCollection.QUERY_MODE_DATABASE)
+    version = collection.get_data_version()
+    mongo_client.get_database(CDICollection.DATABASE_NAME).get_collection(CDICollection.COLLECTION_NAME).insert_many(get_items(2010, 2010, seed=1))
+
+    assert collection.get_data_version() == version
+    assert collection.refresh_dataframe_from_db()
+    assert collection.get_data_version() != version
+
+
+def test_database_mode_version_matches_memory_mode_once_loaded(mongo_client, tmp_path):
+    memory_collection = CDICollection(mongo_client, snapshot_dir=str(tmp_path))
+    collection = CDICollection(mongo_client, snapshot_dir=str(tmp_path), query_mode=DBCollection.QUERY_MODE_DATABASE)
+    collection.get_data_version()
+
+    # e.g. loaded (from the snapshot) by the table export
+    collection.get_series()
+    assert collection.get_data_version() == memory_collection.get_data_version()
+    assert collection.get_last_modified() == memory_collection.get_last_modified()
+
+
+@pytest.mark.parametrize("query_mode", DBCollection.QUERY_MODES)
+def test_update_in_place_changes_version(mongo_client, query_mode):
+    collection = CDICollection(mongo_client, query_mode=query_mode)
+    version, last_modified = collection.get_data_version(), collection.get_last_modified()
+    assert last_modified == INSERTED_AT
+
+    totals = import_items(mongo_client, [{"year": 2005, "month": 6, "day": 1, "value": 9.99}, {"year": 2005, "month": 7, "day": 1, "value": 9.98}])
+    assert totals == {"inserted": 0, "updated": 2, "unchanged": 0}
+    assert collection.refresh_dataframe_from_db()
+
+    assert collection.get_data_version() != version
+    assert collection.get_last_modified() > last_modified
+    if query_mode == DBCollection.QUERY_MODE_MEMORY:
+        # The registers corrected in place are reloaded, not only the new ones
+        assert 9.99 in collection.get_series().get_rates() and 9.98 in collection.get_series().get_rates()
+
+
+@pytest.mark.parametrize("query_mode", DBCollection.QUERY_MODES)
+def test_same_values_do_not_change_version(mongo_client, query_mode):
+    collection = CDICollection(mongo_client, query_mode=query_mode)
+    version, last_modified = collection.get_data_version(), collection.get_last_modified()
+
+    # The registers of 2005, as inserted
+    assert import_items(mongo_client, get_items(2000, 2009)[60:72]) == {"inserted": 0, "updated": 0, "unchanged": 12}
+    assert collection.refresh_dataframe_from_db()
+    assert collection.get_data_version() == version
+    assert collection.get_last_modified() == last_modified
+
+
+def test_update_in_place_is_kept_by_the_snapshot(mongo_client, tmp_path):
+    collection = CDICollection(mongo_client, snapshot_dir=str(tmp_path))
+    import_items(mongo_client, [{"year": 2005, "month": 6, "day": 1, "value": 9.99}])
+    assert collection.refresh_dataframe_from_db()
+
+    # Another process maps the corrected snapshot and does not load the whole collection again
+    other_collection = CDICollection(mongo_client, snapshot_dir=str(tmp_path))
+    assert is_memory_mapped(other_collection.get_series().get_rates())
+    assert other_collection.get_series().get_updated_at() == collection.get_series().get_updated_at()
+    assert other_collection.get_data_version() == collection.get_data_version()
+    assert other_collection.get_last_modified() == collection.get_last_modified()
@@ -0,0 +1,99 @@
+"""Tests of the '/final_values_by_indexer' batch route against the '/final_value_by_indexer' route, scenario by scenario."""
+
+import pytest
+
+
+SCENARIO = {
+    "initial_value": 1000.0,
+    "initial_date": "2001-03-01T00:00:00",
+    "final_date": "2008-07-01T00:00:00",
+    "indexer_reference": "CDI",
+    "indexer_type": 2,
+    "indexer_add_rate": 110.0,
+}
+
+
+def get_scenario(**changes) -> dict:
+    return dict(SCENARIO, **changes)
+
+
+
+def test_mixed_indexers_match_single_route(client):
+    scenarios = [
+        get_scenario(),
+        get_scenario(indexer_reference="IPCA", indexer_type=1, indexer_add_rate=6.5),
+        get_scenario(indexer_reference="SELIC", indexer_type=0, initial_date="2004-01-01T00:00:00"),
+        get_scenario(indexer_reference="IPCA", initial_value=0.0),
+        get_scenario(indexer_reference="CDI", initial_value=2500.0, final_date="2009-12-01T00:00:00"),
+    ]
+    response = client.post("/final_values_by_indexer", json=scenarios)
+
+    assert response.status_code == 200
+    results = response.json()
+    assert len(results) == len(scenarios)
+    for scenario, result in zip(scenarios, results):
+        final_value = client.get("/final_value_by_indexer", params=scenario).json()
+        assert result["final_value"] == pytest.approx(final_value, rel=1e-12)
+        assert result["interest_value"] == pytest.approx(final_value - scenario["initial_value"], rel=1e-12, abs=1e-9)
+        if scenario["initial_value"]:
+            assert result["interest_rate"] == pytest.approx(result["interest_value"] / scenario["initial_value"], rel=1e-12)
+        else:
+            assert result["interest_rate"] is None
+
+
+def test_period_without_rates_is_null(client):
+    response = client.post("/final_values_by_indexer", json=[get_scenario(initial_date="1990-01-01T00:00:00", final_date="1990-12-01T00:00:00")])
+
+    assert response.status_code == 200
+    assert response.json() == [{"final_value": None, "interest_value": None, "interest_rate": None}]
+
+
+def test_empty_batch(client):
+    response = client.post("/final_values_by_indexer", json=[])
+
+    assert response.status_code == 200
+    assert response.json() == []
+
+
+@pytest.mark.parametrize("body, detail", [
+    (b"[{", "JSON"),
+    (b'{"initial_value": 1000}', "lista"),
+    (b"[1, 2]", "lista"),
+])
+def test_invalid_body(client, body, detail):
+    response = client.post("/final_values_by_indexer", data=body, headers={"Content-Type": "application/json"})
+
+    assert response.status_code == 422
+    assert detail in response.json()["detail"]
+
+
+def test_missing_fields(client):
+    scenario = get_scenario()
+    del scenario["final_date"]
+    response = client.post("/final_values_by_indexer", json=[get_scenario(), scenario, get_scenario(indexer_add_rate=None)])
+
+    assert response.status_code == 422
+    assert "final_date" in response.json()["detail"] and "indexer_add_rate" in response.json()["detail"]
+
+
+@pytest.mark.parametrize("indexer_reference", [["IPCA"], {"title": "CDI"}, 3])
+def test_non_string_references(client, indexer_reference):
+    response = client.post("/final_values_by_indexer", json=[get_scenario(), get_scenario(indexer_reference=indexer_reference), get_scenario()])
+
+    assert response.status_code == 422
+    assert response.json()["detail"].endswith("[1].")
+
+
+def test_unknown_references(client):
+    scenarios = [get_scenario(), get_scenario(indexer_reference="IGPM"), get_scenario(indexer_reference="IPCA"), get_scenario(indexer_reference="cdi")]
+    response = client.post("/final_values_by_indexer", json=scenarios)
+
+    assert response.status_code == 422
+    assert response.json()["detail"].endswith("[1, 3].")
+
+
+@pytest.mark.parametrize("changes", [{"indexer_type": 3}, {"initial_date": "not a date"}, {"initial_value": "mil"}])
+def test_invalid_values(client, changes):
+    response = client.post("/final_values_by_indexer", json=[get_scenario(), get_scenario(**changes)])
+
+    assert response.status_code == 422
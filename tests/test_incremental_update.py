@@ -0,0 +1,95 @@
+"""Tests of the incremental updates of DBCollection against a full reload of the collection."""
+
+import random
+
+from datetime import datetime
+
+import mongomock
+import numpy as np
+import pandas as pd
+import pytest
+
+from API.db_collection import CDICollection
+from API.interest_rate import InterestCalculation as interest
+
+
+# Collection of the CDI registers
+DATABASE_NAME = "economic_indexers"
+COLLECTION_NAME = "cdi"
+
+
+def get_items(first_month: tuple, last_month: tuple, seed: int = 0) -> list:
+    """Return one register per month, from the first (year, month) to the last one (both included)."""
+    generator = random.Random(seed)
+    return [
+        {"year": year, "month": month, "day": 1, "value": round(generator.uniform(-0.5, 2.0), 4)}
+        for year in range(first_month[0], last_month[0] + 1)
+        for month in range(1, 13)
+        if first_month <= (year, month) <= last_month
+    ]
+
+
+def get_db_collection(mongo_client):
+    return mongo_client.get_database(DATABASE_NAME).get_collection(COLLECTION_NAME)
+
+
+def assert_same_series(collection: CDICollection, expected: CDICollection) -> None:
+    series, expected_series = collection.get_series(), expected.get_series()
+    assert len(series) == len(expected_series)
+    assert series.get_last_id() == expected_series.get_last_id()
+    np.testing.assert_array_equal(series.get_ordinals(), expected_series.get_ordinals())
+    np.testing.assert_array_equal(series.get_rates(), expected_series.get_rates())
+    np.testing.assert_allclose(series.get_factors(), expected_series.get_factors(), rtol=1e-13)
+    np.testing.assert_allclose(series.get_log_factors(), expected_series.get_log_factors(), rtol=1e-13)
+
+
+def assert_same_dataframes(collection: CDICollection, expected: CDICollection) -> None:
+    pd.testing.assert_frame_equal(collection.get_stacked_dataframe(), expected.get_stacked_dataframe())
+    pd.testing.assert_frame_equal(collection.get_transposed_stacked_dataframe(), expected.get_transposed_stacked_dataframe())
+    np.testing.assert_allclose(collection.get_prefix_log_factors(), expected.get_prefix_log_factors(), rtol=1e-13)
+
+
+
+@pytest.mark.parametrize("new_items", [
+    # New months of the current year and of a new year
+    get_items((2009, 7), (2010, 3), seed=1),
+    # Registers older than the last one (a backfill)
+    get_items((2009, 7), (2009, 9), seed=1) + get_items((1995, 1), (1996, 12), seed=2),
+])
+def test_incremental_update_matches_full_load(new_items):
+    mongo_client = mongomock.MongoClient()
+    get_db_collection(mongo_client).insert_many(get_items((2000, 1), (2009, 6)))
+    collection = CDICollection(mongo_client)
+    get_db_collection(mongo_client).insert_many(new_items)
+
+    collection.update_dataframe_from_db(incremental=True)
+    expected = CDICollection(mongo_client)
+    assert_same_series(collection, expected)
+    assert_same_dataframes(collection, expected)
+    assert collection.get_adjusted_value_from_values(1000.0, datetime(2008, 1, 1), datetime(2010, 12, 31), 6.5, interest.PREFIXED_RATE) == pytest.approx(
+        expected.get_adjusted_value_from_values(1000.0, datetime(2008, 1, 1), datetime(2010, 12, 31), 6.5, interest.PREFIXED_RATE), rel=1e-12,
+    )
+
+
+def test_incremental_update_without_new_registers():
+    mongo_client = mongomock.MongoClient()
+    get_db_collection(mongo_client).insert_many(get_items((2000, 1), (2009, 6)))
+    collection = CDICollection(mongo_client)
+
+    collection.update_dataframe_from_db(incremental=True)
+    assert_same_dataframes(collection, CDICollection(mongo_client))
+
+
+def test_refresh_matches_full_load():
+    mongo_client = mongomock.MongoClient()
+    get_db_collection(mongo_client).insert_many(get_items((2000, 1), (2009, 6)))
+    collection = CDICollection(mongo_client)
+    version = collection.get_data_version()
+
+    assert collection.refresh_dataframe_from_db()
+    assert collection.get_data_version() == version
+
+    get_db_collection(mongo_client).insert_many(get_items((2009, 7), (2010, 3), seed=1))
+    assert collection.refresh_dataframe_from_db()
+    assert collection.get_data_version() != version
+    assert_same_series(collection, CDICollection(mongo_client))
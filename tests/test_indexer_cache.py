@@ -0,0 +1,154 @@
+"""Tests of the stale-while-revalidate updates of the IndexerCache and DBCollection, and of the 'X-Data-Staleness' header."""
+
+import threading
+import time
+
+import mongomock
+import pymongo
+import pytest
+
+from API.db_collection import EconomicIndexers, IPCACollection
+from API.indexer_cache import IndexerCache
+
+from conftest import get_monthly_items
+
+
+PARAMS = {
+    "initial_value": 1000.0,
+    "initial_date": "2001-03-01T00:00:00",
+    "final_date": "2008-07-01T00:00:00",
+    "indexer_reference": "IPCA",
+    "indexer_type": 1,
+    "indexer_add_rate": 6.5,
+}
+
+
+def insert_new_ipca_registers(mongo_client) -> None:
+    mongo_client.get_database(IPCACollection.DATABASE_NAME).get_collection(IPCACollection.COLLECTION_NAME).insert_many(get_monthly_items(2010, 2010, seed=100))
+
+
+@pytest.fixture
+def blocked_refresh(monkeypatch):
+    """Make the refreshes of the EconomicIndexers wait for 'release', counting them."""
+    refresh = EconomicIndexers.refresh_dataframes_from_db
+    state = {"calls": 0, "started": threading.Event(), "release": threading.Event()}
+
+    def blocked_refresh_dataframes_from_db(self, *args, **kwargs):
+        state["calls"] += 1
+        state["started"].set()
+        assert state["release"].wait(10)
+        return refresh(self, *args, **kwargs)
+
+    monkeypatch.setattr(EconomicIndexers, "refresh_dataframes_from_db", blocked_refresh_dataframes_from_db)
+    return state
+
+
+@pytest.fixture
+def failing_database(monkeypatch):
+    """Return a function that makes every query of mongomock fail, as an unavailable server would."""
+    def fail() -> None:
+        def unavailable(*args, **kwargs):
+            raise pymongo.errors.ServerSelectionTimeoutError("localhost:27017: [Errno 111] Connection refused")
+        for name in ["find", "find_one", "aggregate", "estimated_document_count", "create_index"]:
+            monkeypatch.setattr(mongomock.collection.Collection, name, unavailable)
+    return fail
+
+
+
+def test_concurrent_expired_accesses_refresh_once(api_mongo_client, blocked_refresh):
+    cache = IndexerCache(api_mongo_client, ttl_seconds=0.0)
+    indexers = cache.get_indexers()
+    indexers.load_db_collections()
+    insert_new_ipca_registers(api_mongo_client)
+
+    refreshing_thread = threading.Thread(target=cache.get_indexers)
+    refreshing_thread.start()
+    assert blocked_refresh["started"].wait(10)
+
+    # While one thread refreshes, the others get the current (stale) snapshot at once, without waiting
+    results = []
+    threads = [threading.Thread(target=lambda: results.append((cache.get_indexers(), cache.get_indexers_if_fresh()))) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(10)
+    assert results == [(indexers, indexers)] * 8
+    assert blocked_refresh["calls"] == 1
+    assert len(indexers.get_db_collection_by_indexer("IPCA").get_series()) == 120
+
+    blocked_refresh["release"].set()
+    refreshing_thread.join(10)
+    assert blocked_refresh["calls"] == 1
+    stats = cache.get_stats()
+    assert stats["updates_total"] == 1 and stats["stale_hits_total"] == 16
+    assert len(indexers.get_db_collection_by_indexer("IPCA").get_series()) == 132
+
+
+def test_expired_snapshot_is_not_fresh(api_mongo_client):
+    cache = IndexerCache(api_mongo_client, ttl_seconds=0.0)
+    assert cache.get_indexers_if_fresh() is None
+
+    cache.get_indexers()
+    # Expired and nobody updating it, so the caller must update it (see 'get_indexers')
+    assert cache.get_indexers_if_fresh() is None
+
+
+def test_concurrent_collection_refreshes(api_mongo_client, monkeypatch):
+    collection = IPCACollection(api_mongo_client)
+    insert_new_ipca_registers(api_mongo_client)
+    started, release = threading.Event(), threading.Event()
+    find = mongomock.collection.Collection.find
+
+    def blocked_find(self, *args, **kwargs):
+        started.set()
+        assert release.wait(10)
+        return find(self, *args, **kwargs)
+
+    monkeypatch.setattr(mongomock.collection.Collection, "find", blocked_find)
+    refreshing_thread = threading.Thread(target=collection.refresh_dataframe_from_db)
+    refreshing_thread.start()
+    assert started.wait(10)
+
+    # Returns at once, keeping the current series
+    series = collection.get_series()
+    assert collection.refresh_dataframe_from_db()
+    assert collection.get_series() is series
+
+    release.set()
+    refreshing_thread.join(10)
+    assert len(collection.get_series()) == len(series) + 12
+
+
+def test_failed_refresh_keeps_the_series(api_mongo_client, failing_database, caplog):
+    cache = IndexerCache(api_mongo_client, ttl_seconds=0.0, retry_seconds=60.0)
+    indexers = cache.get_indexers()
+    collection = indexers.get_db_collection_by_indexer("IPCA")
+    series, version = collection.get_series(), collection.get_data_version()
+    failing_database()
+
+    assert cache.get_indexers() is indexers
+    assert collection.get_series() is series and collection.get_data_version() == version
+    assert "serving data synchronized" in caplog.text
+    assert cache.get_stats()["failed_updates_total"] == 1
+
+    # Not retried on every access, but after 'retry_seconds'
+    assert cache.get_indexers() is indexers
+    assert cache.get_stats()["failed_updates_total"] == 1 and cache.get_stats()["hits_total"] == 1
+
+
+def test_staleness_header(api, api_mongo_client, client, failing_database, monkeypatch):
+    monkeypatch.setattr(api, "indexer_cache", IndexerCache(api_mongo_client, ttl_seconds=0.0, retry_seconds=0.0))
+    response = client.get("/final_value_by_indexer", params=PARAMS)
+    assert response.headers["x-data-staleness"] == "0"
+
+    # Two minutes later, with the database unavailable: the same data is served, with its real age
+    failing_database()
+    now = time.time()
+    monkeypatch.setattr(time, "time", lambda: now + 120.0)
+    stale_response = client.get("/final_value_by_indexer", params=PARAMS)
+
+    assert stale_response.status_code == 200
+    assert stale_response.json() == response.json()
+    assert stale_response.headers["x-data-staleness"] == "120"
+    assert stale_response.headers["etag"] == response.headers["etag"]
+    assert api.indexer_cache.get_stats()["failed_updates_total"] >= 1
@@ -0,0 +1,182 @@
+"""Tests of the lightweight data path of the admin app (IndexerRegisters): the last registers and the insertion of a new month."""
+
+from datetime import date
+
+import mongomock
+import pymongo
+import pytest
+
+from mongomock import aggregate
+
+from API.db_collection import DBCollection, EconomicIndexers
+from API.indexer_registers import IndexerRegisters
+
+from conftest import get_monthly_items
+
+
+NEW_DATE = date(2010, 1, 1)
+
+
+def get_db_collection(mongo_client, db_collection_class):
+    return mongo_client.get_database(db_collection_class.DATABASE_NAME).get_collection(db_collection_class.COLLECTION_NAME)
+
+
+def get_rates() -> dict:
+    return {db_collection_class.TITLE: 0.1 * position for position, db_collection_class in enumerate(EconomicIndexers.DB_COLLECTION_CLASSES)}
+
+
+def get_new_items(mongo_client) -> dict:
+    """Registers of NEW_DATE in each collection, by title."""
+    key = {DBCollection.DB_YEAR_COLUMN: NEW_DATE.year, DBCollection.DB_MONTH_COLUMN: NEW_DATE.month, DBCollection.DB_DAY_COLUMN: NEW_DATE.day}
+    return {
+        db_collection_class.TITLE: list(get_db_collection(mongo_client, db_collection_class).find(key, {DBCollection.DB_ID_COLUMN: 0}))
+        for db_collection_class in EconomicIndexers.DB_COLLECTION_CLASSES
+    }
+
+
+def aggregate_with_union(self, pipeline, session=None, **kwargs):
+    """'$unionWith' (missing in mongomock): the sub-pipelines run on their collections and their results are appended."""
+    stages = [stage for stage in pipeline if "$unionWith" not in stage]
+    results = list(aggregate.process_pipeline(list(self.find()), self.database, stages, session))
+    for stage in pipeline:
+        if "$unionWith" in stage:
+            union = stage["$unionWith"]
+            union_collection = self.database.get_collection(union["coll"])
+            results.extend(aggregate.process_pipeline(list(union_collection.find()), self.database, union["pipeline"], session))
+    return iter(results)
+
+
+class FakeSession:
+    """Session whose transaction deletes the inserted registers when the callback fails (mongomock has no sessions)."""
+
+    def __init__(self) -> None:
+        self.inserted = []
+        self.transactions = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args) -> None:
+        pass
+
+    def with_transaction(self, callback):
+        self.transactions += 1
+        try:
+            return callback(self)
+        except Exception:
+            for collection, inserted_id in self.inserted:
+                collection.delete_one({DBCollection.DB_ID_COLUMN: inserted_id})
+            raise
+
+
+@pytest.fixture
+def mongo_client():
+    mongo_client = mongomock.MongoClient()
+    for seed, db_collection_class in enumerate(EconomicIndexers.DB_COLLECTION_CLASSES[:-1]):
+        get_db_collection(mongo_client, db_collection_class).insert_many(get_monthly_items(2000, 2009 - seed, seed))
+    return mongo_client
+
+
+@pytest.fixture
+def session(monkeypatch, mongo_client) -> FakeSession:
+    session = FakeSession()
+    insert_one = mongomock.collection.Collection.insert_one
+
+    def insert_one_in_session(self, document, *args, session=None, **kwargs):
+        result = insert_one(self, document, *args, **kwargs)
+        if session is not None:
+            session.inserted.append((self, result.inserted_id))
+        return result
+
+    monkeypatch.setattr(mongomock.collection.Collection, "insert_one", insert_one_in_session)
+    monkeypatch.setattr(mongo_client, "start_session", lambda: session, raising=False)
+    return session
+
+
+def fail_insertion_of(monkeypatch, collection_name: str, error: Exception) -> None:
+    insert_one = mongomock.collection.Collection.insert_one
+
+    def failing_insert_one(self, document, *args, **kwargs):
+        if self.name == collection_name:
+            raise error
+        return insert_one(self, document, *args, **kwargs)
+
+    monkeypatch.setattr(mongomock.collection.Collection, "insert_one", failing_insert_one)
+
+
+
+def test_last_items_by_collection(mongo_client):
+    last_items = IndexerRegisters(mongo_client).get_last_items()
+
+    # The last collection has no registers
+    assert list(last_items) == [db_collection_class.TITLE for db_collection_class in EconomicIndexers.DB_COLLECTION_CLASSES[:-1]]
+    for seed, (title, item) in enumerate(last_items.items()):
+        assert (item["year"], item["month"], item["value"]) == (2009 - seed, 12, get_monthly_items(2000, 2009 - seed, seed)[-1]["value"])
+
+
+def test_last_items_by_aggregation(mongo_client, monkeypatch):
+    expected = IndexerRegisters(mongo_client).get_last_items()
+    calls = []
+    monkeypatch.setattr(mongomock.collection.Collection, "aggregate", lambda self, pipeline, **kwargs: calls.append(pipeline) or aggregate_with_union(self, pipeline, **kwargs))
+    monkeypatch.setattr(mongomock.collection.Collection, "find_one", lambda *args, **kwargs: pytest.fail("queried one by one"))
+
+    assert IndexerRegisters(mongo_client).get_last_items() == expected
+    # A single round trip, with one '$unionWith' per other collection
+    [pipeline] = calls
+    assert sum("$unionWith" in stage for stage in pipeline) == len(EconomicIndexers.DB_COLLECTION_CLASSES) - 1
+
+
+def test_last_items_fallback_on_operation_failure(mongo_client, monkeypatch):
+    expected = IndexerRegisters(mongo_client).get_last_items()
+
+    def unsupported_aggregate(self, pipeline, **kwargs):
+        raise pymongo.errors.OperationFailure("Unrecognized pipeline stage name: '$unionWith'", code=40324)
+
+    monkeypatch.setattr(mongomock.collection.Collection, "aggregate", unsupported_aggregate)
+    assert IndexerRegisters(mongo_client).get_last_items() == expected
+
+
+def test_insert_items_in_transaction(mongo_client, session):
+    IndexerRegisters(mongo_client).insert_items(NEW_DATE, get_rates())
+
+    assert session.transactions == 1 and len(session.inserted) == len(EconomicIndexers.DB_COLLECTION_CLASSES)
+    for title, items in get_new_items(mongo_client).items():
+        [item] = items
+        assert item[DBCollection.DB_RATE_COLUMN] == get_rates()[title]
+        assert item[DBCollection.DB_UPDATED_AT_COLUMN] is not None
+
+
+def test_failed_transaction_inserts_nothing(mongo_client, session, monkeypatch):
+    error = pymongo.errors.OperationFailure("WriteConflict", code=112)
+    fail_insertion_of(monkeypatch, EconomicIndexers.DB_COLLECTION_CLASSES[2].COLLECTION_NAME, error)
+
+    with pytest.raises(pymongo.errors.OperationFailure):
+        IndexerRegisters(mongo_client).insert_items(NEW_DATE, get_rates())
+    # Not retried without the transaction, since the server supports them
+    assert session.transactions == 1
+    assert all(items == [] for items in get_new_items(mongo_client).values())
+
+
+@pytest.mark.parametrize("error", [
+    NotImplementedError("Mongomock does not support sessions yet"),
+    pymongo.errors.OperationFailure("Transaction numbers are only allowed on a replica set member or mongos", code=IndexerRegisters.ILLEGAL_OPERATION_CODE),
+    pymongo.errors.ConfigurationError("Sessions are not supported by this MongoDB deployment"),
+])
+def test_insert_items_without_transactions(mongo_client, monkeypatch, error):
+    def start_session():
+        raise error
+
+    monkeypatch.setattr(mongo_client, "start_session", start_session, raising=False)
+    IndexerRegisters(mongo_client).insert_items(NEW_DATE, get_rates())
+
+    assert {title: [item[DBCollection.DB_RATE_COLUMN] for item in items] for title, items in get_new_items(mongo_client).items()} == {title: [rate] for title, rate in get_rates().items()}
+
+
+def test_compensation_deletes_the_inserted_items(mongo_client, monkeypatch):
+    fail_insertion_of(monkeypatch, EconomicIndexers.DB_COLLECTION_CLASSES[3].COLLECTION_NAME, pymongo.errors.AutoReconnect("connection closed"))
+
+    with pytest.raises(pymongo.errors.AutoReconnect):
+        IndexerRegisters(mongo_client).insert_items(NEW_DATE, get_rates())
+    assert all(items == [] for items in get_new_items(mongo_client).values())
+    # The registers already there are kept
+    assert get_db_collection(mongo_client, EconomicIndexers.DB_COLLECTION_CLASSES[0]).count_documents({}) == 120
@@ -0,0 +1,146 @@
+"""Tests of the local snapshots of the series (IndexerSnapshot) and of the DBCollection updates from them."""
+
+import os
+import json
+import mmap
+import random
+import threading
+
+import mongomock
+import numpy as np
+import pymongo
+import pytest
+
+from API.db_collection import CDICollection
+from API.indexer_series import IndexerSeries
+from API.indexer_snapshot import IndexerSnapshot
+
+
+ARRAY_GETTERS = ["get_ordinals", "get_rates", "get_factors", "get_log_factors"]
+
+
+def get_items(first_year: int, last_year: int, seed: int = 0) -> list:
+    generator = random.Random(seed)
+    return [
+        {"year": year, "month": month, "day": 1, "value": round(generator.uniform(-0.5, 2.0), 4)}
+        for year in range(first_year, last_year + 1)
+        for month in range(1, 13)
+    ]
+
+
+def get_mongo_client(items: list):
+    mongo_client = mongomock.MongoClient()
+    get_db_collection(mongo_client).insert_many([dict(item) for item in items])
+    return mongo_client
+
+
+def get_db_collection(mongo_client):
+    return mongo_client.get_database(CDICollection.DATABASE_NAME).get_collection(CDICollection.COLLECTION_NAME)
+
+
+def is_memory_mapped(array: np.ndarray) -> bool:
+    while isinstance(array, np.ndarray):
+        array = array.base
+    return isinstance(array, mmap.mmap)
+
+
+def assert_same_series(series: IndexerSeries, expected: IndexerSeries) -> None:
+    assert len(series) == len(expected)
+    assert series.get_last_id() == expected.get_last_id()
+    for getter in ARRAY_GETTERS:
+        np.testing.assert_allclose(getattr(series, getter)(), getattr(expected, getter)(), rtol=1e-13)
+
+
+
+def test_snapshot_round_trip(tmp_path):
+    series = CDICollection(get_mongo_client(get_items(2000, 2009))).get_series()
+    version = IndexerSnapshot.save(str(tmp_path), series, {"title": "CDI"})
+
+    assert IndexerSnapshot.get_current_version(str(tmp_path)) == version == series.get_version()
+    arrays, meta = IndexerSnapshot.load(str(tmp_path))
+    assert meta["title"] == "CDI" and meta["length"] == len(series) and meta["last_id"] == str(series.get_last_id())
+    for name, getter in zip(IndexerSnapshot.ARRAYS, ARRAY_GETTERS):
+        assert is_memory_mapped(arrays[name]) and not arrays[name].flags.writeable
+        np.testing.assert_array_equal(arrays[name], getattr(series, getter)())
+
+
+def test_snapshot_keeps_only_the_current_version(tmp_path):
+    mongo_client = get_mongo_client(get_items(2000, 2009))
+    IndexerSnapshot.save(str(tmp_path), CDICollection(mongo_client).get_series())
+    get_db_collection(mongo_client).insert_many(get_items(2010, 2010, seed=1))
+    version = IndexerSnapshot.save(str(tmp_path), CDICollection(mongo_client).get_series())
+
+    assert [name for name in os.listdir(tmp_path) if os.path.isdir(tmp_path / name)] == [version]
+    assert len(IndexerSnapshot.load(str(tmp_path))[0]["rates"]) == 11 * 12
+
+
+@pytest.mark.parametrize("changes", [{"format_version": IndexerSnapshot.FORMAT_VERSION + 1}, {"length": 1}])
+def test_invalid_snapshot_is_not_loaded(tmp_path, changes):
+    version = IndexerSnapshot.save(str(tmp_path), CDICollection(get_mongo_client(get_items(2000, 2009))).get_series())
+    meta_path = tmp_path / version / IndexerSnapshot.META_FILE
+    meta = json.loads(meta_path.read_text(encoding="utf-8"))
+    meta_path.write_text(json.dumps(dict(meta, **changes)), encoding="utf-8")
+
+    assert IndexerSnapshot.load(str(tmp_path)) is None
+
+
+def test_missing_snapshot_is_not_loaded(tmp_path):
+    assert IndexerSnapshot.load(str(tmp_path / "missing")) is None
+    (tmp_path / IndexerSnapshot.CURRENT_FILE).write_text("missing-version", encoding="utf-8")
+    assert IndexerSnapshot.load(str(tmp_path)) is None
+
+
+def test_lock_is_exclusive(tmp_path):
+    acquired = []
+
+    def try_lock():
+        with IndexerSnapshot.lock(str(tmp_path), blocking=False) as locked:
+            acquired.append(locked)
+
+    with IndexerSnapshot.lock(str(tmp_path)) as locked:
+        assert locked
+        # Another holder (e.g. another process) does not get the lock while it is held
+        thread = threading.Thread(target=try_lock)
+        thread.start()
+        thread.join()
+    assert acquired == [False]
+    with IndexerSnapshot.lock(str(tmp_path), blocking=False) as locked:
+        assert locked
+
+
+
+def test_collection_starts_from_snapshot_and_catches_up(tmp_path):
+    mongo_client = get_mongo_client(get_items(2000, 2009))
+    CDICollection(mongo_client, snapshot_dir=str(tmp_path))
+    get_db_collection(mongo_client).insert_many(get_items(2010, 2010, seed=1))
+
+    collection = CDICollection(mongo_client, snapshot_dir=str(tmp_path))
+    assert_same_series(collection.get_series(), CDICollection(mongo_client).get_series())
+    # The new version was saved and is the one mapped
+    assert IndexerSnapshot.get_current_version(collection.get_snapshot_directory()) == collection.get_series().get_version()
+    assert is_memory_mapped(collection.get_series().get_rates())
+
+
+def test_collection_uses_snapshot_when_database_is_unavailable(tmp_path, monkeypatch):
+    mongo_client = get_mongo_client(get_items(2000, 2009))
+    expected = CDICollection(mongo_client, snapshot_dir=str(tmp_path)).get_series()
+
+    def find(*args, **kwargs):
+        raise pymongo.errors.ServerSelectionTimeoutError("unavailable")
+
+    monkeypatch.setattr(mongomock.collection.Collection, "find", find)
+    series = CDICollection(mongo_client, snapshot_dir=str(tmp_path)).get_series()
+    assert_same_series(series, expected)
+    assert is_memory_mapped(series.get_rates())
+
+
+def test_collection_loads_snapshot_saved_by_another_process(tmp_path):
+    mongo_client = get_mongo_client(get_items(2000, 2009))
+    follower = CDICollection(mongo_client, snapshot_dir=str(tmp_path))
+    leader = CDICollection(mongo_client, snapshot_dir=str(tmp_path))
+    get_db_collection(mongo_client).insert_many(get_items(2010, 2010, seed=1))
+
+    assert leader.refresh_dataframe_from_db()
+    assert follower.update_dataframe_from_snapshot()
+    assert_same_series(follower.get_series(), leader.get_series())
+    assert not follower.update_dataframe_from_snapshot()
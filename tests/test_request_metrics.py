@@ -0,0 +1,116 @@
+"""Tests of the request metrics (MetricsMiddleware and MongoCommandListener) exposed by the '/metrics' route."""
+
+import re
+
+from datetime import timedelta
+
+import mongomock
+import pytest
+
+from pymongo import monitoring
+
+from API.request_metrics import RequestMetrics, MongoCommandListener
+
+
+# Sample line of the text exposition format: name{labels} value
+SAMPLE_PATTERN = re.compile(r'^([a-zA-Z_:][a-zA-Z0-9_:]*)(\{(?:[a-zA-Z_][a-zA-Z0-9_]*="(?:[^"\\]|\\.)*",?)*\})? (-?[0-9.e+-]+|\+Inf|NaN)$')
+
+PARAMS = {
+    "initial_value": 1000.0,
+    "initial_date": "2001-03-01T00:00:00",
+    "final_date": "2008-07-01T00:00:00",
+    "indexer_reference": "IPCA",
+    "indexer_type": 1,
+    "indexer_add_rate": 6.5,
+}
+
+
+def get_samples(text: str) -> dict:
+    """Parse the metrics, checking that every sample follows the text format and is typed by a '# TYPE' line before it."""
+    samples = {}
+    types = {}
+    for line in text.splitlines():
+        if line.startswith("# TYPE "):
+            _, _, name, metric_type = line.split(" ")
+            types[name] = metric_type
+            continue
+        if not line or line.startswith("# HELP "):
+            continue
+        match = SAMPLE_PATTERN.match(line)
+        assert match, f"Invalid sample: {line!r}"
+        name = match.group(1)
+        family = re.sub(r"_(bucket|sum|count)$", "", name) if types.get(re.sub(r"_(bucket|sum|count)$", "", name)) == "histogram" else name
+        assert family in types, f"Sample without '# TYPE': {line!r}"
+        samples[name + (match.group(2) or "")] = float(match.group(3))
+    return samples
+
+
+def get_command_event(command_name: str, documents: list) -> monitoring.CommandSucceededEvent:
+    return monitoring.CommandSucceededEvent(timedelta(milliseconds=2), {"cursor": {"firstBatch": documents}, "ok": 1}, command_name, 1, ("localhost", 27017), 1)
+
+
+@pytest.fixture
+def listener(api, monkeypatch):
+    """Report the 'find' commands of mongomock to the metrics of the API, as the pymongo monitoring does."""
+    listener = MongoCommandListener(api.request_metrics)
+    find = mongomock.collection.Collection.find
+
+    def reported_find(self, *args, **kwargs):
+        listener.succeeded(get_command_event("find", list(find(self, *args, **kwargs))))
+        return find(self, *args, **kwargs)
+
+    monkeypatch.setattr(mongomock.collection.Collection, "find", reported_find)
+    return listener
+
+
+
+def test_metrics_after_requests(client, listener):
+    before = get_samples(client.get("/metrics").text)
+    for _ in range(3):
+        assert client.get("/final_value_by_indexer", params=PARAMS).status_code == 200
+    assert client.get("/final_value_by_indexer", params=dict(PARAMS, indexer_reference="IGPM")).status_code == 500
+    assert client.get("/missing_route").status_code == 404
+    response = client.get("/metrics")
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain; version=0.0.4")
+    samples = get_samples(response.text)
+    delta = lambda name: samples.get(name, 0.0) - before.get(name, 0.0)
+
+    # Labelled by the route template (not the path with the query), including the unmatched ones
+    assert delta('econindexer_http_requests_total{method="GET",route="/final_value_by_indexer",status="200"}') == 3
+    assert delta('econindexer_http_requests_total{method="GET",route="/final_value_by_indexer",status="500"}') == 1
+    assert delta('econindexer_http_requests_total{method="GET",route="unmatched",status="404"}') == 1
+    assert delta('econindexer_http_request_duration_seconds_count{method="GET",route="/final_value_by_indexer"}') == 4
+    assert delta('econindexer_http_request_duration_seconds_bucket{method="GET",route="/final_value_by_indexer",le="+Inf"}') == 4
+    assert delta('econindexer_http_request_duration_seconds_sum{method="GET",route="/final_value_by_indexer"}') > 0
+
+    # The collection was loaded by the first request (in an I/O worker), with all its registers
+    assert delta('econindexer_mongo_commands_total{route="/final_value_by_indexer",command="find"}') >= 1
+    assert delta('econindexer_mongo_documents_returned_total{route="/final_value_by_indexer",command="find"}') >= 120
+    assert samples["econindexer_indexer_cache_hits_total"] >= 3
+
+
+def test_histogram_buckets_are_cumulative():
+    metrics = RequestMetrics()
+    for seconds in [0.001, 0.02, 0.02, 0.3, 20.0]:
+        metrics.observe_request("GET", "/route", 200, seconds)
+    samples = get_samples(metrics.get_prometheus_text())
+
+    buckets = [samples[f'econindexer_http_request_duration_seconds_bucket{{method="GET",route="/route",le="{bound}"}}'] for bound in list(RequestMetrics.LATENCY_BUCKETS) + ["+Inf"]]
+    assert buckets == sorted(buckets) and buckets[0] == 1 and buckets[2] == 3 and buckets[-2] == 4 and buckets[-1] == 5
+    assert samples['econindexer_http_request_duration_seconds_sum{method="GET",route="/route"}'] == pytest.approx(20.341)
+
+
+def test_commands_out_of_requests():
+    metrics = RequestMetrics()
+    listener = MongoCommandListener(metrics)
+    listener.succeeded(get_command_event("find", [{"value": 1.0}, {"value": 2.0}]))
+    listener.failed(monitoring.CommandFailedEvent(timedelta(milliseconds=5), {"ok": 0}, "aggregate", 2, ("localhost", 27017), 2))
+    samples = get_samples(metrics.get_prometheus_text({"hits_total": 2, "age_seconds": 1.5}))
+
+    assert samples['econindexer_mongo_commands_total{route="",command="find"}'] == 1
+    assert samples['econindexer_mongo_documents_returned_total{route="",command="find"}'] == 2
+    assert samples['econindexer_mongo_commands_total{route="",command="aggregate"}'] == 1
+    assert samples['econindexer_mongo_command_duration_seconds_total{route="",command="aggregate"}'] == pytest.approx(0.005)
+    assert samples["econindexer_indexer_cache_hits_total"] == 2 and samples["econindexer_indexer_cache_age_seconds"] == 1.5
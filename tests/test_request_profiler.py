@@ -0,0 +1,120 @@
+"""Tests of the on demand profiling of the requests (ProfilingMiddleware, ProfiledRoute and 'get_profiled_function')."""
+
+import os
+import pstats
+import time
+
+import pytest
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from starlette.concurrency import run_in_threadpool
+
+from API.request_profiler import ProfiledRoute, ProfilingMiddleware, get_profiled_function
+
+
+TOKEN = "secret-token"
+
+
+def get_sum_of_squares(count: int) -> int:
+    return sum(number * number for number in range(count))
+
+
+def get_client(**options) -> TestClient:
+    """Return a TestClient of an app with one sync and one async endpoint, profiled with the given options."""
+    app = FastAPI()
+    app.router.route_class = ProfiledRoute
+
+    @app.get("/sync_route/{count}")
+    def sync_route(count: int):
+        return get_sum_of_squares(count)
+
+    @app.get("/async_route")
+    async def async_route(count: int):
+        return await run_in_threadpool(get_profiled_function(get_sum_of_squares), count)
+
+    app.add_middleware(ProfilingMiddleware, **options)
+    return TestClient(app)
+
+
+def get_reports(directory) -> list:
+    return sorted(path for path in os.listdir(directory) if path.endswith(".txt"))
+
+
+@pytest.fixture(autouse=True)
+def environment(monkeypatch):
+    for name in ["API_PROFILE", "API_PROFILE_TOKEN", "API_PROFILE_THRESHOLD_MS", "API_PROFILE_DIR", "API_PROFILE_MAX_FILES"]:
+        monkeypatch.delenv(name, raising=False)
+
+
+
+def test_off_by_default(tmp_path, monkeypatch):
+    monkeypatch.setenv("API_PROFILE_DIR", str(tmp_path))
+    monkeypatch.setenv("API_PROFILE_THRESHOLD_MS", "0")
+    client = get_client()
+
+    assert client.get("/sync_route/1000").json() == get_sum_of_squares(1000)
+    assert client.get("/sync_route/1000", headers={"X-Profile": TOKEN}).status_code == 200
+    assert os.listdir(tmp_path) == []
+
+
+def test_enabled_by_environment(tmp_path, monkeypatch):
+    monkeypatch.setenv("API_PROFILE", "1")
+    monkeypatch.setenv("API_PROFILE_DIR", str(tmp_path))
+    monkeypatch.setenv("API_PROFILE_THRESHOLD_MS", "0")
+    client = get_client()
+
+    assert client.get("/sync_route/1000").status_code == 200
+    assert len(get_reports(tmp_path)) == 1
+
+
+def test_token_is_enforced(tmp_path):
+    client = get_client(token=TOKEN, threshold_ms=0, directory=str(tmp_path))
+
+    assert client.get("/sync_route/1000").status_code == 200
+    assert client.get("/sync_route/1000", headers={"X-Profile": "wrong-token"}).status_code == 200
+    assert os.listdir(tmp_path) == []
+
+    assert client.get("/sync_route/1000", headers={"X-Profile": TOKEN}).status_code == 200
+    assert len(get_reports(tmp_path)) == 1
+
+
+@pytest.mark.parametrize("path", ["/sync_route/200000", "/async_route?count=200000"])
+def test_profile_is_produced(tmp_path, path):
+    client = get_client(profile_all=True, threshold_ms=0, directory=str(tmp_path))
+
+    assert client.get(path).json() == get_sum_of_squares(200000)
+    [report_name] = get_reports(tmp_path)
+    with open(os.path.join(tmp_path, report_name), encoding="utf-8") as report_file:
+        report = report_file.read()
+
+    route = path.split("?")[0].replace("200000", "{count}")
+    assert report.startswith(f"GET {route} -> 200 in ")
+    assert "get_sum_of_squares" in report
+    # The worker thread code was traced, so the '.prof' file can be loaded by 'pstats'
+    stats = pstats.Stats(os.path.join(tmp_path, report_name[:-len(".txt")] + ".prof"))
+    assert any(function_name == "get_sum_of_squares" for _, _, function_name in stats.stats)
+
+
+def test_fast_requests_are_not_saved(tmp_path):
+    client = get_client(profile_all=True, threshold_ms=60000, directory=str(tmp_path))
+
+    assert client.get("/sync_route/1000").status_code == 200
+    assert os.listdir(tmp_path) == []
+
+
+def test_latest_profiles_are_kept(tmp_path):
+    client = get_client(profile_all=True, threshold_ms=0, directory=str(tmp_path), max_files=2)
+
+    for count in [1000, 2000, 3000]:
+        assert client.get(f"/sync_route/{count}").status_code == 200
+        time.sleep(0.001)
+
+    reports = get_reports(tmp_path)
+    assert len(reports) == 2 and len(os.listdir(tmp_path)) == 4
+    with open(os.path.join(tmp_path, reports[-1]), encoding="utf-8") as report_file:
+        assert "Path: /sync_route/3000" in report_file.read()
+
+
+def test_unprofiled_function_runs_as_is():
+    assert get_profiled_function(get_sum_of_squares)(10) == get_sum_of_squares(10)
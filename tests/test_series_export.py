@@ -0,0 +1,146 @@
+"""Tests of the streamed exports of the adjusted series (SeriesExport and the '/series_by_indexer' route): CSV, NDJSON and gzip."""
+
+import gzip
+import io
+import json
+import zlib
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from API.indexer_series import IndexerSeries
+from API.interest_rate import InterestCalculation as interest
+from API.series_export import ExportFormat, SeriesExport
+
+
+PARAMS = {
+    "initial_value": 1000.0,
+    "initial_date": "2001-03-01T00:00:00",
+    "final_date": "2008-07-01T00:00:00",
+    "indexer_reference": "IPCA",
+    "indexer_type": 1,
+    "indexer_add_rate": 6.5,
+}
+
+# More rows than 'SeriesExport.CHUNK_ROWS', so the last chunk is partial
+TOTAL_ROWS = 2 * SeriesExport.CHUNK_ROWS + 1000
+
+
+@pytest.fixture
+def long_series() -> IndexerSeries:
+    generator = np.random.default_rng(0)
+    return IndexerSeries(np.arange(TOTAL_ROWS) + 10000, generator.uniform(-0.05, 0.1, TOTAL_ROWS))
+
+
+def get_export(series: IndexerSeries, start: int, stop: int, rate_type: str) -> SeriesExport:
+    return SeriesExport(series, start, stop, 1000.0, 6.5 if rate_type == interest.PREFIXED_RATE else 110.0, rate_type, 252)
+
+
+def get_expected_dataframe(api, params: dict) -> pd.DataFrame:
+    """The adjusted series of the collection loaded by the API, with the columns of the export."""
+    collection = api.indexer_cache.get_indexers().get_db_collection_by_indexer(params["indexer_reference"])
+    df = collection.get_stacked_dataframe_adjusted_from_values(
+        params["initial_value"], pd.Timestamp(params["initial_date"]), pd.Timestamp(params["final_date"]),
+        params["indexer_add_rate"], interest.ADDED_RATE_TYPE_LIST[params["indexer_type"]],
+    )
+    columns = [collection.STACKED_RATE_COLUMN, collection.STACKED_VALUE_COLUMN, collection.STACKED_ADJ_RATE_COLUMN, collection.STACKED_ADJ_VALUE_COLUMN]
+    return df[columns].set_axis(SeriesExport.COLUMNS[1:], axis="columns").reset_index(drop=True)
+
+
+
+@pytest.mark.parametrize("rate_type", interest.ADDED_RATE_TYPE_LIST)
+def test_csv_chunks(long_series, rate_type):
+    export = get_export(long_series, 10, TOTAL_ROWS - 3, rate_type)
+    chunks = list(export.iter_csv())
+
+    # One chunk per CHUNK_ROWS rows, and the header only in the first one
+    assert len(chunks) == 3
+    assert chunks[0].startswith(b"date,rate,value,adjusted_rate,adjusted_value\n")
+    assert all(chunk.endswith(b"\n") and not chunk.startswith(b"date") for chunk in chunks[1:])
+    df = pd.read_csv(io.BytesIO(b"".join(chunks)), float_precision="round_trip")
+    assert len(df) == len(export) == TOTAL_ROWS - 13
+    assert (df["date"] == np.datetime_as_string((np.arange(10, TOTAL_ROWS - 3) + 10000).astype("datetime64[D]"))).all()
+
+    # The rows on both sides of the chunk boundaries follow the same prefix factors
+    columns = export.get_columns(10, TOTAL_ROWS - 3)
+    for name in SeriesExport.COLUMNS[1:]:
+        np.testing.assert_allclose(df[name].to_numpy(), columns[name], rtol=1e-13)
+    factors = long_series.get_factors()
+    assert df["value"].iloc[-1] == pytest.approx(1000.0 * factors[TOTAL_ROWS - 3] / factors[10], rel=1e-12)
+
+
+def test_ndjson_chunks(long_series):
+    export = get_export(long_series, 0, TOTAL_ROWS, interest.PROPORTIONAL_RATE)
+    chunks = list(export.iter_ndjson())
+
+    assert len(chunks) == 3 and all(chunk.endswith(b"\n") for chunk in chunks)
+    rows = [json.loads(line) for line in b"".join(chunks).splitlines()]
+    assert len(rows) == TOTAL_ROWS and list(rows[0]) == SeriesExport.COLUMNS
+    csv_df = pd.read_csv(io.BytesIO(b"".join(export.iter_csv())), float_precision="round_trip")
+    pd.testing.assert_frame_equal(pd.DataFrame(rows), csv_df, check_exact=False, rtol=1e-15)
+
+
+def test_empty_export(long_series):
+    export = get_export(long_series, 5, 5, interest.NONE_RATE)
+
+    assert b"".join(export.iter_csv()) == b"date,rate,value,adjusted_rate,adjusted_value\n"
+    assert b"".join(export.iter_ndjson()) == b""
+
+
+def test_gzip_stream(long_series):
+    chunks = list(get_export(long_series, 0, TOTAL_ROWS, interest.PREFIXED_RATE).iter_csv())
+    compressed_chunks = list(ExportFormat.iter_gzip(iter(chunks)))
+
+    assert gzip.decompress(b"".join(compressed_chunks)) == b"".join(chunks)
+    # Each chunk is flushed, so it can be decompressed as soon as it arrives
+    decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+    for chunk, compressed_chunk in zip(chunks, compressed_chunks):
+        assert decompressor.decompress(compressed_chunk) == chunk
+
+
+@pytest.mark.parametrize("indexer_type", range(len(interest.ADDED_RATE_TYPE_LIST)))
+@pytest.mark.parametrize("chunk_rows", [SeriesExport.CHUNK_ROWS, 16])
+def test_csv_route(api, client, monkeypatch, indexer_type, chunk_rows):
+    monkeypatch.setattr(SeriesExport, "CHUNK_ROWS", chunk_rows)
+    params = dict(PARAMS, indexer_type=indexer_type)
+    response = client.get("/series_by_indexer", params=params, headers={"Accept-Encoding": "identity"})
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/csv")
+    assert "content-encoding" not in response.headers
+    df = pd.read_csv(io.StringIO(response.text), float_precision="round_trip")
+    pd.testing.assert_frame_equal(df.drop(columns="date"), get_expected_dataframe(api, params), check_exact=False, rtol=1e-12)
+    assert df["adjusted_value"].iloc[-1] == pytest.approx(client.get("/final_value_by_indexer", params=params).json(), rel=1e-12)
+
+
+def test_ndjson_route(api, client, monkeypatch):
+    monkeypatch.setattr(SeriesExport, "CHUNK_ROWS", 16)
+    response = client.get("/series_by_indexer", params=dict(PARAMS, export_format="ndjson"), headers={"Accept-Encoding": "identity"})
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    df = pd.DataFrame([json.loads(line) for line in response.text.splitlines()])
+    pd.testing.assert_frame_equal(df.drop(columns="date"), get_expected_dataframe(api, PARAMS), check_exact=False, rtol=1e-12)
+
+
+@pytest.mark.parametrize("export_format", ["csv", "ndjson"])
+def test_gzip_route(client, monkeypatch, export_format):
+    monkeypatch.setattr(SeriesExport, "CHUNK_ROWS", 16)
+    params = dict(PARAMS, export_format=export_format)
+    identity_response = client.get("/series_by_indexer", params=params, headers={"Accept-Encoding": "identity"})
+    response = client.get("/series_by_indexer", params=params, headers={"Accept-Encoding": "gzip, deflate"}, stream=True)
+
+    assert response.headers["content-encoding"] == "gzip"
+    body = response.raw.read(decode_content=False)
+    assert body[:2] == b"\x1f\x8b"
+    assert gzip.decompress(body) == identity_response.content
+    # Each representation has its own ETag
+    assert response.headers["etag"] != identity_response.headers["etag"]
+
+
+def test_period_without_rates(client):
+    response = client.get("/series_by_indexer", params=dict(PARAMS, initial_date="1990-01-01T00:00:00", final_date="1990-12-01T00:00:00"), headers={"Accept-Encoding": "identity"})
+
+    assert response.status_code == 200
+    assert response.text == "date,rate,value,adjusted_rate,adjusted_value\n"
@@ -5,10 +5,15 @@ Those data are registered in MongoDB database.
 
 import locale
 
+import numpy as np
+import pandas as pd
+
 import streamlit as st
 
 from API.db_collection import DBCollection, EconomicIndexers
 
+from API.indexer_cache import IndexerCache
+
 from API.dates import DateOperations as date
 
 from API.interest_rate import InterestCalculation as interest
@@ -21,6 +26,14 @@ from db_connection import init_connection
 
 locale.setlocale(locale.LC_ALL, "pt_BR.UTF-8")
 
+# Longer periods are aggregated per month, quarter or year, so the charts never send more points than this per line
+MAX_CHART_POINTS = 240
+CHART_PERIODS = {"M": "mês", "Q": "trimestre", "Y": "ano"}
+
+# Names of the rates and periods of each granularity (see 'DBCollection.PERIODS_PER_YEAR')
+RATE_NAMES = {DBCollection.GRANULARITY_MONTHLY: "mensal", DBCollection.GRANULARITY_DAILY: "diária"}
+PERIOD_NAMES = {DBCollection.GRANULARITY_MONTHLY: "meses", DBCollection.GRANULARITY_DAILY: "dias úteis"}
+
 
 
 # Methods for formatting
@@ -31,36 +44,109 @@ def get_value_as_currency_string(value: float) -> str:
 def get_value_as_percentage_string(value: float) -> str:
     return locale.format_string("%.2f", value) + " %"
 
+def get_rate_as_string(value: float) -> str:
+    return "-" if pd.isna(value) else locale.format_string("%.4f", value)
+
 
 
 # General methods
 
-def get_mean_interest_rate_per_months(total_months: int, interest_rate: float) -> float:
-    return ((1 + interest_rate) ** (1 / total_months)) - 1
+def get_mean_interest_rate_per_periods(total_periods: int, interest_rate: float) -> float:
+    return ((1 + interest_rate) ** (1 / total_periods)) - 1
+
+def get_mean_interest_rate_per_year(period_interest_rate: float, periods_per_year: int = 12) -> float:
+    return ((1 + period_interest_rate) ** periods_per_year) - 1
 
-def get_mean_interest_rate_per_year(monthly_interest_rate: float) -> float:
-    return ((1 + monthly_interest_rate) ** 12) - 1
+def get_mean_interest_rate_per_month(yearly_interest_rate: float) -> float:
+    return ((1 + yearly_interest_rate) ** (1 / 12)) - 1
+
+def get_chart_dataframe(stacked_dataframe: pd.DataFrame, date_column: str, columns: list, rates: bool) -> tuple:
+    """Return only the plotted columns, aggregated per period when there are more than MAX_CHART_POINTS rows.
+    
+    Each period is dated by its last row. Values keep the last one of the period, while rates
+    become the mean compounded rate of the period (in the same unit, e.g. monthly).
+    Return the dataframe and the period name (None when not aggregated).
+    """
+    df = stacked_dataframe[[date_column] + columns]
+    if len(df) <= MAX_CHART_POINTS:
+        return df, None
+    for frequency, period_name in CHART_PERIODS.items():
+        periods = df[date_column].dt.to_period(frequency).to_numpy()
+        if len(pd.unique(periods)) <= MAX_CHART_POINTS:
+            break
+    groups = df.groupby(periods, sort=True)
+    if rates:
+        aggregated = np.expm1(np.log1p(df[columns] / 100).groupby(periods, sort=True).mean()) * 100
+    else:
+        aggregated = groups[columns].last()
+    aggregated.insert(0, date_column, groups[date_column].last())
+    return aggregated.reset_index(drop=True), period_name
+
+
+
+# Methods for caching (shared by all sessions and reruns)
+
+@st.cache_resource
+def get_indexer_cache() -> IndexerCache:
+    """Indexers loaded once per process, then updated from the database after the IndexerCache TTL."""
+    return IndexerCache(init_connection())
+
+def get_indexers() -> EconomicIndexers:
+    indexers = get_indexer_cache().get_indexers()
+    # Collections are loaded concurrently (only once per snapshot); dataframes are built only for the selected indexer
+    indexers.load_db_collections()
+    return indexers
+
+@st.cache_data(max_entries=256, show_spinner=False)
+def get_adjusted_results(indexer_title: str, data_version: str, initial_value, initial_date, final_date, added_rate, added_rate_type) -> tuple:
+    """Return the final value, the total of periods (months or business days) and the data of both charts, computed once per set of parameters.
+    
+    The 'data_version' is part of the key only, so the results are computed again when the indexer data changes.
+    """
+    collection = get_indexers().get_db_collection_by_indexer(indexer_title)
+    stacked_dataframe = collection.get_stacked_dataframe_adjusted_from_values(initial_value, initial_date, final_date, added_rate, added_rate_type)
+    if stacked_dataframe.empty:
+        raise IndexError("There are no rates registered between the given dates.")
+    # The charts need the whole adjusted frame anyway, so the final value is its last row (not computed again)
+    final_value = float(stacked_dataframe[collection.STACKED_ADJ_VALUE_COLUMN].iloc[-1])
+    cumulated_chart = get_chart_dataframe(
+        stacked_dataframe, collection.STACKED_DATE_COLUMN, [collection.STACKED_VALUE_COLUMN, collection.STACKED_ADJ_VALUE_COLUMN], rates=False,
+    )
+    historic_chart = get_chart_dataframe(
+        stacked_dataframe, collection.STACKED_DATE_COLUMN, [collection.STACKED_RATE_COLUMN, collection.STACKED_ADJ_RATE_COLUMN], rates=True,
+    )
+    return final_value, len(stacked_dataframe), cumulated_chart, historic_chart
+
+@st.cache_data(max_entries=32, show_spinner=False)
+def get_historic_table(indexer_title: str, data_version: str) -> pd.DataFrame:
+    """Return the historic table with the rates already formatted, rendered once per data version."""
+    df = get_indexers().get_db_collection_by_indexer(indexer_title).get_transposed_stacked_dataframe()
+    return df.apply(lambda column: column.map(get_rate_as_string))
 
 
 
 # Methods for Streamlit organization
 
 def show_additional_rate_fields(collection: DBCollection, rate_value, rate_index) -> tuple:
+    # Streamlit discards the state of widgets not shown, then the last values are kept apart (per indexer)
+    rate_key = collection.get_collection_name()+"rate"
+    rate_type_key = collection.get_collection_name()+"rate_type"
+    last_rate_value, last_rate_index = st.session_state.get(rate_key+"_last", (rate_value, rate_index))
     col1, col2 = st.columns(2)
     with col1:
         added_rate = st.number_input(
-            "Taxa adicional a.a. (%):", min_value=0.00, max_value=1000.00, value=rate_value,
-            key=collection.get_collection_name()+"rate",
+            "Taxa adicional a.a. (%):", min_value=0.00, max_value=1000.00, value=last_rate_value,
+            key=rate_key,
         )
     with col2:
         added_rate_type = st.radio(
-            "Tipo de taxa:", added_rate_type_list, horizontal=True, index=rate_index,
-            key=collection.get_collection_name()+"rate_type",
+            "Tipo de taxa:", added_rate_type_list, horizontal=True, index=last_rate_index,
+            key=rate_type_key,
         )
+    st.session_state[rate_key+"_last"] = (added_rate, added_rate_type_list.index(added_rate_type))
     return added_rate, added_rate_type
 
-def show_result_fields_top(collection: DBCollection, added_rate, added_rate_type) -> tuple:
-    final_value = collection.get_adjusted_value_from_values(initial_value, initial_date, final_date, added_rate, added_rate_type)
+def show_result_fields_top(final_value: float) -> tuple:
     interest_value = get_interest_value(initial_value, final_value)
     interest_rate = get_interest_rate(initial_value, final_value)
     col1, col2, col3 = st.columns(3)
@@ -70,51 +156,65 @@ def show_result_fields_top(collection: DBCollection, added_rate, added_rate_type
         st.metric("Juros:", get_value_as_currency_string(interest_value))
     with col3:
         st.metric("Juros:", get_value_as_percentage_string(interest_rate * 100))
-    return final_value, interest_value, interest_rate
+    return interest_value, interest_rate
 
 def show_indexer_historic_table(collection: DBCollection) -> None:
     with st.expander("Tabela de histórico do Índice:", expanded=False):
         st.dataframe(
-            collection.get_transposed_stacked_dataframe().style.format(na_rep="-", precision=4, decimal=",", thousands=None),
+            get_historic_table(collection.get_title(), collection.get_data_version()),
             column_config={collection.STACKED_YEAR_COLUMN: st.column_config.NumberColumn(format="%d")},
             use_container_width=True,
         )  
 
-def show_indexer_cumulated_chart(collection: DBCollection, stacked_dataframe) -> None:
+def show_indexer_cumulated_chart(collection: DBCollection, chart: tuple) -> None:
+    chart_dataframe, period_name = chart
     with st.expander("Gráfico de valor acumulado:", expanded=False):
         st.line_chart(
-            data=stacked_dataframe,
+            data=chart_dataframe,
             x=collection.STACKED_DATE_COLUMN,
             y=[collection.STACKED_VALUE_COLUMN, collection.STACKED_ADJ_VALUE_COLUMN],
         )
+        if period_name:
+            st.caption(f"Valores ao final de cada {period_name}.")
 
-def show_indexer_historic_chart(collection: DBCollection, stacked_dataframe) -> None:
-    with st.expander("Gráfico de taxa mensal:", expanded=False):
+def show_indexer_historic_chart(collection: DBCollection, chart: tuple) -> None:
+    chart_dataframe, period_name = chart
+    rate_name = RATE_NAMES[collection.get_granularity()]
+    with st.expander(f"Gráfico de taxa {rate_name}:", expanded=False):
         st.line_chart(
-            data=stacked_dataframe,
+            data=chart_dataframe,
             x=collection.STACKED_DATE_COLUMN,
             y=[collection.STACKED_RATE_COLUMN, collection.STACKED_ADJ_RATE_COLUMN],
         )
+        if period_name:
+            st.caption(f"Taxa {rate_name} média de cada {period_name}.")
 
 def fill_data_in_tab(collection: DBCollection, rate_value, rate_index) -> None:
     added_rate, added_rate_type = show_additional_rate_fields(collection, rate_value, rate_index)
-    final_value, interest_value, interest_rate = show_result_fields_top(collection, added_rate, added_rate_type)
-    
-    stacked_dataframe = collection.get_stacked_dataframe_adjusted_from_values(initial_value, initial_date, final_date, added_rate, added_rate_type)
+    granularity = collection.get_granularity()
+    # Daily rates are registered until the end of the final month
+    collection_final_date = date.get_last_day_of_month(final_date) if granularity == DBCollection.GRANULARITY_DAILY else final_date
+    final_value, total_periods, cumulated_chart, historic_chart = get_adjusted_results(
+        collection.get_title(), collection.get_data_version(), initial_value, initial_date, collection_final_date, added_rate, added_rate_type,
+    )
+    interest_value, interest_rate = show_result_fields_top(final_value)
     
-    total_months = len(stacked_dataframe)
-    monthly_interest_rate = get_mean_interest_rate_per_months(total_months, interest_rate)
-    yearly_interest_rate = get_mean_interest_rate_per_year(monthly_interest_rate)
+    period_interest_rate = get_mean_interest_rate_per_periods(total_periods, interest_rate)
+    yearly_interest_rate = get_mean_interest_rate_per_year(period_interest_rate, collection.get_periods_per_year())
+    if granularity == DBCollection.GRANULARITY_MONTHLY:
+        monthly_interest_rate = period_interest_rate
+    else:
+        monthly_interest_rate = get_mean_interest_rate_per_month(yearly_interest_rate)
     col1, col2, col3 = st.columns(3)
     with col1:
-        st.metric("Período total em meses:", total_months)
+        st.metric(f"Período total em {PERIOD_NAMES[granularity]}:", total_periods)
     with col2:
         st.metric("Taxa média mensal:", get_value_as_percentage_string(monthly_interest_rate * 100))
     with col3:
         st.metric("Taxa média anual:", get_value_as_percentage_string(yearly_interest_rate * 100))
     
-    show_indexer_cumulated_chart(collection, stacked_dataframe)
-    show_indexer_historic_chart(collection, stacked_dataframe)
+    show_indexer_cumulated_chart(collection, cumulated_chart)
+    show_indexer_historic_chart(collection, historic_chart)
 
     show_indexer_historic_table(collection)
 
@@ -126,9 +226,7 @@ st.write("## Indicadores Econômicos")
 
 
 
-mongo_client = init_connection()
-
-indexers = EconomicIndexers(mongo_client)
+indexers = get_indexers()
 
 
 
@@ -159,21 +257,18 @@ with st.sidebar:
 
 
 
-# Economic Indexer tabs
-
-ipca_tab, cdi_tab, selic_tab, fgts_tab, poup_tab = st.tabs(indexers.get_db_collection_titles_list())
-
-with ipca_tab:
-    fill_data_in_tab(indexers.ipca, 5.0, interest.PREFIXED_RATE_INDEX)
-
-with cdi_tab:
-    fill_data_in_tab(indexers.cdi, 110.0, interest.PROPORTIONAL_RATE_INDEX)
+# Economic Indexer selector (only the selected indexer is computed and rendered)
 
-with selic_tab:
-    fill_data_in_tab(indexers.selic, 110.0, interest.PROPORTIONAL_RATE_INDEX)
+indexer_tab_dict = {
+    indexers.ipca.get_title(): (indexers.ipca, 5.0, interest.PREFIXED_RATE_INDEX),
+    indexers.cdi.get_title(): (indexers.cdi, 110.0, interest.PROPORTIONAL_RATE_INDEX),
+    indexers.selic.get_title(): (indexers.selic, 110.0, interest.PROPORTIONAL_RATE_INDEX),
+    indexers.fgts.get_title(): (indexers.fgts, 0.0, interest.NONE_RATE_INDEX),
+    indexers.poup.get_title(): (indexers.poup, 0.0, interest.NONE_RATE_INDEX),
+}
 
-with fgts_tab:
-    fill_data_in_tab(indexers.fgts, 0.0, interest.NONE_RATE_INDEX)
+selected_indexer = st.radio(
+    "Indicador:", list(indexer_tab_dict), horizontal=True, label_visibility="collapsed", key="selected_indexer",
+)
 
-with poup_tab:
-    fill_data_in_tab(indexers.poup, 0.0, interest.NONE_RATE_INDEX)
+fill_data_in_tab(*indexer_tab_dict[selected_indexer])